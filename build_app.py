@@ -93,6 +93,13 @@ def create_release_zip():
         traceback.print_exc()
         raise
 
+# Contenido de data que no se distribuye (caché local de archivos de surtido)
+EXCLUDED_DATA = {'cache'}
+
+def data_files():
+    """Archivos y carpetas de data que se incluyen en el ejecutable y el ZIP"""
+    return [name for name in sorted(os.listdir('data')) if name not in EXCLUDED_DATA]
+
 def build_app():
     print("Iniciando proceso de build...")
     
@@ -108,10 +115,13 @@ def build_app():
         '--clean',                      # Limpieza antes de construir
         # Incluir archivos necesarios
         '--add-data=version.txt;.',     # version.txt en raíz
-        '--add-data=data;data',         # Carpeta data completa
         '--add-data=src/base_app.py;.', # Incluir base_app.py
         '--add-data=src/temp_handler.py;.',  # Incluir temp_handler.py
     ]
+    # Carpeta data sin la caché local
+    for name in data_files():
+        target = 'data' if os.path.isfile(os.path.join('data', name)) else f'data/{name}'
+        args.append(f'--add-data=data/{name};{target}')
     
     try:
         print("Ejecutando PyInstaller...")
@@ -124,7 +134,9 @@ def build_app():
         # Copiar la carpeta data
         if os.path.exists('dist/data'):
             retry_remove('dist/data')
-        shutil.copytree('data', 'dist/data')
+        shutil.copytree('data', 'dist/data', ignore=lambda directory, names: (
+            [name for name in names if name in EXCLUDED_DATA] if os.path.samefile(directory, 'data') else []
+        ))
         
         print("Creando ZIP para release...")
         create_release_zip()
@@ -0,0 +1,81 @@
+# src/analysis_cache.py
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+class FinalGroupsResult:
+    """
+    Resultado de calculate_final_groups para un archivo y un límite de PLUs.
+
+    Los grupos se guardan como vistas de solo lectura (los centros como
+    frozenset), de modo que pestañas, reportes y exportaciones pueden
+    compartir el mismo resultado sin riesgo de modificarlo.
+    """
+    __slots__ = ('groups', 'non_compatible', 'stats')
+
+    def __init__(self, final_groups, non_compatible):
+        self.groups = tuple(
+            MappingProxyType({
+                'centers': frozenset(group['centers']),
+                'plus': group['plus'],
+                'different_plus': group['different_plus']
+            })
+            for group in final_groups
+        )
+        self.non_compatible = tuple(non_compatible)
+        self.stats = MappingProxyType({
+            'groups': len(self.groups),
+            'grouped_centers': sum(len(group['centers']) for group in self.groups),
+            'non_compatible': len(self.non_compatible),
+            'different_plus': tuple(len(group['different_plus']) for group in self.groups),
+            'total_plus': tuple(len(group['plus']) for group in self.groups)
+        })
+
+    def final_groups(self):
+        """Lista nueva con las vistas de los grupos (se puede ordenar o filtrar)."""
+        return list(self.groups)
+
+
+class AnalysisResultsCache:
+    """
+    Caché en memoria de los grupos finales por (huella del archivo, límite,
+    método de agrupación).
+
+    Cada combinación se calcula una sola vez; al cambiar de archivo, de
+    límite o de método se agrega una entrada nueva y se descartan las menos
+    usadas.
+    """
+    DEFAULT_MAX_ENTRIES = 16
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, fingerprint, plu_limit, method='greedy'):
+        """Devuelve el FinalGroupsResult guardado o None si no se ha calculado."""
+        key = (fingerprint, plu_limit, method)
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def store(self, fingerprint, plu_limit, final_groups, non_compatible, method='greedy'):
+        """Guarda los grupos finales calculados y devuelve su FinalGroupsResult."""
+        result = FinalGroupsResult(final_groups, non_compatible)
+        key = (fingerprint, plu_limit, method)
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def invalidate(self, fingerprint=None):
+        """Elimina las entradas de un archivo (o todas si no se indica huella)."""
+        if fingerprint is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == fingerprint]:
+            del self._entries[key]
@@ -0,0 +1,115 @@
+# src/analysis_pipeline.py
+import hashlib
+import time
+
+
+class PipelineStage:
+    """Etapa del análisis: función, etapas de las que depende y parámetros que usa."""
+    __slots__ = ('name', 'func', 'inputs', 'params')
+
+    def __init__(self, name, func, inputs=(), params=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+
+
+class AnalysisPipeline:
+    """
+    Análisis por etapas con nombre y caché por etapa.
+
+    Cada etapa recibe los resultados de sus etapas de entrada (en orden) y sus
+    parámetros como argumentos con nombre. La huella de una etapa es un hash
+    de las huellas de sus entradas y de sus parámetros; el resultado guardado
+    se reutiliza mientras la huella no cambie. Al cambiar un parámetro solo se
+    invalidan las etapas que lo usan y las que dependen de ellas.
+
+    La huella de un parámetro es su repr, salvo que se indique otra al
+    asignarlo (por ejemplo, la huella del contenido de un archivo, o una
+    constante para valores que no afectan el resultado como un callback).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.params = {}
+        self._param_keys = {}
+        self._results = {}
+        # Etapas usadas desde el último clear(): duración o 'caché'
+        self.last_run = {}
+
+    def add_stage(self, name, func, inputs=(), params=()):
+        """Registra una etapa; sus entradas deben estar registradas antes."""
+        for input_name in inputs:
+            if input_name not in self.stages:
+                raise Exception(f"La etapa '{name}' depende de '{input_name}', que no existe")
+        self.stages[name] = PipelineStage(name, func, inputs, params)
+
+    def set_param(self, name, value, key=None):
+        """
+        Asigna un parámetro e invalida las etapas afectadas si su huella cambió.
+
+        Returns:
+            bool: True si la huella del parámetro cambió
+        """
+        key = repr(value) if key is None else str(key)
+        self.params[name] = value
+        if self._param_keys.get(name) == key:
+            return False
+        self._param_keys[name] = key
+        for stage in self.stages.values():
+            if name in stage.params:
+                self.invalidate(stage.name)
+        return True
+
+    def param_key(self, name):
+        """Huella con la que se asignó el parámetro."""
+        return self._param_keys[name]
+
+    def downstream(self, name):
+        """Nombres de la etapa y de todas las que dependen de ella, en orden de registro."""
+        affected = {name}
+        for stage in self.stages.values():
+            if any(input_name in affected for input_name in stage.inputs):
+                affected.add(stage.name)
+        return [stage_name for stage_name in self.stages if stage_name in affected]
+
+    def invalidate(self, name=None):
+        """Descarta el resultado de la etapa y de sus dependientes (o de todas)."""
+        names = self.stages if name is None else self.downstream(name)
+        for stage_name in names:
+            self._results.pop(stage_name, None)
+
+    def is_cached(self, name):
+        """True si la etapa tiene un resultado vigente para los parámetros actuales."""
+        entry = self._results.get(name)
+        return entry is not None and entry[0] == self.stage_key(name)
+
+    def stage_key(self, name):
+        """Huella de la etapa a partir de sus parámetros y de sus entradas."""
+        stage = self.stages[name]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(name.encode('utf-8'))
+        for param in stage.params:
+            if param not in self._param_keys:
+                raise Exception(f"Falta el parámetro '{param}' de la etapa '{name}'")
+            digest.update(f"\0{param}={self._param_keys[param]}".encode('utf-8'))
+        for input_name in stage.inputs:
+            digest.update(f"\0{input_name}:{self.stage_key(input_name)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def run(self, name):
+        """Devuelve el resultado de la etapa, calculando solo lo que no esté vigente."""
+        stage = self.stages[name]
+        inputs = [self.run(input_name) for input_name in stage.inputs]
+
+        key = self.stage_key(name)
+        entry = self._results.get(name)
+        if entry is not None and entry[0] == key:
+            self.last_run.setdefault(name, 'caché')
+            return entry[1]
+
+        start = time.perf_counter()
+        value = stage.func(*inputs, **{param: self.params[param] for param in stage.params})
+        self._results[name] = (key, value)
+        self.last_run[name] = f"{time.perf_counter() - start:.2f}s"
+        return value
@@ -27,6 +27,15 @@ class BaseApp:
             raise FileNotFoundError(f"No se encontró el archivo {filename}")
         return file_path
     
+    @classmethod
+    def get_cache_path(cls) -> str:
+        """Obtiene el directorio de caché del usuario (fuera de la carpeta de instalación)"""
+        if sys.platform == 'win32':
+            root = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+        else:
+            root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(root, 'AppActualizada', 'cache')
+    
     @classmethod
     def get_version(cls) -> str:
         """Lee la versión actual desde version.txt"""
@@ -0,0 +1,213 @@
+# src/batch_analysis.py
+import contextlib
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from excel_export import ExcelExporter
+from lazy_loader import LazyLoader
+from pair_search import PairSearch
+from portfolio_engine import PortfolioEngine
+
+pd = LazyLoader('pandas')
+
+# Bibliotecas numéricas con hilos propios: un hilo por proceso de trabajo
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+SUMMARY_COLUMNS = [
+    ('category', 'Categoría'),
+    ('file', 'Archivo'),
+    ('status', 'Estado'),
+    ('total_centers', 'Total de Centros'),
+    ('unique_centers', 'Centros Únicos'),
+    ('identical_groups', 'Grupos Idénticos'),
+    ('initial_masters', 'Másteres Iniciales'),
+    ('final_masters', 'Másteres Finales'),
+    ('reduction', 'Reducción'),
+    ('reduction_pct', 'Reducción %'),
+    ('final_groups', 'Grupos Finales'),
+    ('non_compatible', 'Centros sin Agrupar'),
+    ('seconds', 'Tiempo (s)'),
+    ('output', 'Exportación')
+]
+
+# Resumen del lote en la carpeta de salida (ver write_batch_summary)
+SUMMARY_FILE = 'resumen_lote.xlsx'
+
+
+def find_input_files(source):
+    """
+    Archivos de surtido de una carpeta (todos los .xlsx) o de un patrón glob.
+
+    Se omiten los archivos temporales de Excel (~$...) y los resultados y
+    el resumen de un lote anterior (*_resultado.xlsx, resumen_lote.xlsx).
+    """
+    pattern = os.path.join(source, '*.xlsx') if os.path.isdir(source) else source
+    files = []
+    for path in sorted(glob.glob(pattern)):
+        name = os.path.basename(path)
+        if (not os.path.isfile(path) or name.startswith('~$') or name.endswith('_resultado.xlsx')
+                or name == SUMMARY_FILE):
+            continue
+        files.append(path)
+    return files
+
+
+def output_path(file_path, out_dir):
+    """Exportación de un archivo del lote: <carpeta>/<nombre>_resultado.xlsx"""
+    category = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(out_dir, f"{category}_resultado.xlsx")
+
+
+def summary_path(out_dir):
+    """Resumen del lote: <carpeta>/resumen_lote.xlsx"""
+    return os.path.join(out_dir, SUMMARY_FILE)
+
+
+def analyze_file(file_path, out_dir, plu_limit, options=None, method='auto', recall=PairSearch.DEFAULT_RECALL,
+                 grouping='greedy', partition=None, improve=0):
+    """
+    Analiza y exporta un archivo (se ejecuta en un proceso de trabajo).
+
+    El detalle que el motor imprime queda en <nombre>_resultado.log. Los
+    errores no detienen el lote: se devuelven en 'status'.
+
+    Returns:
+        dict: Fila del resumen del lote (claves de SUMMARY_COLUMNS)
+    """
+    start = time.perf_counter()
+    category = os.path.splitext(os.path.basename(file_path))[0]
+    out_path = output_path(file_path, out_dir)
+    row = {'category': category, 'file': file_path, 'status': 'OK', 'output': out_path}
+
+    with open(os.path.splitext(out_path)[0] + '.log', 'w', encoding='utf-8') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            engine = PortfolioEngine()
+            engine.pair_search_method = method
+            engine.pair_search_recall = recall
+            engine.grouping_method = grouping
+            engine.grouping_partition = partition
+            engine.improve_seconds = improve
+            results = engine.analyze(file_path, plu_limit)
+            ExcelExporter(engine).export(out_path, options)
+
+            report_data = results['report_data']
+            initial_masters = report_data['initial_masters']
+            final_masters = report_data['final_masters']
+            row.update(
+                total_centers=report_data['identical_count'] + report_data['unique_count'],
+                unique_centers=report_data['unique_count'],
+                identical_groups=len(results['identical_portfolios']),
+                initial_masters=initial_masters,
+                final_masters=final_masters,
+                reduction=initial_masters - final_masters,
+                reduction_pct=round((initial_masters - final_masters) / initial_masters * 100, 1)
+                if initial_masters else 0.0,
+                final_groups=len(results['final_groups']['groups']),
+                non_compatible=len(results['final_groups']['non_compatible'])
+            )
+        except Exception as e:
+            print(f"Error al analizar {file_path}: {str(e)}")
+            row.update(status=f"Error: {str(e)}", output='')
+
+    row['seconds'] = round(time.perf_counter() - start, 2)
+    return row
+
+
+def _init_worker():
+    for variable in THREAD_VARIABLES:
+        os.environ.setdefault(variable, '1')
+
+
+def run_batch(files, out_dir, plu_limit, workers=None, options=None, method='auto',
+              recall=PairSearch.DEFAULT_RECALL, grouping='greedy', partition=None, improve=0,
+              progress_callback=None):
+    """
+    Analiza varios archivos en paralelo, un proceso de trabajo por archivo.
+
+    Los archivos más grandes se envían primero para repartir mejor la carga
+    entre los procesos.
+
+    Args:
+        files: Archivos de surtido (ver find_input_files)
+        out_dir: Carpeta de las exportaciones y del resumen
+        plu_limit: Máximo de PLUs diferentes por grupo
+        workers: Procesos de trabajo (por defecto, uno por núcleo)
+        options: Hojas a exportar (ver ExcelExporter.DEFAULT_OPTIONS)
+        grouping: Algoritmo de los grupos finales (ver GROUPING_METHODS)
+        partition: Partición geográfica opcional (ver GeoPartitionGrouping)
+        improve: Segundos de mejora local por archivo (ver GroupImprover)
+        progress_callback: Función opcional (fila, terminados, total)
+
+    Returns:
+        list: Filas del resumen, en el orden de files
+    """
+    if not files:
+        raise Exception("No se encontraron archivos para analizar")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+
+    rows = {}
+    order = sorted(files, key=os.path.getsize, reverse=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(
+                analyze_file, file_path, out_dir, plu_limit, options, method, recall, grouping, partition,
+                improve
+            ): file_path
+            for file_path in order
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                # El proceso de trabajo terminó sin devolver la fila (por
+                # ejemplo, sin memoria): el error queda en el resumen
+                row = {
+                    'category': os.path.splitext(os.path.basename(file_path))[0],
+                    'file': file_path,
+                    'status': f"Error: {str(e) or type(e).__name__}",
+                    'output': '',
+                    'seconds': 0.0
+                }
+            rows[file_path] = row
+            if progress_callback is not None:
+                progress_callback(row, len(rows), len(files))
+
+    return [rows[file_path] for file_path in files]
+
+
+def write_batch_summary(rows, file_path):
+    """Resumen del lote: másteres antes y después por categoría, con una fila de total."""
+    df = pd.DataFrame(
+        [[row.get(key, '') for key, _ in SUMMARY_COLUMNS] for row in rows],
+        columns=[title for _, title in SUMMARY_COLUMNS]
+    )
+    done = [row for row in rows if row['status'] == 'OK']
+    initial_masters = sum(row['initial_masters'] for row in done)
+    final_masters = sum(row['final_masters'] for row in done)
+    total = {title: '' for _, title in SUMMARY_COLUMNS}
+    total.update({
+        'Categoría': 'Total',
+        'Estado': f"{len(done)} de {len(rows)} archivos",
+        'Total de Centros': sum(row['total_centers'] for row in done),
+        'Másteres Iniciales': initial_masters,
+        'Másteres Finales': final_masters,
+        'Reducción': initial_masters - final_masters,
+        'Reducción %': round((initial_masters - final_masters) / initial_masters * 100, 1)
+        if initial_masters else 0.0,
+        'Tiempo (s)': round(sum(row['seconds'] for row in rows), 2)
+    })
+    df = pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+
+    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Resumen del Lote', index=False)
+        worksheet = writer.sheets['Resumen del Lote']
+        worksheet.freeze_panes = 'A2'
+        for column in worksheet.columns:
+            width = max(len(str(cell.value)) if cell.value is not None else 0 for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = min(width + 2, 60)
+    return file_path
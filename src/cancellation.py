@@ -0,0 +1,31 @@
+# src/cancellation.py
+import threading
+
+
+class OperationCancelled(Exception):
+    """La operación se detuvo porque el usuario la canceló."""
+
+
+class CancellationToken:
+    """
+    Señal de cancelación cooperativa para análisis y exportaciones.
+
+    La interfaz llama a cancel() (por ejemplo, desde el botón Cancelar) y el
+    código que trabaja llama a check() en sus ciclos, que lanza
+    OperationCancelled si se pidió cancelar. Se puede usar desde cualquier hilo.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """Lanza OperationCancelled si se pidió cancelar."""
+        if self._event.is_set():
+            raise OperationCancelled("Operación cancelada por el usuario")
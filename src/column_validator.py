@@ -0,0 +1,174 @@
+# src/column_validator.py
+
+class ColumnValidator:
+    def __init__(self):
+        self.COLUMN_VARIATIONS = {
+            'CENTRO': {
+                'valid': [
+                    'CENTRO', 'COD_CENTRO', 'CODIGO_CENTRO', 'CENTRO_ID',
+                    'ID_CENTRO', 'NUM_CENTRO', 'CENTRO_CODIGO'
+                ],
+                'excluded': [
+                    'NOMBRE_CENTRO', 'NOMBRE CENTRO', 'DESC_CENTRO',
+                    'DESCRIPCION_CENTRO', 'CENTRO_NOMBRE'
+                ],
+                'required_type': None,
+                'required': True
+            },
+            'PLU_SAP': {
+                'valid': [
+                    'PLU_SAP', 'PLU', 'CODIGO_PLU', 'COD_PLU', 'SKU',
+                    'CODIGO_PRODUCTO', 'COD_PRODUCTO'
+                ],
+                'excluded': [
+                    'DESCRIPCION_PLU', 'NOMBRE_PLU', 'PLU_DESCRIPCION'
+                ],
+                'required_type': None,
+                'required': True
+            },
+            'CATEGORIA': {
+                'valid': ['CATEGORIA', 'CATEGORIAS'],
+                'excluded': [],
+                'required_type': None,
+                'required': False
+            },
+            'SUBCATEGORIA': {
+                'valid': ['SUBCATEGORIA', 'SUBCATEGORIAS'],
+                'excluded': [],
+                'required_type': None,
+                'required': False
+            },
+            'SEGMENTO': {
+                'valid': ['SEGMENTO', 'SEGMENTOS'],
+                'excluded': [],
+                'required_type': None,
+                'required': False
+            },
+            'ARTICULO': {
+                'valid': ['ARTICULO', 'ARTICULOS'],
+                'excluded': [],
+                'required_type': None,
+                'required': False
+            },
+            'DISTRITO': {
+                'valid': ['Distrito'],  # Solo la columna exacta
+                'excluded': [],
+                'required_type': None,
+                'required': False,
+                'exact_match': True    # Requerir coincidencia exacta
+            },
+            'REGION': {
+                'valid': ['Región'],   # Solo la columna exacta
+                'excluded': [],
+                'required_type': None,
+                'required': False,
+                'exact_match': True    # Requerir coincidencia exacta
+            }
+        }
+
+    def normalize_column_name(self, column_name):
+        """
+        Normaliza el nombre de una columna para comparaciones consistentes.
+        """
+        return str(column_name).upper().replace(' ', '_').strip()
+
+    def find_column(self, df, column_type, raise_error=True):
+        """
+        Encuentra una columna específica en el DataFrame.
+
+        Args:
+            df: DataFrame donde buscar
+            column_type: Tipo de columna a buscar ('CENTRO', 'PLU_SAP', etc.)
+            raise_error: Si es True, lanza error cuando no encuentra la columna
+
+        Returns:
+            str: Nombre de la columna encontrada o None si no se encuentra
+        """
+
+        config = self.COLUMN_VARIATIONS[column_type]
+        exact_match = config.get('exact_match', False)
+
+        if exact_match:
+            # Buscar coincidencia exacta
+            for valid_name in config['valid']:
+                if valid_name in df.columns:
+                    return valid_name
+        else:
+            if column_type not in self.COLUMN_VARIATIONS:
+                raise ValueError(f"Tipo de columna no soportado: {column_type}")
+
+            valid_variations = self.COLUMN_VARIATIONS[column_type]['valid']
+            excluded_variations = self.COLUMN_VARIATIONS[column_type]['excluded']
+            required_type = self.COLUMN_VARIATIONS[column_type]['required_type']
+
+            # Normalizar nombres de columnas del DataFrame
+            df_columns = {col: self.normalize_column_name(col) for col in df.columns}
+
+            # Excluir columnas no deseadas
+            excluded_cols = []
+            for col, normalized_name in df_columns.items():
+                for excluded in excluded_variations:
+                    if self.normalize_column_name(excluded) in normalized_name:
+                        excluded_cols.append(col)
+
+            # Buscar coincidencias exactas primero
+            exact_matches = []
+            for col, normalized_name in df_columns.items():
+                if col not in excluded_cols:
+                    for valid_var in valid_variations:
+                        if normalized_name == self.normalize_column_name(valid_var):
+                            exact_matches.append(col)
+
+            if len(exact_matches) == 1:
+                found_column = exact_matches[0]
+                if self._validate_column_type(df, found_column, required_type):
+                    return found_column
+
+            # Si no hay coincidencias exactas, buscar coincidencias parciales
+            partial_matches = []
+            for col, normalized_name in df_columns.items():
+                if col not in excluded_cols:
+                    if column_type in normalized_name:
+                        if self._validate_column_type(df, col, required_type):
+                            partial_matches.append(col)
+
+            if len(partial_matches) == 1:
+                return partial_matches[0]
+            elif len(partial_matches) > 1:
+                if raise_error:
+                    raise ValueError(
+                        f"Se encontraron múltiples columnas que podrían ser '{column_type}': "
+                        f"{', '.join(partial_matches)}.\nPor favor, verifique el archivo "
+                        f"y asegúrese de que la columna '{column_type}' esté claramente identificada."
+                    )
+            elif raise_error:
+                raise ValueError(
+                    f"No se encontró la columna '{column_type}' en el archivo.\n"
+                    f"Columnas disponibles: {', '.join(df.columns)}"
+                )
+
+            return None
+
+    def _validate_column_type(self, df, column, required_type):
+        """
+        Valida el tipo de datos de una columna.
+        """
+        if required_type == 'numeric':
+            return df[column].astype(str).str.match(r'^\d+$').all()
+        return True
+
+    def validate_required_columns(self, df, required_columns):
+        """
+        Valida múltiples columnas requeridas en el DataFrame.
+
+        Args:
+            df: DataFrame a validar
+            required_columns: Lista de tipos de columnas requeridas
+
+        Returns:
+            dict: Diccionario con los nombres de las columnas encontradas
+        """
+        found_columns = {}
+        for col_type in required_columns:
+            found_columns[col_type] = self.find_column(df, col_type)
+        return found_columns
@@ -0,0 +1,229 @@
+# src/component_grouping.py
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from group_accumulator import GroupAccumulator, build_final_groups
+from lazy_loader import LazyLoader
+from pair_search import PairSearch
+from portfolio_bits import BitPortfolio
+
+np = LazyLoader('numpy')
+sparse = LazyLoader('scipy.sparse')
+csgraph = LazyLoader('scipy.sparse.csgraph')
+
+
+def connected_components(n, left, right):
+    """
+    Componentes conexas del grafo de n nodos con aristas (left[k], right[k]).
+
+    Returns:
+        list: Arreglos ordenados con los nodos de cada componente, por su
+            menor nodo
+    """
+    if n == 0:
+        return []
+    graph = sparse.coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n))
+    _, labels = csgraph.connected_components(graph, directed=False)
+    order = np.argsort(labels, kind='stable')
+    components = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+    components.sort(key=lambda component: component[0])
+    return components
+
+
+class ComponentGrouping:
+    """
+    Grupos finales por componentes del grafo de pares dentro del límite.
+
+    Dos portafolios sin un camino de pares a distancia <= plu_limit nunca
+    quedan en el mismo grupo, así que cada componente conexa se agrupa por
+    separado (con build_final_groups y sus vecinos) y los resultados se
+    unen en el orden del menor portafolio de cada grupo. El resultado es el
+    mismo que el de build_final_groups con todos los portafolios; los
+    portafolios sin vecinos se resuelven sin agrupar nada (un grupo idéntico
+    queda como grupo y un centro único como no compatible).
+
+    Con workers > 1 las componentes se reparten en tandas entre procesos
+    cuando hay suficientes portafolios en componentes de más de uno.
+    """
+    # Portafolios en componentes de más de uno a partir de los cuales se usan procesos
+    PARALLEL_MIN_PORTFOLIOS = 2_000
+    # Tandas por proceso (más tandas reparten mejor la carga)
+    BATCHES_PER_WORKER = 4
+
+    def __init__(self, identical_portfolios, unique_portfolios, method='greedy', workers=1,
+                 cancel_token=None):
+        """
+        Args:
+            identical_portfolios: {tupla de centros: BitPortfolio}
+            unique_portfolios: {centro: BitPortfolio}
+            method: Algoritmo de agrupación (ver GROUPING_METHODS)
+            workers: Procesos para agrupar las componentes (1 = en este proceso)
+            cancel_token: CancellationToken opcional; se revisa en cada componente
+        """
+        self.identical_portfolios = identical_portfolios
+        self.unique_portfolios = unique_portfolios
+        self.method = method
+        self.workers = max(1, int(workers or 1))
+        self.cancel_token = cancel_token
+        self.stats = {}
+
+        # Portafolios numerados como en CenterIndex: primero los idénticos
+        self._keys = list(identical_portfolios) + list(unique_portfolios)
+        self._portfolios = list(identical_portfolios.values()) + list(unique_portfolios.values())
+        self._n_identical = len(identical_portfolios)
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def run(self, plu_limit, close_pairs=None):
+        """
+        Forma los grupos finales con a lo sumo plu_limit PLUs diferentes por grupo.
+
+        Args:
+            plu_limit: Máximo de PLUs diferentes por grupo
+            close_pairs: ClosePairs de todos los portafolios (opcional; si no
+                se indica se buscan con PairSearch)
+
+        Returns:
+            tuple: (lista de GroupAccumulator, lista ordenada de centros no compatibles)
+        """
+        start = time.perf_counter()
+        n = len(self._portfolios)
+        if close_pairs is None:
+            close_pairs = PairSearch(
+                self._portfolios, cancel_token=self.cancel_token, workers=self.workers
+            ).find_pairs(plu_limit)
+
+        components = connected_components(n, close_pairs.left, close_pairs.right)
+        shared = [component for component in components if len(component) > 1]
+
+        neighbors = {}
+        for i, j in zip(close_pairs.left.tolist(), close_pairs.right.tolist()):
+            neighbors.setdefault(i, []).append(j)
+            neighbors.setdefault(j, []).append(i)
+
+        # (menor portafolio, GroupAccumulator) de cada grupo y centros no compatibles
+        groups = []
+        non_compatible = []
+        for component in components:
+            if len(component) == 1:
+                position = int(component[0])
+                if position < self._n_identical:
+                    groups.append((position, GroupAccumulator.from_portfolio(
+                        self._portfolios[position], self._keys[position]
+                    )))
+                else:
+                    non_compatible.append(self._keys[position])
+
+        tasks = [self._component_task(component, neighbors) for component in shared]
+        parallel = (
+            self.workers > 1 and len(tasks) > 1
+            and sum(len(component) for component in shared) >= self.PARALLEL_MIN_PORTFOLIOS
+        )
+        if parallel:
+            results = self._run_parallel(tasks, plu_limit)
+        else:
+            results = []
+            for task in tasks:
+                self._check_cancelled()
+                results.append(_group_component(self._portfolios[0].index, task, plu_limit, self.method))
+
+        for component, (component_groups, component_non_compatible) in zip(shared, results):
+            for members in component_groups:
+                groups.append((int(component[min(members)]), self._accumulator(component, members)))
+            non_compatible.extend(component_non_compatible)
+
+        groups.sort(key=lambda group: group[0])
+        self.stats = {
+            'components': len(components),
+            'shared_components': len(shared),
+            'largest_component': max((len(component) for component in components), default=0),
+            'pairs': len(close_pairs),
+            'parallel': parallel,
+            'seconds': time.perf_counter() - start
+        }
+        return [accumulator for _, accumulator in groups], sorted(non_compatible)
+
+    def _component_task(self, component, neighbors):
+        """Datos de una componente para _group_component (numeración local)."""
+        local = {int(position): k for k, position in enumerate(component)}
+        identical = [
+            (self._keys[position], self._portfolios[position].bits)
+            for position in component.tolist() if position < self._n_identical
+        ]
+        unique = [
+            (self._keys[position], self._portfolios[position].bits)
+            for position in component.tolist() if position >= self._n_identical
+        ]
+        component_neighbors = [
+            [local[other] for other in neighbors[position]] for position in component.tolist()
+        ]
+        return identical, unique, component_neighbors
+
+    def _accumulator(self, component, members):
+        """GroupAccumulator de los portafolios members (posiciones locales) de una componente."""
+        accumulator = GroupAccumulator(self._portfolios[0].index)
+        for member in sorted(members):
+            position = int(component[member])
+            centers = self._keys[position] if position < self._n_identical else [self._keys[position]]
+            accumulator.add(self._portfolios[position], centers)
+        return accumulator
+
+    def _run_parallel(self, tasks, plu_limit):
+        """Agrupa las componentes en tandas repartidas entre procesos."""
+        # Tandas intercaladas para que cada una tenga componentes grandes y pequeñas
+        order = sorted(range(len(tasks)), key=lambda k: len(tasks[k][2]), reverse=True)
+        n_batches = min(len(tasks), self.workers * self.BATCHES_PER_WORKER)
+        batches = [order[k::n_batches] for k in range(n_batches)]
+
+        results = [None] * len(tasks)
+        index = self._portfolios[0].index
+        executor = ProcessPoolExecutor(max_workers=min(self.workers, n_batches))
+        try:
+            futures = {
+                executor.submit(_group_batch, index, [tasks[k] for k in batch], plu_limit, self.method): batch
+                for batch in batches
+            }
+            pending = set(futures)
+            while pending:
+                self._check_cancelled()
+                done, pending = wait(pending, timeout=0.1)
+                for future in done:
+                    for k, result in zip(futures[future], future.result()):
+                        results[k] = result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
+
+
+def _group_component(index, task, plu_limit, method):
+    """
+    Agrupa una componente.
+
+    Returns:
+        tuple: (lista con las posiciones locales de los portafolios de cada
+            grupo, centros no compatibles)
+    """
+    identical, unique, neighbors = task
+    identical_portfolios = {centers: BitPortfolio(bits, index) for centers, bits in identical}
+    unique_portfolios = {center: BitPortfolio(bits, index) for center, bits in unique}
+    accumulators, non_compatible = build_final_groups(
+        identical_portfolios, unique_portfolios, plu_limit, [set(others) for others in neighbors],
+        method=method
+    )
+
+    # Posición local de cada centro (los idénticos van primero, como en la tarea)
+    positions = {}
+    for k, (centers, _) in enumerate(identical):
+        for center in centers:
+            positions[center] = k
+    for k, (center, _) in enumerate(unique, len(identical)):
+        positions[center] = k
+    groups = [sorted({positions[center] for center in accumulator.centers}) for accumulator in accumulators]
+    return groups, non_compatible
+
+
+def _group_batch(index, tasks, plu_limit, method):
+    """Tanda de componentes en un proceso de trabajo."""
+    return [_group_component(index, task, plu_limit, method) for task in tasks]
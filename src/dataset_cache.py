@@ -0,0 +1,187 @@
+# src/dataset_cache.py
+import hashlib
+import json
+import logging
+import os
+import time
+from importlib import import_module
+
+from base_app import BaseApp
+from lazy_loader import LazyLoader
+
+pd = LazyLoader('pandas')
+
+
+class DatasetCache:
+    """
+    Caché en disco de las hojas leídas de los archivos de surtido.
+
+    Cada entrada se identifica por el tamaño, la fecha de modificación y un
+    hash del contenido del archivo, de modo que un acierto evita abrir el
+    libro con openpyxl. Las entradas se guardan en formato Feather (o pickle
+    si pyarrow no está disponible o la hoja tiene tipos mixtos) y se
+    eliminan por antigüedad de uso cuando se supera el tamaño máximo.
+
+    Varios procesos pueden usar la misma carpeta (por ejemplo, un análisis
+    por lotes): cada uno escribe en archivos temporales propios y los
+    reemplaza de forma atómica; en el peor caso se pierde alguna entrada
+    del índice y ese archivo se vuelve a leer.
+    """
+    INDEX_FILE = 'index.json'
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        # Por defecto en el directorio de caché del usuario: la carpeta data
+        # se distribuye con el ejecutable
+        self.cache_dir = cache_dir or BaseApp.get_cache_path()
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    @classmethod
+    def fingerprint(cls, file_path):
+        """Huella del archivo: tamaño, fecha de modificación y hash del contenido."""
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return f"{stat.st_size}-{stat.st_mtime_ns}-{digest.hexdigest()}"
+
+    def load(self, file_path, variant='sheet1', fingerprint=None):
+        """
+        Devuelve el DataFrame guardado para el archivo o None si no hay entrada.
+
+        Args:
+            file_path: Ruta del archivo de surtido
+            variant: Identificador de lo que se guardó (hoja, columnas, etc.)
+            fingerprint: Huella ya calculada del archivo (opcional)
+        """
+        try:
+            key = self._entry_key(fingerprint or self.fingerprint(file_path), variant)
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+
+            entry_path = os.path.join(self.cache_dir, entry['file'])
+            if not os.path.exists(entry_path):
+                del index[key]
+                self._write_index(index)
+                return None
+
+            if entry['format'] == 'feather':
+                df = pd.read_feather(entry_path)
+            else:
+                df = pd.read_pickle(entry_path)
+            if entry.get('index'):
+                # Índice guardado como columnas (ver _write_frame)
+                df = df.set_index(entry['index']['columns'])
+                df.index.names = entry['index']['names']
+
+            entry['last_access'] = time.time()
+            self._write_index(index)
+            return df
+
+        except Exception as e:
+            logging.warning(f"No se pudo leer la caché de {file_path}: {e}")
+            return None
+
+    def store(self, file_path, df, variant='sheet1', fingerprint=None):
+        """Guarda el DataFrame del archivo y aplica el límite de tamaño."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            key = self._entry_key(fingerprint or self.fingerprint(file_path), variant)
+            entry_format, entry_file, entry_index = self._write_frame(key, df)
+
+            index = self._read_index()
+            index[key] = {
+                'file': entry_file,
+                'format': entry_format,
+                'index': entry_index,
+                'bytes': os.path.getsize(os.path.join(self.cache_dir, entry_file)),
+                'last_access': time.time(),
+                'source': os.path.abspath(file_path)
+            }
+            self._evict(index)
+            self._write_index(index)
+
+        except Exception as e:
+            logging.warning(f"No se pudo guardar la caché de {file_path}: {e}")
+
+    def clear(self):
+        """Elimina todas las entradas de la caché."""
+        index = self._read_index()
+        for entry in index.values():
+            self._remove_file(entry['file'])
+        self._write_index({})
+
+    def _entry_key(self, fingerprint, variant):
+        return f"{variant}-{fingerprint}"
+
+    def _write_frame(self, key, df):
+        """
+        Escribe el DataFrame en Feather si es posible, o en pickle.
+
+        Feather solo admite el índice por defecto (0..n-1), así que cualquier
+        otro índice se guarda como columnas y load() lo restablece.
+
+        Returns:
+            tuple: (formato, archivo, None o {'columns', 'names'} del índice)
+        """
+        entry_index = None
+        if not df.index.equals(pd.RangeIndex(len(df))) or any(name is not None for name in df.index.names):
+            names = [name if name is None else str(name) for name in df.index.names]
+            columns = [f"__index_{level}__" for level in range(len(names))]
+            entry_index = {'columns': columns, 'names': names}
+            df = df.rename_axis(columns).reset_index()
+        else:
+            df = df.reset_index(drop=True)
+        df.columns = [str(col) for col in df.columns]
+
+        try:
+            import_module('pyarrow')
+            entry_file = f"{key}.feather"
+            tmp_path = os.path.join(self.cache_dir, f"{entry_file}.{os.getpid()}.tmp")
+            df.to_feather(tmp_path)
+            os.replace(tmp_path, os.path.join(self.cache_dir, entry_file))
+            return 'feather', entry_file, entry_index
+        except Exception:
+            # pyarrow no disponible o columnas con tipos mixtos
+            self._remove_file(f"{key}.feather.{os.getpid()}.tmp")
+
+        entry_file = f"{key}.pkl"
+        tmp_path = os.path.join(self.cache_dir, f"{entry_file}.{os.getpid()}.tmp")
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, os.path.join(self.cache_dir, entry_file))
+        return 'pickle', entry_file, entry_index
+
+    def _evict(self, index):
+        """Elimina las entradas usadas hace más tiempo hasta respetar el límite."""
+        total = sum(entry['bytes'] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            self._remove_file(entry['file'])
+            total -= entry['bytes']
+            del index[key]
+
+    def _remove_file(self, entry_file):
+        try:
+            os.remove(os.path.join(self.cache_dir, entry_file))
+        except OSError:
+            pass
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
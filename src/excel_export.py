@@ -0,0 +1,1229 @@
+# src/excel_export.py
+import os
+import unicodedata
+
+from cancellation import OperationCancelled
+from lazy_loader import LazyLoader
+
+pd = LazyLoader('pandas')
+
+# Importaciones de openpyxl usando lazy loading
+excel_styles = LazyLoader('openpyxl.styles')
+Font = excel_styles.Font
+Alignment = excel_styles.Alignment
+PatternFill = excel_styles.PatternFill
+Border = excel_styles.Border
+Side = excel_styles.Side
+get_column_letter = LazyLoader('openpyxl.utils').get_column_letter
+Table = LazyLoader('openpyxl.worksheet.table').Table
+TableStyleInfo = LazyLoader('openpyxl.worksheet.table').TableStyleInfo
+
+
+class ExcelExporter:
+    """
+    Exporta a Excel los resultados de un PortfolioEngine, sin interfaz gráfica.
+
+    Las opciones son las del diálogo de exportación (ver DEFAULT_OPTIONS). El
+    avance se informa con progress_callback(mensaje) y, si se indica
+    cancel_token, la exportación se puede cancelar entre hojas, entre grupos
+    y cada CANCEL_CHECK_ROWS filas en las hojas con una fila por registro.
+    """
+    # Filas entre revisiones de la cancelación al escribir o dar formato a una hoja
+    CANCEL_CHECK_ROWS = 1_000
+
+    DEFAULT_OPTIONS = {
+        'sheet1': True,
+        'resumen': True,
+        'grupos_identicos': True,
+        'grupos_finales': True,
+        'analisis_grupos': False,
+        'distribucion_region': False,
+        'analisis_modulacion': False,
+        'centros_unicos': True,
+        'centros_no_compatibles': True,
+        'curva_limites': True,
+        'analisis_variacion': True,
+        'consolidado': True,
+        'agrupacion_personalizada': False,
+        'agrupacion_personalizada_modulacion': False,
+        'agrupacion_personalizada_variacion': False,
+        'consolidado_personalizado': False
+    }
+
+    def __init__(self, engine, progress_callback=None, cancel_token=None):
+        self.engine = engine
+        self.progress_callback = progress_callback
+        self.cancel_token = cancel_token
+
+        # Fuentes
+        self.title_font = Font(name='Segoe UI', size=14, bold=True)
+        self.subtitle_font = Font(name='Segoe UI', size=12, bold=True)
+        self.base_font = Font(name='Segoe UI', size=11)
+        self.header_font = Font(name='Segoe UI', size=11, bold=True)
+
+        # Alineaciones
+        self.center_alignment = Alignment(horizontal='center', vertical='center')
+        self.left_alignment = Alignment(horizontal='left', vertical='center')
+
+        # Colores
+        self.header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
+        self.warning_fill = PatternFill(start_color='FEF2F2', end_color='FEF2F2', fill_type='solid')
+        self.success_fill = PatternFill(start_color='ECFDF5', end_color='ECFDF5', fill_type='solid')
+        self.alternate_fill = PatternFill(start_color='F9FAFB', end_color='F9FAFB', fill_type='solid')
+
+    def update_progress(self, message):
+        """Informa el avance y se detiene (OperationCancelled) si se canceló."""
+        if self.progress_callback is not None:
+            self.progress_callback(message)
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def check_cancelled(self, row=0):
+        """Se detiene (OperationCancelled) si se canceló; revisa solo cada CANCEL_CHECK_ROWS filas."""
+        if self.cancel_token is not None and row % self.CANCEL_CHECK_ROWS == 0:
+            self.cancel_token.check()
+
+    def export(self, file_path, options=None, category=None, extra_sheets=None):
+        """
+        Escribe el archivo Excel con las hojas elegidas.
+
+        El libro se escribe en un archivo temporal que reemplaza a file_path
+        al terminar: si se cancela o falla, el archivo destino queda intacto.
+
+        Args:
+            file_path: Archivo .xlsx de salida
+            options: Hojas a exportar (se completan con DEFAULT_OPTIONS)
+            category: Categoría para el análisis de modulación
+            extra_sheets: Función opcional extra_sheets(writer) que agrega
+                hojas al final (por ejemplo, la agrupación personalizada)
+
+        Returns:
+            str: file_path
+        """
+        options = dict(self.DEFAULT_OPTIONS, **(options or {}))
+        base_path, extension = os.path.splitext(file_path)
+        temp_path = f"{base_path}.tmp{extension}"
+
+        try:
+            # Crear Excel writer
+            with pd.ExcelWriter(temp_path, engine='openpyxl') as writer:
+                try:
+                    # Cargar datos básicos según necesidad
+                    self.update_progress("Cargando datos necesarios...")
+
+                    # Cargar datos solo si son necesarios
+                    if self._needs_basic_data(options):
+                        self._load_basic_data(options)
+                    final_groups = self.engine.calculate_final_groups(
+                        self.engine.current_plu_limit, self.cancel_token
+                    ) if self._needs_final_groups(options) else None
+                    geo_data = self.engine.load_geographic_data() if self._needs_geo_data(options) else None
+
+                    # Resumen General
+                    if options['resumen']:
+                        self.export_summary_sheet(writer, final_groups)
+
+                    # Grupos Idénticos
+                    if options['grupos_identicos']:
+                        self.export_identical_groups_sheet(writer)
+
+                    # Grupos Finales
+                    if options['grupos_finales']:
+                        self.export_final_groups_sheet(writer, final_groups, geo_data, category)
+
+                    # Centros Únicos
+                    if options['centros_unicos']:
+                        self.export_unique_centers_sheet(writer)
+
+                    # Centros No Compatibles
+                    if options['centros_no_compatibles']:
+                        self.export_non_compatible_centers_sheet(writer)
+
+                    # Curva por Límite de PLUs
+                    if options['curva_limites'] and self.engine.limit_sweep_results:
+                        self.export_limit_sweep_sheet(writer)
+
+                    # Ajustar formato final
+                    self.update_progress("Aplicando formato final...")
+                    self.format_pivot_tables(writer.book)
+
+                    # Análisis de Variación
+                    if options['analisis_variacion']:
+                        self.add_variation_analysis_sheets(writer)
+
+                    # Consolidado
+                    if options['consolidado']:
+                        self.add_consolidated_sheet(writer)
+
+                    # Sheet1 (Datos originales)
+                    if options['sheet1']:
+                        self.add_initial_sheet(writer)
+
+                    if extra_sheets is not None:
+                        extra_sheets(writer)
+
+                except OperationCancelled:
+                    # Dejar un libro mínimo para que el cierre del writer sea inmediato
+                    for sheet in writer.book.worksheets:
+                        writer.book.remove(sheet)
+                    writer.book.create_sheet("Sheet")
+                    raise
+                except Exception as e:
+                    print(f"Error durante la exportación: {str(e)}")
+                    raise
+
+            os.replace(temp_path, file_path)
+            return file_path
+
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _needs_basic_data(self, options):
+        """Verificar si se necesitan datos básicos."""
+        return any([
+            options['sheet1'],
+            options['analisis_variacion'],
+            options['consolidado']
+        ])
+
+    def _needs_final_groups(self, options):
+        """Verificar si se necesitan grupos finales."""
+        return any([
+            options['resumen'],
+            options['grupos_finales'],
+            options['analisis_grupos']
+        ])
+
+    def _needs_geo_data(self, options):
+        """Verificar si se necesitan datos geográficos."""
+        return options['analisis_grupos'] and options['distribucion_region']
+
+    def _needs_modulation_analysis(self, options):
+        """Verificar si se necesita análisis de modulación."""
+        return options['analisis_grupos'] and options['analisis_modulacion']
+
+    def _load_basic_data(self, options):
+        """Cargar datos básicos del archivo Excel."""
+        df = self.engine.get_dataset().df
+        if df.empty:
+            raise ValueError("El archivo Excel está vacío")
+        return df
+
+    def export_summary_sheet(self, writer, final_groups):
+        """Exportar hoja de resumen general."""
+        try:
+            self.update_progress("Generando resumen general...")
+            ws_summary = writer.book.create_sheet("Resumen General", 0)
+            current_row = 1
+
+            # Estadísticas generales
+            current_row = self.create_title_row(ws_summary, "Estadísticas Generales")
+            
+            stats_headers = ["Métrica", "Valor", "Porcentaje"]
+            current_row = self.add_table_headers(ws_summary, stats_headers, current_row)
+
+            # Calcular estadísticas
+            stats_data = self._calculate_summary_statistics(final_groups)
+
+            for stat in stats_data:
+                for col, value in enumerate(stat, 1):
+                    cell = ws_summary.cell(row=current_row, column=col, value=value)
+                    cell.font = self.base_font
+                    cell.alignment = self.center_alignment if col > 1 else self.left_alignment
+                current_row += 1
+
+        except Exception as e:
+            print(f"Error al crear resumen general: {str(e)}")
+            raise
+
+    def _calculate_summary_statistics(self, final_groups):
+        """Calcular estadísticas para el resumen."""
+        unique_centers = len(self.engine.unique_portfolios)
+        total_centers = unique_centers + sum(len(centers) for centers in self.engine.identical_portfolios)
+        identical_centers = total_centers - unique_centers
+        initial_masters = len(self.engine.identical_portfolios) + len(self.engine.unique_portfolios)
+        final_masters = len(final_groups) + len(self.engine.non_compatible)
+        optimization_percentage = ((initial_masters - final_masters) / initial_masters * 100 
+                            if initial_masters > 0 else 0)
+        
+        return [
+            ("Total de Centros", total_centers, "100%"),
+            ("Centros en Grupos", identical_centers, f"{(identical_centers/total_centers)*100:.1f}%"),
+            ("Centros Únicos", unique_centers, f"{(unique_centers/total_centers)*100:.1f}%"),
+            ("Grupos Idénticos Iniciales", len(self.engine.identical_portfolios), "-"),
+            ("Planogramas Másteres Iniciales", initial_masters, "-"),
+            ("Planogramas Másteres Finales", final_masters, "-"),
+            ("Optimización de Planogramas", final_masters - initial_masters, 
+            f"{optimization_percentage:.1f}%"),
+            ("Centros sin Recomendación", len(self.engine.non_compatible), 
+            f"{(len(self.engine.non_compatible)/total_centers)*100:.1f}%")
+        ]
+
+    def export_identical_groups_sheet(self, writer):
+        """Exportar hoja de grupos idénticos."""
+        try:
+            self.update_progress("Procesando grupos idénticos...")
+            ws_identical = writer.book.create_sheet("Grupos Idénticos")
+            current_row = 1
+
+            current_row = self.create_title_row(ws_identical, "Grupos con Portafolios Idénticos")
+            
+            headers = ["Grupo", "Centros", "Cantidad de Centros", "PLUs", "Cantidad de PLUs"]
+            current_row = self.add_table_headers(ws_identical, headers, current_row)
+
+            for i, (centers, plus) in enumerate(self.engine.identical_portfolios.items(), 1):
+                self._add_identical_group_row(ws_identical, current_row, i, centers, plus)
+                current_row += 1
+
+        except Exception as e:
+            print(f"Error al procesar grupos idénticos: {str(e)}")
+            raise
+
+    def _add_identical_group_row(self, worksheet, row, group_num, centers, plus):
+        """Añadir una fila de grupo idéntico."""
+        row_data = [
+            f"Grupo {group_num}",
+            ", ".join(sorted(centers)),
+            len(centers),
+            ", ".join(map(str, sorted(plus))),
+            len(plus)
+        ]
+        
+        for col, value in enumerate(row_data, 1):
+            cell = worksheet.cell(row=row, column=col, value=value)
+            cell.font = self.base_font
+            cell.alignment = self.left_alignment if col in [2, 4] else self.center_alignment
+
+    def export_final_groups_sheet(self, writer, final_groups, geo_data=None, category=None):
+        """Exportar hoja de grupos finales y sus análisis."""
+        try:
+            self.update_progress("Generando información de grupos finales...")
+            ws_final = writer.book.create_sheet("Grupos Finales")
+            current_row = 1
+
+            current_row = self.create_title_row(ws_final, "Grupos Finales Optimizados")
+            
+            headers = ["Grupo", "Centros", "Cantidad de Centros", 
+                    "PLUs Diferentes", "Cantidad PLUs Dif.", "Total PLUs"]
+            current_row = self.add_table_headers(ws_final, headers, current_row)
+
+            for i, group in enumerate(final_groups, 1):
+                self.check_cancelled()
+                try:
+                    # Exportar grupo principal usando la hoja
+                    self._export_final_group(ws_final, i, group, current_row)
+                    current_row += 1
+
+                    # Crear nueva hoja para el grupo y exportar detalles
+                    ws_group = writer.book.create_sheet(f"Grupo Final {i}")
+                    self.configure_group_final_sheet(ws_group)
+                    
+                    group_row = 1
+                    
+                    # 1. Información básica del grupo
+                    group_row = self.create_title_row(
+                        ws_group, 
+                        f"Grupo Final {i}", 
+                        row=group_row,
+                        subtitle=f"Total centros: {len(group['centers'])}"
+                    )
+                    
+                    # Calcular PLUs diferentes
+                    diff_plus, all_plus = self.engine.calculate_total_different_plus(group['centers'])
+                    
+                    # Lista de centros
+                    headers = ["Centros", "PLUs Diferentes", "Total PLUs"]
+                    group_row = self.add_table_headers(ws_group, headers, group_row)
+                    
+                    # Datos básicos del grupo
+                    group_data = [
+                        ", ".join(sorted(group['centers'])),
+                        ", ".join(map(str, sorted(diff_plus))),
+                        len(all_plus)
+                    ]
+                    
+                    for col, value in enumerate(group_data, 1):
+                        cell = ws_group.cell(row=group_row, column=col, value=value)
+                        cell.font = self.base_font
+                        cell.alignment = self.left_alignment
+                    group_row += 2
+
+                    # Continuar con análisis adicionales si es necesario
+                    if geo_data is not None:
+                        self._add_region_distribution(ws_group, group, geo_data, group_row)
+                    
+                    if category:
+                        self._add_modulation_analysis(ws_group, group, category, group_row)
+
+                except Exception as e:
+                    print(f"Error al procesar Grupo Final {i}: {str(e)}")
+                    continue
+
+        except Exception as e:
+            print(f"Error al generar grupos finales: {str(e)}")
+            raise
+
+    def _export_final_group(self, worksheet, group_num, group, row):
+        """Exportar un grupo final a la hoja."""
+        try:
+            diff_plus, all_plus = self.engine.calculate_total_different_plus(group['centers'])
+            
+            row_data = [
+                f"Grupo Final {group_num}",
+                ", ".join(sorted(group['centers'])),
+                len(group['centers']),
+                ", ".join(map(str, sorted(diff_plus))),
+                len(diff_plus),
+                len(all_plus)
+            ]
+            
+            # Usar worksheet en lugar de writer
+            for col, value in enumerate(row_data, 1):
+                cell = worksheet.cell(row=row, column=col, value=value)
+                cell.font = self.base_font
+                cell.alignment = self.left_alignment if col in [2, 4] else self.center_alignment
+        except Exception as e:
+            print(f"Error al exportar grupo final {group_num}: {str(e)}")
+            raise
+
+    def _add_region_distribution(self, worksheet, group, geo_data, row):
+        """Agregar distribución por región a la hoja del grupo."""
+        try:
+            row = self.create_title_row(worksheet, "Distribución por Región", row)
+            
+            # Obtener datos del grupo
+            group_geo_data = geo_data[geo_data['Centro'].isin(group['centers'])]
+            
+            # Análisis por distrito
+            district_headers = ["Distrito", "Región", "Cantidad", "Porcentaje", "Centros"]
+            row = self.add_table_headers(worksheet, district_headers, row)
+            
+            # Colores para distritos
+            district_colors = {
+                'COSTA': PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid'),
+                'INTERIOR': PatternFill(start_color='E8F5E9', end_color='E8F5E9', fill_type='solid')
+            }
+
+            # Procesar cada distrito
+            for district in group_geo_data['Distrito'].unique():
+                district_data = group_geo_data[group_geo_data['Distrito'] == district]
+                
+                for region in district_data['Region'].unique():
+                    region_data = district_data[district_data['Region'] == region]
+                    centers = region_data['Centro'].tolist()
+                    percentage = (len(centers) / len(group['centers'])) * 100
+                    
+                    row_data = [
+                        district,
+                        region,
+                        len(centers),
+                        f"{percentage:.1f}%",
+                        ", ".join(sorted(centers))
+                    ]
+                    
+                    for col, value in enumerate(row_data, 1):
+                        cell = worksheet.cell(row=row, column=col, value=value)
+                        cell.font = self.base_font
+                        cell.alignment = self.left_alignment if col == 5 else self.center_alignment
+                        cell.fill = district_colors.get(district, self.alternate_fill)
+                    row += 1
+                    
+            return row + 2
+
+        except Exception as e:
+            print(f"Error al agregar distribución por región: {str(e)}")
+            raise
+
+    def _add_modulation_analysis(self, worksheet, group, category, row):
+        """Agregar análisis de modulación a la hoja del grupo."""
+        try:
+            row = self.create_title_row(
+                worksheet,
+                "Análisis de Modulación",
+                row,
+                subtitle=f"Categoría: {category}"
+            )
+            
+            modulation_data = self.engine.get_modulation_data(group['centers'], category)
+            if modulation_data:
+                headers = ["No. Módulos", "Cantidad de Centros", "Porcentaje", "Centros"]
+                row = self.add_table_headers(worksheet, headers, row)
+                
+                total_centers = sum(data['count'] for data in modulation_data.values())
+                
+                for num_modulos, data in modulation_data.items():
+                    percentage = (data['count'] / total_centers) * 100
+                    row_data = [
+                        num_modulos,
+                        data['count'],
+                        f"{percentage:.1f}%",
+                        ", ".join(sorted(data['centers']))
+                    ]
+                    
+                    for col, value in enumerate(row_data, 1):
+                        cell = worksheet.cell(row=row, column=col, value=value)
+                        cell.font = self.base_font
+                        cell.alignment = self.left_alignment if col == 4 else self.center_alignment
+                        
+                        # Colorear según el tipo de dato
+                        if num_modulos == "Datos vacíos":
+                            cell.fill = PatternFill(start_color='FEF3C7', end_color='FEF3C7', fill_type='solid')
+                        elif num_modulos == "No encontrados":
+                            cell.fill = self.warning_fill
+                    row += 1
+            else:
+                cell = worksheet.cell(
+                    row=row,
+                    column=1,
+                    value="No se encontraron datos de modulación para este grupo"
+                )
+                cell.font = self.base_font
+                cell.fill = self.warning_fill
+                row += 1
+
+            return row + 2
+
+        except Exception as e:
+            print(f"Error al agregar análisis de modulación: {str(e)}")
+            raise
+
+    def export_unique_centers_sheet(self, writer):
+        """Exportar hoja de centros únicos."""
+        try:
+            self.update_progress("Procesando centros únicos...")
+            unique_centers_data = [
+                (center, plus_set) 
+                for center, plus_set in self.engine.unique_portfolios.items()
+                if center not in self.engine.non_compatible
+            ]
+            self.create_centers_sheet(
+                writer.book,
+                "Centros únicos",
+                unique_centers_data,
+                self.base_font,
+                self.header_font,
+                self.header_fill
+            )
+        except Exception as e:
+            print(f"Error al procesar centros únicos: {str(e)}")
+            raise
+
+    def export_non_compatible_centers_sheet(self, writer):
+        """Exportar hoja de centros no compatibles."""
+        try:
+            self.update_progress("Procesando centros no compatibles...")
+            non_compatible_data = [
+                (center, self.engine.unique_portfolios[center])
+                for center in sorted(self.engine.non_compatible)
+            ]
+            self.create_centers_sheet(
+                writer.book,
+                "Centros no compatibles",
+                non_compatible_data,
+                self.base_font,
+                self.header_font,
+                self.header_fill
+            )
+        except Exception as e:
+            print(f"Error al procesar centros no compatibles: {str(e)}")
+            raise
+
+    def export_limit_sweep_sheet(self, writer):
+        """Exportar hoja con la curva de másteres finales por límite de PLUs."""
+        try:
+            self.update_progress("Exportando curva por límite...")
+            ws = writer.book.create_sheet("Curva por Límite")
+            # La curva no aplica la partición geográfica ni la mejora local del análisis
+            notes = self.engine.limit_sweep_notes()
+            current_row = self.create_title_row(
+                ws,
+                "Másteres finales por límite de PLUs" + (f" ({', '.join(notes)})" if notes else ""),
+                subtitle=f"Límite del análisis actual: {self.engine.current_plu_limit}"
+            )
+            
+            headers = ["Límite PLUs", "Másteres Iniciales", "Másteres Finales",
+                       "Grupos Finales", "Centros Agrupados", "Centros sin Agrupar"]
+            current_row = self.add_table_headers(ws, headers, current_row)
+            
+            for result in self.engine.limit_sweep_results:
+                values = [
+                    result['limit'],
+                    result['initial_masters'],
+                    result['final_masters'],
+                    result['final_groups'],
+                    result['grouped_centers'],
+                    result['non_compatible']
+                ]
+                for col, value in enumerate(values, 1):
+                    cell = ws.cell(row=current_row, column=col, value=value)
+                    cell.font = self.base_font
+                    cell.alignment = self.center_alignment
+                current_row += 1
+            
+            self._adjust_sheet_dimensions(ws)
+        except Exception as e:
+            print(f"Error al exportar la curva por límite: {str(e)}")
+            raise
+
+    def add_variation_analysis_sheets(self, writer):
+        """
+        Agrega hojas de análisis de variación para cada grupo final al archivo Excel.
+        """
+        try:
+            # Obtener grupos finales
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
+            
+            # Datos de Sheet1 ya limpios y con columnas en formato estándar
+            dataset = self.engine.get_dataset()
+            df = dataset.analysis_frame()
+            
+            # Procesar cada grupo final
+            for group_num, group in enumerate(final_groups, 1):
+                self.update_progress(f"Análisis de variación: Grupo Final {group_num}...")
+                try:
+                    sheet_name = f'Análisis GF. {group_num}'
+                    
+                    # Filtrar datos para el grupo actual
+                    df_group = df[dataset.center_mask(group['centers'])].copy()
+                    
+                    # Crear una columna auxiliar para el conteo
+                    df_group['count'] = 1
+                    
+                    # Configurar las columnas para el pivot
+                    fixed_cols = ['Categoria', 'Subcategoria', 'Segmento', 'PLU_SAP', 'Articulo']
+                    
+                    # Crear el pivot table
+                    pivot = pd.pivot_table(
+                        df_group,
+                        index=fixed_cols,
+                        columns=['Centro'],
+                        values='count',
+                        aggfunc='sum',
+                        fill_value=0
+                    )
+                    
+                    # Convertir a 1s y 0s
+                    pivot = (pivot > 0).astype(int)
+                    
+                    # Resetear índice
+                    pivot = pivot.reset_index()
+                    
+                    # Ordenar columnas
+                    center_cols = sorted([col for col in pivot.columns if col not in fixed_cols])
+                    pivot = pivot[fixed_cols + center_cols]
+                    
+                    # Escribir a Excel
+                    pivot.to_excel(writer, sheet_name=sheet_name, index=False)
+                    
+                    # Obtener la hoja y aplicar formato
+                    worksheet = writer.sheets[sheet_name]
+                    
+                    # Quitar las líneas de cuadrícula
+                    worksheet.sheet_view.showGridLines = False
+
+                    # Aplicar formato base a toda la hoja
+                    worksheet.font = Font(name='Segoe UI', size=10)
+
+                    # Formato para encabezados
+                    header_font = Font(name='Segoe UI', size=11, bold=True)
+                    header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
+                    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+                    # Aplicar formato a los encabezados
+                    for col in range(1, worksheet.max_column + 1):
+                        cell = worksheet.cell(row=1, column=col)
+                        cell.font = header_font
+                        cell.fill = header_fill
+                        cell.alignment = header_alignment
+
+                    # Ajustar anchos de columna y aplicar formatos
+                    for col in range(1, worksheet.max_column + 1):
+                        column_letter = get_column_letter(col)
+                        
+                        # Obtener el máximo ancho necesario para la columna
+                        max_length = 0
+                        for row in range(1, worksheet.max_row + 1):
+                            self.check_cancelled(row)
+                            cell = worksheet.cell(row=row, column=col)
+                            if cell.value:
+                                try:
+                                    max_length = max(max_length, len(str(cell.value)))
+                                except:
+                                    pass
+
+                        # Ajustar ancho basado en el contenido
+                        if worksheet.cell(row=1, column=col).value in ['Categoria', 'Subcategoria', 'Segmento', 'Articulo']:
+                            worksheet.column_dimensions[column_letter].width = min(max_length + 2, 40)
+                        elif 'PLU' in str(worksheet.cell(row=1, column=col).value):
+                            worksheet.column_dimensions[column_letter].width = 15
+                        else:
+                            worksheet.column_dimensions[column_letter].width = 8
+
+                    # Aplicar formato a las celdas de datos
+                    normal_font = Font(name='Segoe UI', size=10)
+                    normal_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+                    center_alignment = Alignment(horizontal='center', vertical='center')
+
+                    for row_number, row in enumerate(worksheet.iter_rows(min_row=2)):
+                        self.check_cancelled(row_number)
+                        for idx, cell in enumerate(row, 1):
+                            cell.font = normal_font
+                            
+                            # Alineación basada en el tipo de columna
+                            if idx <= 5:  # Primeras 5 columnas (categoría, subcategoría, etc.)
+                                cell.alignment = normal_alignment
+                            else:  # Columnas de centros
+                                cell.alignment = center_alignment
+
+                    # Congelar panel superior
+                    worksheet.freeze_panes = 'A2'
+                    
+                    print(f"Se exportó el análisis del Grupo Final {group_num}")
+                    
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    print(f"Error al procesar Grupo Final {group_num}: {str(e)}")
+                    continue
+                        
+        except Exception as e:
+            print(f"Error al exportar análisis de variación: {str(e)}")
+            raise
+
+    def add_consolidated_sheet(self, writer):
+        """
+        Agrega una hoja consolidada con información detallada de cada centro.
+        """
+        try:
+            # Cargar datos maestros
+            maestro_file = self.engine.get_data_path("db_maestrospdv.xlsx")
+            
+            if not os.path.exists(maestro_file):
+                raise FileNotFoundError("No se encontró el archivo db_maestrospdv.xlsx")
+                
+            # Leer datos maestros
+            df_maestro = pd.read_excel(maestro_file)
+            
+            # Obtener grupos finales
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
+            
+            # Crear DataFrame para la hoja consolidada
+            consolidated_data = []
+            
+            # Procesar cada grupo final
+            for group_num, group in enumerate(final_groups, 1):
+                # Procesar cada centro del grupo
+                for center in sorted(group['centers']):
+                    self.check_cancelled(len(consolidated_data))
+                    # Buscar información del centro en datos maestros
+                    centro_info = df_maestro[df_maestro['Centro'].astype(str).str.strip() == str(center)]
+                    
+                    # Obtener cantidad de PLUs para este centro
+                    plus_count = self.engine.center_index.plu_count(center)
+                    
+                    # Agregar fila al consolidado
+                    row = {
+                        'Grupo': f'Grupo Final {group_num}',
+                        'Centro': center,
+                        'Formato': centro_info['Formato'].iloc[0] if not centro_info.empty else '-',
+                        'Región': centro_info['Región'].iloc[0] if not centro_info.empty else '-',
+                        'Ciudad': centro_info['Ciudad'].iloc[0] if not centro_info.empty else '-',
+                        'Estrato': centro_info['Estrato'].iloc[0] if not centro_info.empty else '-',
+                        'Cant. PLUs': plus_count
+                    }
+                    consolidated_data.append(row)
+            
+            # Agregar centros sin recomendación
+            for center in sorted(self.engine.non_compatible):
+                self.check_cancelled(len(consolidated_data))
+                # Buscar información del centro en datos maestros
+                centro_info = df_maestro[df_maestro['Centro'].astype(str).str.strip() == str(center)]
+                
+                # Obtener cantidad de PLUs del centro
+                plus_count = self.engine.center_index.plu_count(center)
+                
+                # Agregar fila al consolidado
+                row = {
+                    'Grupo': '-',
+                    'Centro': center,
+                    'Formato': centro_info['Formato'].iloc[0] if not centro_info.empty else '-',
+                    'Región': centro_info['Región'].iloc[0] if not centro_info.empty else '-',
+                    'Ciudad': centro_info['Ciudad'].iloc[0] if not centro_info.empty else '-',
+                    'Estrato': centro_info['Estrato'].iloc[0] if not centro_info.empty else '-',
+                    'Cant. PLUs': plus_count
+                }
+                consolidated_data.append(row)
+
+            # Crear DataFrame
+            df_consolidated = pd.DataFrame(consolidated_data)
+            
+            # Escribir a Excel con formato
+            df_consolidated.to_excel(writer, sheet_name='Consolidado', index=False)
+            
+            # Obtener la hoja
+            worksheet = writer.sheets['Consolidado']
+            
+            # Configurar formato
+            header_format = {
+                'font': Font(name='Segoe UI', size=11, bold=True),
+                'fill': PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid'),
+                'alignment': Alignment(horizontal='center', vertical='center')
+            }
+            
+            # Aplicar formato a encabezados
+            for col in range(1, len(df_consolidated.columns) + 1):
+                cell = worksheet.cell(row=1, column=col)
+                cell.font = header_format['font']
+                cell.fill = header_format['fill']
+                cell.alignment = header_format['alignment']
+            
+            # Formato para celdas de datos
+            data_format = Font(name='Segoe UI', size=10)
+            center_alignment = Alignment(horizontal='center', vertical='center')
+            left_alignment = Alignment(horizontal='left', vertical='center')
+            
+            # Aplicar formato a datos
+            for row in range(2, len(df_consolidated) + 2):
+                self.check_cancelled(row)
+                for col in range(1, len(df_consolidated.columns) + 1):
+                    cell = worksheet.cell(row=row, column=col)
+                    cell.font = data_format
+                    
+                    # Alineación específica por columna
+                    if col in [1, 2, 7]:  # Grupo, Centro, Cant. PLUs
+                        cell.alignment = center_alignment
+                    else:
+                        cell.alignment = left_alignment
+            
+            # Ajustar anchos de columna
+            for col in worksheet.columns:
+                max_length = 0
+                column = col[0].column_letter
+                
+                for row_number, cell in enumerate(col):
+                    self.check_cancelled(row_number)
+                    try:
+                        if len(str(cell.value)) > max_length:
+                            max_length = len(str(cell.value))
+                    except:
+                        pass
+                        
+                adjusted_width = (max_length + 2)
+                worksheet.column_dimensions[column].width = min(adjusted_width, 40)
+            
+            # Agregar bordes a la tabla
+            border = Border(
+                left=Side(style='thin'),
+                right=Side(style='thin'),
+                top=Side(style='thin'),
+                bottom=Side(style='thin')
+            )
+            
+            for row_number, row in enumerate(worksheet.iter_rows(min_row=1, max_row=len(df_consolidated) + 1)):
+                self.check_cancelled(row_number)
+                for cell in row:
+                    cell.border = border
+            
+            # Congelar panel superior
+            worksheet.freeze_panes = 'A2'
+            
+        except Exception as e:
+            print(f"Error al crear hoja consolidada: {str(e)}")
+            raise
+
+    def add_initial_sheet(self, writer):
+        try:
+            # Usar la hoja Sheet1 ya cargada del archivo original
+            df = self.engine.get_dataset().df
+            
+            # Función para normalizar texto (eliminar tildes y mayúsculas)
+            def normalize_text(text):
+                """Elimina tildes y convierte a mayúsculas"""
+                # Convertir a string por si acaso
+                text = str(text)
+                # Convertir a mayúsculas
+                text = text.upper()
+                # Normalizar caracteres (NFD descompone los caracteres con tilde)
+                text = unicodedata.normalize('NFD', text)
+                # Eliminar los caracteres diacríticos
+                text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+                return text.strip()
+
+            # Columnas exactas que queremos (sin variaciones)
+            exact_columns = {
+                'DIRECCION NAL.': ['Dirección Nal.', 'DIRECCION NAL', 'DIRECCION NACIONAL'],
+                'CLUSTER': ['Cluster', 'CLUSTER'],
+                'LLAVECP': ['LLAVECP', 'LLAVE CP', 'LLAVE_CP'],
+                'MARCA': ['Marca', 'MARCA'],
+                'CLASEMARCA': ['ClaseMarca', 'CLASE MARCA', 'CLASE_MARCA'],
+                'VENTA 6 MESES': ['Venta 6 Meses', 'VENTA 6 MESES', 'VENTA_6_MESES']
+            }
+            
+            # Columnas que tienen variaciones en ColumnValidator
+            column_types = [
+                'CENTRO', 'PLU_SAP', 'CATEGORIA', 'SUBCATEGORIA', 
+                'SEGMENTO', 'ARTICULO'
+            ]
+            
+            # Normalizar nombres de columnas del DataFrame (sin modificar el original)
+            df = df.rename(columns=str)
+            normalized_columns = {normalize_text(col): col for col in df.columns}
+            
+            # Usar el validador para encontrar las columnas con variaciones
+            found_columns = {}
+            for col_type in column_types:
+                try:
+                    found_col = self.engine.column_validator.find_column(df, col_type, raise_error=False)
+                    if found_col:
+                        found_columns[col_type] = found_col
+                except Exception:
+                    continue
+            
+            # Buscar columnas exactas normalizando nombres
+            exact_found_columns = {}
+            for col_key, variations in exact_columns.items():
+                for variation in variations:
+                    normalized_variation = normalize_text(variation)
+                    if normalized_variation in normalized_columns.keys():
+                        exact_found_columns[col_key] = normalized_columns[normalized_variation]
+                        break
+            
+            # Crear lista de todas las columnas a mantener
+            columns_to_keep = []
+            
+            # Agregar columnas encontradas por el validador
+            columns_to_keep.extend(found_columns.values())
+            
+            # Agregar columnas exactas encontradas
+            columns_to_keep.extend(exact_found_columns.values())
+            
+            # Verificar si tenemos al menos la columna Centro para poder agregar el grupo
+            if 'CENTRO' not in found_columns:
+                raise ValueError("La columna Centro es requerida para generar la hoja Sheet1")
+            
+            # Crear nuevo DataFrame con todas las columnas encontradas
+            df_new = df[columns_to_keep].copy()
+            
+            # Obtener grupos finales
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
+            
+            # Crear diccionario de mapeo centro -> grupo
+            centro_grupo_map = {}
+            for group_num, group in enumerate(final_groups, 1):
+                for center in group['centers']:
+                    centro_grupo_map[str(center)] = f'Grupo Final {group_num}'
+            
+            # Insertar columna de Grupo al inicio
+            centro_col = found_columns['CENTRO']
+            df_new.insert(0, 'Grupo', df_new[centro_col].astype(str).map(centro_grupo_map).fillna('-'))
+            
+            # Escribir a Excel (por tandas, para poder cancelar entre ellas)
+            self._write_frame(writer, df_new, 'Sheet1')
+            
+            # Aplicar formato
+            worksheet = writer.sheets['Sheet1']
+            
+            # Formato para encabezados
+            header_format = Font(name='Segoe UI', size=11, bold=True)
+            header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
+            
+            # Aplicar formato a encabezados
+            for col in range(1, len(df_new.columns) + 1):
+                cell = worksheet.cell(row=1, column=col)
+                cell.font = header_format
+                cell.fill = header_fill
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+            
+            # Formato para datos y formato especial para Venta 6 Meses
+            for row in range(2, len(df_new) + 2):
+                self.check_cancelled(row)
+                for col in range(1, len(df_new.columns) + 1):
+                    cell = worksheet.cell(row=row, column=col)
+                    cell.font = Font(name='Segoe UI', size=10)
+                    cell.alignment = Alignment(horizontal='left', vertical='center')
+                    
+                    # Aplicar formato de contabilidad a Venta 6 Meses
+                    if normalize_text(df_new.columns[col-1]) == 'VENTA 6 MESES':
+                        cell.number_format = '"$"#,##0_);("$"#,##0)'
+            
+            # Ajustar anchos de columna
+            for col in worksheet.columns:
+                max_length = 0
+                for row_number, cell in enumerate(col):
+                    self.check_cancelled(row_number)
+                    try:
+                        max_length = max(max_length, len(str(cell.value)))
+                    except:
+                        pass
+                worksheet.column_dimensions[col[0].column_letter].width = min(max_length + 2, 40)
+            
+            # Agregar bordes
+            border = Border(
+                left=Side(style='thin'),
+                right=Side(style='thin'),
+                top=Side(style='thin'),
+                bottom=Side(style='thin')
+            )
+            
+            for row_number, row in enumerate(worksheet.iter_rows(min_row=1, max_row=len(df_new) + 1)):
+                self.check_cancelled(row_number)
+                for cell in row:
+                    cell.border = border
+            
+            # Congelar panel superior
+            worksheet.freeze_panes = 'A2'
+            
+        except Exception as e:
+            print(f"Error al crear hoja Sheet1: {str(e)}")
+            raise
+
+    def _write_frame(self, writer, df, sheet_name):
+        """Escribe df (con encabezados, sin índice) en tandas de CANCEL_CHECK_ROWS filas."""
+        df.iloc[:0].to_excel(writer, sheet_name=sheet_name, index=False)
+        for start in range(0, len(df), self.CANCEL_CHECK_ROWS):
+            self.check_cancelled()
+            df.iloc[start:start + self.CANCEL_CHECK_ROWS].to_excel(
+                writer, sheet_name=sheet_name, index=False, header=False, startrow=start + 1
+            )
+
+    def create_centers_sheet(self, workbook, title, centers_data, base_font, header_font, header_fill):
+        """
+        Crea una hoja para listar centros con formato profesional.
+        
+        Args:
+            workbook: Workbook de openpyxl
+            title: Título de la hoja
+            centers_data: Lista de tuplas (centro, plus)
+            base_font: Fuente base
+            header_font: Fuente para encabezados
+            header_fill: Relleno para encabezados
+        """
+        ws = workbook.create_sheet(title)
+        current_row = 1
+        
+        # Título
+        cell = ws.cell(row=current_row, column=1, value=title)
+        cell.font = Font(name='Segoe UI', size=14, bold=True)
+        cell.alignment = Alignment(horizontal='left', vertical='center')
+        current_row += 2
+        
+        # Encabezados
+        headers = ["Centro", "Cantidad de PLUs", "PLUs"]
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=current_row, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+        current_row += 1
+        
+        # Datos
+        for center, plus_set in centers_data:
+            row_data = [
+                center,
+                len(plus_set),
+                ", ".join(map(str, sorted(plus_set)))
+            ]
+            
+            for col, value in enumerate(row_data, 1):
+                cell = ws.cell(row=current_row, column=col, value=value)
+                cell.font = base_font
+                cell.alignment = Alignment(
+                    horizontal='left' if col == 3 else 'center',
+                    vertical='center',
+                    wrap_text=True
+                )
+            current_row += 1
+        
+        # Ajustar ancho de columnas
+        self.adjust_column_widths(ws)
+        
+        return ws
+
+    def create_title_row(self, ws, title, row=1, subtitle=None):
+        """Crear fila de título con formato y opcional subtítulo."""
+        cell = ws.cell(row=row, column=1, value=title)
+        cell.font = self.title_font
+        cell.alignment = self.left_alignment
+        
+        if subtitle:
+            sub_cell = ws.cell(row=row+1, column=1, value=subtitle)
+            sub_cell.font = self.subtitle_font
+            sub_cell.alignment = self.left_alignment
+            return row + 3
+        return row + 2
+
+    def add_table_headers(self, ws, headers, row):
+        """Agregar encabezados de tabla con formato."""
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=row, column=col, value=header)
+            cell.font = self.header_font
+            cell.fill = self.header_fill
+            cell.alignment = self.center_alignment
+        return row + 1
+
+    def format_pivot_tables(self, workbook):
+        """
+        Aplica formato de tabla dinámica y ajuste de texto a todas las hojas.
+        
+        Args:
+            workbook: Workbook de openpyxl
+        """
+        for ws in workbook.worksheets:
+            # Aplicar wrap_text y alineación a todas las celdas con contenido
+            for row in ws.rows:
+                for cell in row:
+                    if cell.value:  # Solo configurar celdas con contenido
+                        cell.alignment = Alignment(
+                            horizontal='left',
+                            vertical='center',
+                            wrap_text=True
+                        )
+            
+            # Ajustar ancho de columnas para todas las hojas
+            self.adjust_column_widths(ws)
+            
+            # Aplicar formato de tabla solo a las hojas que no son de grupos finales
+            if not ws.title.startswith("Grupo Final"):
+                try:
+                    # Encontrar el rango de datos
+                    data_range = f"A3:{get_column_letter(ws.max_column)}{ws.max_row}"
+                    
+                    # Crear tabla con estilo personalizado
+                    table = Table(
+                        displayName=f"Table_{ws.title.replace(' ', '_')}",
+                        ref=data_range
+                    )
+                    
+                    # Aplicar estilo de tabla
+                    style = TableStyleInfo(
+                        name="TableStyleMedium20",
+                        showFirstColumn=False,
+                        showLastColumn=False,
+                        showRowStripes=True,
+                        showColumnStripes=False
+                    )
+                    table.tableStyleInfo = style
+                                
+                    # Agregar tabla a la hoja
+                    ws.add_table(table)
+                    
+                except Exception:
+                    # Ignorar errores si la hoja no puede tener formato de tabla
+                    continue
+
+    def adjust_column_widths(self, worksheet, min_width=8, max_width=60):
+        """
+        Ajusta el ancho de las columnas según el contenido.
+        
+        Args:
+            worksheet: Worksheet de openpyxl
+            min_width: Ancho mínimo de columna
+            max_width: Ancho máximo de columna
+        """
+        for column in worksheet.columns:
+            max_length = 0
+            column_letter = get_column_letter(column[0].column)
+            
+            # Calcular el ancho máximo necesario
+            for cell in column:
+                try:
+                    if cell.value:
+                        cell_length = len(str(cell.value))
+                        # Considerar saltos de línea
+                        if '\n' in str(cell.value):
+                            cell_length = max(len(line) for line in str(cell.value).split('\n'))
+                        max_length = max(max_length, cell_length)
+                except:
+                    pass
+            
+            # Ajustar el ancho con padding
+            adjusted_width = (max_length + 2)
+            worksheet.column_dimensions[column_letter].width = max(min(adjusted_width, max_width), min_width)
+
+    def configure_group_final_sheet(self, worksheet):
+        """
+        Configura el formato específico para las hojas de grupos finales.
+        
+        Args:
+            worksheet: Worksheet de openpyxl
+        """
+        # Fijar ancho de columnas específicas
+        fixed_width_columns = {'A': 40, 'B': 40, 'D': 40, 'E': 40}
+        for col, width in fixed_width_columns.items():
+            worksheet.column_dimensions[col].width = width
+        
+        # Activar wrap text para todas las celdas
+        for row in worksheet.rows:
+            for cell in row:
+                if cell.value:  # Solo configurar celdas con contenido
+                    cell.alignment = Alignment(
+                        horizontal='left',
+                        vertical='center',
+                        wrap_text=True
+                    )
+
+    def _adjust_sheet_dimensions(self, worksheet):
+        """Ajustar dimensiones de columnas y filas."""
+        # Ajustar columnas
+        for column in worksheet.columns:
+            max_length = 0
+            column_letter = get_column_letter(column[0].column)
+            
+            for cell in column:
+                try:
+                    if cell.value:
+                        max_length = max(max_length, len(str(cell.value)))
+                except:
+                    continue
+            
+            adjusted_width = (max_length + 2)
+            worksheet.column_dimensions[column_letter].width = min(adjusted_width, 100)
+
+        # Ajustar filas
+        for row in worksheet.rows:
+            max_height = 0
+            for cell in row:
+                if cell.value:
+                    text_lines = str(cell.value).count('\n') + 1
+                    line_height = 15
+                    needed_height = text_lines * line_height
+                    max_height = max(max_height, needed_height)
+            
+            if max_height > 15:
+                worksheet.row_dimensions[row[0].row].height = max_height
+
+    def _adjust_group_sheet_dimensions(self, worksheet):
+        """Ajustar dimensiones de la hoja de grupo."""
+        try:
+            # Ajustar columnas
+            for column in worksheet.columns:
+                max_length = 0
+                column_letter = get_column_letter(column[0].column)
+                
+                for cell in column:
+                    try:
+                        if cell.value:
+                            max_length = max(max_length, len(str(cell.value)))
+                    except:
+                        continue
+                
+                adjusted_width = (max_length + 2)
+                worksheet.column_dimensions[column_letter].width = min(adjusted_width, 100)
+
+            # Ajustar filas
+            for row in worksheet.rows:
+                max_height = 0
+                for cell in row:
+                    if cell.value:
+                        text_lines = str(cell.value).count('\n') + 1
+                        line_height = 15
+                        needed_height = text_lines * line_height
+                        max_height = max(max_height, needed_height)
+                
+                if max_height > 15:
+                    worksheet.row_dimensions[row[0].row].height = max_height
+
+        except Exception as e:
+            print(f"Error al ajustar dimensiones de la hoja: {str(e)}")
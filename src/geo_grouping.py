@@ -0,0 +1,234 @@
+# src/geo_grouping.py
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from component_grouping import ComponentGrouping
+from group_accumulator import GroupAccumulator, agglomerate
+from pair_search import PairSearch
+from portfolio_bits import BitPortfolio
+
+
+class GeoPartitionGrouping:
+    """
+    Grupos finales por partición geográfica (divide y vencerás).
+
+    Los centros se reparten por una columna de los datos maestros
+    (load_geographic_data: 'Distrito' o 'Region') y cada partición se agrupa
+    por separado con ComponentGrouping, en un grupo de procesos si se indica
+    más de uno. Los centros sin datos maestros forman su propia partición.
+    Un grupo idéntico con centros de varias particiones se divide entre
+    ellas.
+
+    Como los pares solo se comparan dentro de cada partición, el número de
+    comparaciones baja de n² / 2 a la suma de los cuadrados de los tamaños de
+    las particiones. Después, si cross_merge es True, se intentan fusiones
+    entre particiones solo entre representantes: cada grupo resultante y
+    cada centro sin agrupar, descritos por la unión y la intersección de sus
+    PLUs (ver agglomerate). Nunca se supera el límite de PLUs diferentes.
+    """
+    PARTITION_KEYS = ('Distrito', 'Region')
+    MISSING_KEY = 'Sin dato'
+    # Tandas por proceso (más tandas reparten mejor la carga)
+    BATCHES_PER_WORKER = 2
+
+    def __init__(self, identical_portfolios, unique_portfolios, geo_data, key='Distrito', method='greedy',
+                 workers=1, cross_merge=True, cancel_token=None):
+        """
+        Args:
+            identical_portfolios: {tupla de centros: BitPortfolio}
+            unique_portfolios: {centro: BitPortfolio}
+            geo_data: DataFrame de load_geographic_data (columnas Centro, Distrito, Region)
+            key: Columna de geo_data que define las particiones (ver PARTITION_KEYS)
+            method: Algoritmo de agrupación de cada partición (ver GROUPING_METHODS)
+            workers: Procesos para agrupar las particiones (1 = en este proceso)
+            cross_merge: Intentar fusiones entre particiones al final
+            cancel_token: CancellationToken opcional
+        """
+        if key not in self.PARTITION_KEYS:
+            raise ValueError(f"Partición geográfica no válida: {key}")
+        self.identical_portfolios = identical_portfolios
+        self.unique_portfolios = unique_portfolios
+        self.key = key
+        self.method = method
+        self.workers = max(1, int(workers or 1))
+        self.cross_merge = cross_merge
+        self.cancel_token = cancel_token
+        self.stats = {}
+
+        self._center_keys = dict(zip(geo_data['Centro'].astype(str), geo_data[key].astype(str)))
+        self._portfolios = {}
+        for centers, portfolio in identical_portfolios.items():
+            for center in centers:
+                self._portfolios[center] = portfolio
+        self._portfolios.update(unique_portfolios)
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def partitions(self):
+        """
+        Portafolios de cada partición, en el orden de los datos de entrada.
+
+        Returns:
+            dict: valor de la partición -> (idénticos [(tupla de centros, bits)],
+                únicos [(centro, bits)]), ordenado por valor (sin datos al final)
+        """
+        partitions = {}
+
+        def partition(center):
+            value = self._center_keys.get(str(center), self.MISSING_KEY)
+            return partitions.setdefault(value, ([], []))
+
+        for centers, portfolio in self.identical_portfolios.items():
+            by_value = {}
+            for center in centers:
+                by_value.setdefault(self._center_keys.get(str(center), self.MISSING_KEY), []).append(center)
+            for members in by_value.values():
+                identical, unique = partition(members[0])
+                if len(members) > 1:
+                    identical.append((tuple(members), portfolio.bits))
+                else:
+                    unique.append((members[0], portfolio.bits))
+        for center, portfolio in self.unique_portfolios.items():
+            partition(center)[1].append((center, portfolio.bits))
+
+        return dict(sorted(partitions.items(), key=lambda item: (item[0] == self.MISSING_KEY, item[0])))
+
+    def run(self, plu_limit):
+        """
+        Forma los grupos finales con a lo sumo plu_limit PLUs diferentes por grupo.
+
+        Returns:
+            tuple: (lista de GroupAccumulator, lista ordenada de centros no compatibles)
+        """
+        start = time.perf_counter()
+        if not self._portfolios:
+            return [], []
+        index = next(iter(self._portfolios.values())).index
+
+        partitions = self.partitions()
+        tasks = list(partitions.values())
+        if self.workers > 1 and len(tasks) > 1:
+            results = self._run_parallel(index, tasks, plu_limit)
+        else:
+            results = []
+            for task in tasks:
+                self._check_cancelled()
+                results.append(_group_partition(index, task, plu_limit, self.method))
+
+        # Representantes: grupos de cada partición y centros sin agrupar
+        representatives = []
+        for groups, non_compatible in results:
+            representatives.extend(groups)
+            representatives.extend([center] for center in non_compatible)
+
+        merges = 0
+        if self.cross_merge and len(representatives) > 1:
+            clusters = self._merge_representatives(index, representatives, plu_limit)
+            merges = len(representatives) - len(clusters)
+            groups = [[center for member in cluster for center in representatives[member]] for cluster in clusters]
+        else:
+            groups = representatives
+
+        accumulators = []
+        non_compatible = []
+        for centers in groups:
+            if len(centers) == 1:
+                non_compatible.extend(centers)
+            else:
+                accumulators.append(self._accumulator(index, centers))
+
+        sizes = [sum(len(centers) for centers, _ in identical) + len(unique) for identical, unique in tasks]
+        portfolio_counts = [len(identical) + len(unique) for identical, unique in tasks]
+        total = len(self.identical_portfolios) + len(self.unique_portfolios)
+        self.stats = {
+            'key': self.key,
+            'partitions': len(tasks),
+            'largest_partition': max(sizes),
+            'possible_pairs': sum(count * (count - 1) // 2 for count in portfolio_counts),
+            'total_pairs': total * (total - 1) // 2,
+            'representatives': len(representatives),
+            'cross_merges': merges,
+            'parallel': self.workers > 1 and len(tasks) > 1,
+            'seconds': time.perf_counter() - start
+        }
+        return accumulators, sorted(non_compatible)
+
+    def _merge_representatives(self, index, representatives, plu_limit):
+        """Fusiones entre representantes que quedan dentro del límite (ver agglomerate)."""
+        union_bits, common_bits = [], []
+        for centers in representatives:
+            bits = [self._portfolios[center].bits for center in centers]
+            union, common = bits[0], bits[0]
+            for other in bits[1:]:
+                union |= other
+                common &= other
+            union_bits.append(union)
+            common_bits.append(common)
+
+        # Solo pueden fusionarse representantes cuyas uniones difieren en
+        # plu_limit PLUs o menos (esos PLUs quedan como diferentes)
+        close_pairs = PairSearch(
+            [BitPortfolio(bits, index) for bits in union_bits], cancel_token=self.cancel_token
+        ).find_pairs(plu_limit)
+        pairs = zip(close_pairs.left.tolist(), close_pairs.right.tolist())
+        return agglomerate(union_bits, common_bits, pairs, plu_limit, self.cancel_token)
+
+    def _accumulator(self, index, centers):
+        """GroupAccumulator de un grupo (los centros con el mismo portafolio se agregan juntos)."""
+        accumulator = GroupAccumulator(index)
+        by_portfolio = {}
+        for center in centers:
+            portfolio = self._portfolios[center]
+            by_portfolio.setdefault(id(portfolio), (portfolio, []))[1].append(center)
+        for portfolio, members in by_portfolio.values():
+            accumulator.add(portfolio, members)
+        return accumulator
+
+    def _run_parallel(self, index, tasks, plu_limit):
+        """Agrupa las particiones en tandas repartidas entre procesos."""
+        # Tandas intercaladas de la partición más grande a la más pequeña
+        order = sorted(range(len(tasks)), key=lambda k: len(tasks[k][0]) + len(tasks[k][1]), reverse=True)
+        n_batches = min(len(tasks), self.workers * self.BATCHES_PER_WORKER)
+        batches = [order[k::n_batches] for k in range(n_batches)]
+
+        results = [None] * len(tasks)
+        executor = ProcessPoolExecutor(max_workers=min(self.workers, n_batches))
+        try:
+            futures = {
+                executor.submit(_group_batch, index, [tasks[k] for k in batch], plu_limit, self.method): batch
+                for batch in batches
+            }
+            pending = set(futures)
+            while pending:
+                self._check_cancelled()
+                done, pending = wait(pending, timeout=0.1)
+                for future in done:
+                    for k, result in zip(futures[future], future.result()):
+                        results[k] = result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
+
+
+def _group_partition(index, task, plu_limit, method):
+    """
+    Agrupa una partición.
+
+    Returns:
+        tuple: (lista con los centros de cada grupo, centros no compatibles)
+    """
+    identical, unique = task
+    grouping = ComponentGrouping(
+        {centers: BitPortfolio(bits, index) for centers, bits in identical},
+        {center: BitPortfolio(bits, index) for center, bits in unique},
+        method=method
+    )
+    accumulators, non_compatible = grouping.run(plu_limit)
+    return [sorted(accumulator.centers) for accumulator in accumulators], non_compatible
+
+
+def _group_batch(index, tasks, plu_limit, method):
+    """Tanda de particiones en un proceso de trabajo."""
+    return [_group_partition(index, task, plu_limit, method) for task in tasks]
@@ -0,0 +1,371 @@
+# src/group_accumulator.py
+import heapq
+
+from lazy_loader import LazyLoader
+from pair_search import PairSearch
+from portfolio_bits import BitPortfolio
+
+np = LazyLoader('numpy')
+
+# Algoritmos de agrupación final (ver build_final_groups)
+GROUPING_METHODS = ('greedy', 'agglomerative')
+
+
+class GroupAccumulator:
+    """
+    Grupo de centros en construcción con el conteo de cada PLU.
+
+    Guarda cuántos centros del grupo tienen cada PLU y cuántos PLUs hay con
+    cada conteo. Un PLU es diferente si lo tienen algunos centros pero no
+    todos (0 < conteo < centros), de modo que agregar o quitar un portafolio,
+    o probar cuántos PLUs diferentes quedarían al agregarlo, cuesta
+    O(|portafolio|) en lugar de recalcular la unión y la intersección del
+    grupo completo.
+    """
+
+    def __init__(self, plu_index):
+        """
+        Args:
+            plu_index: PluIndex de los portafolios que se agregarán
+        """
+        self.index = plu_index
+        self.centers = set()
+        self.counts = np.zeros(len(plu_index), dtype=np.int64)
+        # histogram[k]: número de PLUs que tienen exactamente k centros del grupo
+        self.histogram = np.zeros(2, dtype=np.int64)
+        self.total_plus = 0
+
+    @classmethod
+    def from_portfolio(cls, portfolio, centers):
+        """Crea un grupo con los centros dados, todos con el mismo portafolio."""
+        group = cls(portfolio.index)
+        group.add(portfolio, centers)
+        return group
+
+    def __len__(self):
+        return len(self.centers)
+
+    @property
+    def different_count(self):
+        """Número de PLUs presentes en algunos centros del grupo pero no en todos."""
+        if not self.centers:
+            return 0
+        return self.total_plus - int(self.histogram[len(self.centers)])
+
+    def test_add(self, portfolio):
+        """
+        PLUs diferentes que tendría el grupo al agregar centros con este
+        portafolio, sin modificar el grupo (no depende de cuántos centros).
+        """
+        current = self.counts[portfolio.codes()]
+        total_plus = self.total_plus + int(np.count_nonzero(current == 0))
+        # Solo los PLUs del portafolio pueden quedar en todos los centros
+        common = int(np.count_nonzero(current == len(self.centers)))
+        return total_plus - common
+
+    def add(self, portfolio, centers):
+        """Agrega centros que comparten el mismo portafolio."""
+        centers = [center for center in centers if center not in self.centers]
+        if not centers:
+            return
+        self.centers.update(centers)
+        self._update(portfolio.codes(), len(centers))
+
+    def remove(self, portfolio, centers):
+        """Quita centros que comparten el mismo portafolio."""
+        centers = [center for center in centers if center in self.centers]
+        if not centers:
+            return
+        self.centers.difference_update(centers)
+        self._update(portfolio.codes(), -len(centers))
+
+    def _update(self, codes, weight):
+        old_counts = self.counts[codes]
+        new_counts = old_counts + weight
+        self.counts[codes] = new_counts
+
+        if len(self.histogram) <= len(self.centers):
+            self.histogram = np.concatenate([
+                self.histogram, np.zeros(len(self.centers) + 1, dtype=np.int64)
+            ])
+        np.subtract.at(self.histogram, old_counts, 1)
+        np.add.at(self.histogram, new_counts, 1)
+        self.total_plus += int(np.count_nonzero(old_counts == 0)) - int(np.count_nonzero(new_counts == 0))
+
+    def different_plus(self):
+        """BitPortfolio con los PLUs diferentes del grupo."""
+        mask = (self.counts > 0) & (self.counts < len(self.centers))
+        return BitPortfolio(self.index.encode_codes(np.flatnonzero(mask)), self.index)
+
+    def all_plus(self):
+        """BitPortfolio con todos los PLUs del grupo."""
+        return BitPortfolio(self.index.encode_codes(np.flatnonzero(self.counts)), self.index)
+
+
+def build_final_groups(identical_portfolios, unique_portfolios, plu_limit, neighbors=None,
+                       cancel_token=None, method='greedy'):
+    """
+    Forma los grupos finales con a lo sumo plu_limit PLUs diferentes por grupo.
+
+    Con method='greedy' (el algoritmo original) FASE 1 fusiona los grupos
+    idénticos, FASE 2 agrega los centros únicos al primer grupo donde caben
+    y FASE 3 forma grupos nuevos con los centros que quedan. Con
+    method='agglomerative' se usa build_agglomerative_groups.
+
+    Args:
+        identical_portfolios: {tupla de centros: BitPortfolio}
+        unique_portfolios: {centro: BitPortfolio}
+        plu_limit: Máximo de PLUs diferentes por grupo
+        neighbors: Opcional. neighbors[p] es el conjunto de portafolios a
+            distancia <= plu_limit del portafolio p (numerados como en
+            CenterIndex: primero los idénticos y luego los únicos). Un
+            portafolio a más de plu_limit de algún miembro no puede entrar al
+            grupo, así que solo se prueban los vecinos y el resultado es el
+            mismo que sin ellos.
+        cancel_token: CancellationToken opcional; se revisa en cada paso
+        method: Uno de GROUPING_METHODS
+
+    Returns:
+        tuple: (lista de GroupAccumulator, lista ordenada de centros no compatibles)
+    """
+    if method not in GROUPING_METHODS:
+        raise ValueError(f"Método de agrupación no válido: {method}")
+    if method == 'agglomerative':
+        return build_agglomerative_groups(
+            identical_portfolios, unique_portfolios, plu_limit, neighbors, cancel_token
+        )
+
+    assigned_centers = set()
+    accumulators = []
+    # Grupo final de cada portafolio ya asignado (para buscar entre vecinos)
+    portfolio_groups = {}
+
+    # FASE 1: Fusionar grupos existentes
+    groups = list(identical_portfolios.items())
+    n = len(groups)
+    used_groups = set()
+
+    for i in range(n):
+        if i in used_groups:
+            continue
+        if cancel_token is not None:
+            cancel_token.check()
+
+        accumulator = GroupAccumulator.from_portfolio(groups[i][1], groups[i][0])
+        used_groups.add(i)
+        members = [i]
+        candidates = range(n) if neighbors is None else sorted(j for j in neighbors[i] if j < n)
+
+        # Intentar fusionar con otros grupos
+        changed = True
+        while changed:
+            changed = False
+            for j in candidates:
+                if j in used_groups:
+                    continue
+
+                # Probar fusión sin modificar el grupo
+                if accumulator.test_add(groups[j][1]) <= plu_limit:
+                    accumulator.add(groups[j][1], groups[j][0])
+                    used_groups.add(j)
+                    members.append(j)
+                    changed = True
+
+        for member in members:
+            portfolio_groups[member] = len(accumulators)
+        accumulators.append(accumulator)
+        assigned_centers.update(accumulator.centers)
+
+    # FASE 2: Intentar agregar centros únicos a grupos existentes (en el orden
+    # de unique_portfolios, así el resultado no depende del orden de un set)
+    unique_ids = {center: n + k for k, center in enumerate(unique_portfolios)}
+    unassigned_centers = [center for center in unique_portfolios if center not in assigned_centers]
+    non_compatible = []
+
+    for center in unassigned_centers:
+        if cancel_token is not None:
+            cancel_token.check()
+        portfolio = unique_portfolios[center]
+        if neighbors is None:
+            candidates = range(len(accumulators))
+        else:
+            candidates = sorted({
+                portfolio_groups[other] for other in neighbors[unique_ids[center]]
+                if other in portfolio_groups
+            })
+
+        # Agregar al primer grupo donde quepa
+        for group_idx in candidates:
+            if accumulators[group_idx].test_add(portfolio) <= plu_limit:
+                accumulators[group_idx].add(portfolio, [center])
+                portfolio_groups[unique_ids[center]] = group_idx
+                assigned_centers.add(center)
+                break
+        else:
+            non_compatible.append(center)
+
+    # FASE 3: Formar nuevos grupos con centros no compatibles
+    remaining_centers = non_compatible.copy()
+    non_compatible = []
+
+    while remaining_centers:
+        if cancel_token is not None:
+            cancel_token.check()
+        center = remaining_centers.pop(0)
+        accumulator = GroupAccumulator.from_portfolio(unique_portfolios[center], [center])
+
+        if neighbors is None:
+            others = remaining_centers[:]
+        else:
+            close = neighbors[unique_ids[center]]
+            others = [other for other in remaining_centers if unique_ids[other] in close]
+
+        # Intentar agregar otros centros restantes
+        for other_center in others:
+            portfolio = unique_portfolios[other_center]
+            if accumulator.test_add(portfolio) <= plu_limit:
+                accumulator.add(portfolio, [other_center])
+                remaining_centers.remove(other_center)
+
+        if len(accumulator) > 1:
+            accumulators.append(accumulator)
+        else:
+            non_compatible.append(center)
+
+    return accumulators, sorted(non_compatible)
+
+
+def build_agglomerative_groups(identical_portfolios, unique_portfolios, plu_limit, neighbors=None,
+                               cancel_token=None):
+    """
+    Agrupación aglomerativa con cola de prioridad (enlace completo con umbral).
+
+    Cada portafolio (grupo idéntico o centro único) empieza como un grupo y
+    en cada paso se hace la fusión que deja menos PLUs diferentes, mientras
+    quede dentro del límite (ver agglomerate). Con E pares dentro del límite
+    el costo es del orden de E log E.
+
+    Args:
+        identical_portfolios: {tupla de centros: BitPortfolio}
+        unique_portfolios: {centro: BitPortfolio}
+        plu_limit: Máximo de PLUs diferentes por grupo
+        neighbors: Opcional, como en build_final_groups; si no se indica los
+            pares se buscan con PairSearch
+        cancel_token: CancellationToken opcional; se revisa en cada fusión
+
+    Returns:
+        tuple: (lista de GroupAccumulator, lista ordenada de centros no compatibles)
+    """
+    portfolios = list(identical_portfolios.values()) + list(unique_portfolios.values())
+    centers = [list(group) for group in identical_portfolios] + [[center] for center in unique_portfolios]
+    n = len(portfolios)
+    if n == 0:
+        return [], []
+
+    bits = [portfolio.bits for portfolio in portfolios]
+    if neighbors is None:
+        close_pairs = PairSearch(portfolios, cancel_token=cancel_token).find_pairs(plu_limit)
+        pairs = zip(close_pairs.left.tolist(), close_pairs.right.tolist())
+    else:
+        pairs = ((i, j) for i in range(n) for j in neighbors[i] if i < j)
+    clusters = agglomerate(bits, bits, pairs, plu_limit, cancel_token)
+
+    accumulators = []
+    non_compatible = []
+    index = portfolios[0].index
+    for group in clusters:
+        group_centers = [center for member in group for center in centers[member]]
+        if len(group_centers) == 1:
+            non_compatible.extend(group_centers)
+            continue
+        accumulator = GroupAccumulator(index)
+        for member in sorted(group):
+            accumulator.add(portfolios[member], centers[member])
+        accumulators.append(accumulator)
+
+    return accumulators, sorted(non_compatible)
+
+
+def agglomerate(union_bits, common_bits, pairs, plu_limit, cancel_token=None):
+    """
+    Fusiones aglomerativas de menor costo primero (núcleo de build_agglomerative_groups).
+
+    Cada elemento empieza como un grupo descrito por la unión y la
+    intersección de sus PLUs (para un portafolio ambas son sus bits); los
+    PLUs diferentes de un grupo son los de la unión que no están en la
+    intersección, así que el costo de una fusión es un OR, un AND y un
+    popcount. Las fusiones posibles se guardan en un heap por costo; las
+    entradas de grupos que cambiaron después de guardarse se descartan al
+    sacarlas (cada grupo tiene una versión) y tras cada fusión se agregan las
+    del grupo nuevo con sus vecinos.
+
+    Los PLUs diferentes de un grupo incluyen los de cualquier par de sus
+    elementos fusionados, así que solo se prueban los grupos con todos sus
+    pares de elementos dentro del límite (se cuentan las aristas entre cada
+    par de grupos).
+
+    Args:
+        union_bits: Unión de PLUs (bits) de cada elemento
+        common_bits: Intersección de PLUs (bits) de cada elemento
+        pairs: Pares (i, j) candidatos; deben incluir todos los pares cuya
+            fusión queda dentro del límite
+        plu_limit: Máximo de PLUs diferentes por grupo
+        cancel_token: CancellationToken opcional; se revisa en cada fusión
+
+    Returns:
+        list: Elementos de cada grupo resultante (listas ordenadas), por su
+            menor elemento
+    """
+    n = len(union_bits)
+    union_bits = list(union_bits)
+    common_bits = list(common_bits)
+
+    # links[a][c]: pares de elementos dentro del límite entre los grupos a y c
+    links = [{} for _ in range(n)]
+    heap = []
+    for i, j in pairs:
+        cost = ((union_bits[i] | union_bits[j]) ^ (common_bits[i] & common_bits[j])).bit_count()
+        if cost <= plu_limit:
+            links[i][j] = links[j][i] = 1
+            heap.append((cost, i, j, 0, 0) if i < j else (cost, j, i, 0, 0))
+    heapq.heapify(heap)
+
+    members = [[i] for i in range(n)]
+    version = [0] * n
+    alive = [True] * n
+
+    while heap:
+        _, a, b, version_a, version_b = heapq.heappop(heap)
+        if not (alive[a] and alive[b]) or version[a] != version_a or version[b] != version_b:
+            continue
+        if cancel_token is not None:
+            cancel_token.check()
+
+        # Fusionar b en a (el grupo con menos vecinos en el que tiene más)
+        if len(links[a]) < len(links[b]):
+            a, b = b, a
+        union_bits[a] |= union_bits[b]
+        common_bits[a] &= common_bits[b]
+        members[a].extend(members[b])
+        alive[b] = False
+        version[a] += 1
+
+        del links[a][b]
+        for c, count in links[b].items():
+            if c == a:
+                continue
+            links[a][c] = links[c][a] = links[a].get(c, 0) + count
+            del links[c][b]
+        links[b] = {}
+
+        # Fusiones posibles del grupo nuevo
+        size = len(members[a])
+        for c, count in links[a].items():
+            if count != size * len(members[c]):
+                continue
+            cost = ((union_bits[a] | union_bits[c]) ^ (common_bits[a] & common_bits[c])).bit_count()
+            if cost <= plu_limit:
+                first, second = (a, c) if a < c else (c, a)
+                heapq.heappush(heap, (cost, first, second, version[first], version[second]))
+
+    return sorted((sorted(members[a]) for a in range(n) if alive[a]), key=lambda group: group[0])
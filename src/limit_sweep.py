@@ -0,0 +1,136 @@
+# src/limit_sweep.py
+import threading
+import time
+
+from group_accumulator import build_final_groups
+from lazy_loader import LazyLoader
+from pair_search import PairSearch
+
+np = LazyLoader('numpy')
+
+
+class LimitSweep:
+    """
+    Agrupación final para una serie de límites de PLUs con una sola búsqueda de pares.
+
+    La distancia entre dos portafolios no depende del límite, así que los
+    pares se buscan una vez hasta el límite mayor y se ordenan por distancia.
+    Al pasar de un límite a otro solo se agregan (o quitan) de los vecinos de
+    cada portafolio los pares con distancia entre ambos límites, y
+    build_final_groups prueba únicamente esos vecinos. El resultado de cada
+    límite es el mismo que el de calculate_final_groups (con el método
+    'minhash' los vecinos son aproximados y el resultado también).
+
+    Los vecinos cambian con cada límite, así que prepare, result y run se
+    ejecutan de a uno (en la interfaz, la vista previa del control y la
+    curva se calculan en hilos de trabajo distintos).
+    """
+
+    def __init__(self, identical_portfolios, unique_portfolios, method='auto',
+                 recall=PairSearch.DEFAULT_RECALL, grouping_method='greedy'):
+        self.identical_portfolios = identical_portfolios
+        self.unique_portfolios = unique_portfolios
+        self.method = method
+        self.recall = recall
+        self.grouping_method = grouping_method
+        self.stats = {}
+
+        self.max_limit = None
+        self._left = self._right = self._distances = None
+        self._neighbors = []
+        self._position = 0
+        self._results = {}
+        self._lock = threading.RLock()
+
+    def prepare(self, max_limit):
+        """Busca los pares hasta max_limit (solo si no se buscaron hasta un límite mayor)."""
+        with self._lock:
+            self._prepare(max_limit)
+
+    def _prepare(self, max_limit, cancel_token=None):
+        if self.max_limit is not None and max_limit <= self.max_limit:
+            return
+
+        start = time.perf_counter()
+        portfolios = list(self.identical_portfolios.values()) + list(self.unique_portfolios.values())
+        close_pairs = PairSearch(
+            portfolios, method=self.method, recall=self.recall, cancel_token=cancel_token
+        ).find_pairs(max_limit)
+        order = np.argsort(close_pairs.distances, kind='stable')
+        self._left = close_pairs.left[order]
+        self._right = close_pairs.right[order]
+        self._distances = close_pairs.distances[order]
+
+        self._neighbors = [set() for _ in portfolios]
+        self._position = 0
+        self.max_limit = max_limit
+        self.stats = dict(close_pairs.stats, seconds=time.perf_counter() - start)
+
+    def result(self, limit):
+        """
+        Grupos finales de un límite (dentro del rango ya preparado).
+
+        Returns:
+            dict: 'limit', 'final_groups', 'non_compatible', 'grouped_centers',
+                'initial_masters' y 'final_masters'
+        """
+        limit = int(limit)
+        if limit < 0:
+            raise Exception(f"Límite de PLUs inválido: {limit}")
+        with self._lock:
+            return self._result(limit)
+
+    def _result(self, limit, cancel_token=None):
+        if limit in self._results:
+            return self._results[limit]
+        self._prepare(limit, cancel_token)
+
+        self._move_to(limit)
+        accumulators, non_compatible = build_final_groups(
+            self.identical_portfolios, self.unique_portfolios, limit, self._neighbors,
+            cancel_token=cancel_token, method=self.grouping_method
+        )
+        self._results[limit] = {
+            'limit': limit,
+            'final_groups': len(accumulators),
+            'non_compatible': len(non_compatible),
+            'grouped_centers': sum(len(accumulator) for accumulator in accumulators),
+            'initial_masters': len(self._neighbors),
+            'final_masters': len(accumulators) + len(non_compatible)
+        }
+        return self._results[limit]
+
+    def run(self, limits, cancel_token=None):
+        """
+        Calcula los grupos finales de cada límite.
+
+        Args:
+            limits: Límites de PLUs diferentes (en cualquier orden)
+            cancel_token: CancellationToken opcional (búsqueda de pares y agrupación)
+
+        Returns:
+            list: Resultado de result() para cada límite, de menor a mayor
+        """
+        limits = sorted({int(limit) for limit in limits})
+        if not limits:
+            raise Exception("No se indicaron límites para la curva")
+
+        start = time.perf_counter()
+        with self._lock:
+            self._prepare(limits[-1], cancel_token)
+            results = [self._result(limit, cancel_token) for limit in limits]
+            self.stats['seconds'] = time.perf_counter() - start
+        return results
+
+    def _move_to(self, limit):
+        """Deja en los vecinos exactamente los pares con distancia <= limit."""
+        end = int(np.searchsorted(self._distances, limit, side='right'))
+        if end > self._position:
+            for i, j in zip(self._left[self._position:end].tolist(), self._right[self._position:end].tolist()):
+                self._neighbors[i].add(j)
+                self._neighbors[j].add(i)
+        elif end < self._position:
+            for i, j in zip(self._left[end:self._position].tolist(), self._right[end:self._position].tolist()):
+                self._neighbors[i].discard(j)
+                self._neighbors[j].discard(i)
+        self._position = end
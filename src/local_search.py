@@ -0,0 +1,273 @@
+# src/local_search.py
+import random
+import time
+
+from group_accumulator import GroupAccumulator
+from lazy_loader import LazyLoader
+
+np = LazyLoader('numpy')
+
+
+class GroupImprover:
+    """
+    Mejora local de los grupos finales con un tiempo límite.
+
+    Parte de un resultado ya formado (por ejemplo, el de build_final_groups)
+    y trata de reducir los másteres finales (grupos más centros sin agrupar)
+    sin superar el límite de PLUs diferentes:
+
+        - Disolver grupos pequeños: mover cada uno de sus centros al grupo
+          donde queda con menos PLUs diferentes; si algún centro no cabe en
+          ningún otro grupo se deshacen los movimientos. Un centro sin
+          agrupar es un grupo de uno, así que también se intenta ubicarlo.
+        - Cuando una pasada no disuelve nada, movimientos neutros (mover o
+          intercambiar centros entre grupos sin cambiar los másteres) que
+          cambian la forma de los grupos para la pasada siguiente.
+
+    Cada prueba usa los conteos incrementales de GroupAccumulator, así que
+    evaluar un movimiento cuesta O(|portafolio|); antes se descartan los
+    grupos donde el portafolio no puede caber según el total de PLUs y los
+    PLUs comunes de cada grupo. Los centros sin agrupar se guardan con su
+    BitPortfolio (_SingleCenter) y solo pasan a un GroupAccumulator, con un
+    conteo por PLU, cuando otro centro se les une. Los másteres nunca
+    aumentan; cuántos se eliminan depende del tiempo disponible.
+    """
+    # Grupos con hasta este número de centros se intentan disolver
+    SMALL_GROUP_CENTERS = 10
+    # Movimientos neutros por ronda sin mejoras
+    PERTURBATION_MOVES = 20
+
+    def __init__(self, accumulators, non_compatible, portfolios, plu_limit, seconds, seed=0,
+                 cancel_token=None):
+        """
+        Args:
+            accumulators: Lista de GroupAccumulator (se modifican)
+            non_compatible: Centros sin agrupar
+            portfolios: {centro: BitPortfolio} de todos los centros
+            plu_limit: Máximo de PLUs diferentes por grupo
+            seconds: Tiempo disponible para la mejora
+            seed: Semilla de los movimientos neutros
+            cancel_token: CancellationToken opcional; se revisa en cada grupo
+        """
+        self.portfolios = portfolios
+        self.plu_limit = plu_limit
+        self.seconds = seconds
+        self.cancel_token = cancel_token
+        self.random = random.Random(seed)
+        self.stats = {}
+
+        self.groups = list(accumulators) + [_SingleCenter(portfolios[center], center) for center in non_compatible]
+        # PLUs diferentes, totales y comunes de cada grupo (para descartar grupos sin probarlos)
+        self._different = np.zeros(len(self.groups), dtype=np.int64)
+        self._total = np.zeros(len(self.groups), dtype=np.int64)
+        self._common = np.zeros(len(self.groups), dtype=np.int64)
+        for position in range(len(self.groups)):
+            self._refresh(position)
+        self._counters = {'dissolved': 0, 'moves': 0, 'swaps': 0, 'rounds': 0}
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def masters(self):
+        """Másteres actuales: grupos con al menos un centro."""
+        return sum(1 for group in self.groups if group.centers)
+
+    def run(self):
+        """
+        Mejora los grupos hasta agotar el tiempo (o hasta no tener qué probar).
+
+        Returns:
+            tuple: (lista de GroupAccumulator con más de un centro, lista
+                ordenada de centros no compatibles)
+        """
+        start = time.perf_counter()
+        deadline = start + self.seconds
+        masters_before = self.masters()
+
+        while time.perf_counter() < deadline:
+            self._counters['rounds'] += 1
+            if self._dissolve_pass(deadline):
+                continue
+            if not self._perturb(deadline):
+                break
+
+        seconds = time.perf_counter() - start
+        masters_after = self.masters()
+        self.stats = dict(
+            self._counters,
+            masters_before=masters_before,
+            masters_after=masters_after,
+            improvement=masters_before - masters_after,
+            seconds=seconds,
+            improvement_per_second=(masters_before - masters_after) / seconds if seconds > 0 else 0.0
+        )
+
+        accumulators = [group for group in self.groups if len(group) > 1]
+        non_compatible = sorted(center for group in self.groups if len(group) == 1 for center in group.centers)
+        return accumulators, non_compatible
+
+    def _small_groups(self):
+        """Posiciones de los grupos pequeños, del más pequeño al más grande."""
+        return sorted(
+            (position for position, group in enumerate(self.groups)
+             if 0 < len(group) <= self.SMALL_GROUP_CENTERS),
+            key=lambda position: (len(self.groups[position]), position)
+        )
+
+    def _dissolve_pass(self, deadline):
+        """Intenta disolver cada grupo pequeño; True si disolvió alguno."""
+        dissolved = False
+        for position in self._small_groups():
+            if time.perf_counter() >= deadline:
+                break
+            self._check_cancelled()
+            if self.groups[position].centers and self._dissolve(position):
+                dissolved = True
+        return dissolved
+
+    def _dissolve(self, position):
+        """Mueve todos los centros del grupo a otros grupos, o ninguno."""
+        moved = []
+        for center in sorted(self.groups[position].centers):
+            target = self._best_group(self.portfolios[center], exclude=position)
+            if target is None:
+                for moved_center, moved_target in reversed(moved):
+                    self._move(moved_center, moved_target, position)
+                return False
+            self._move(center, position, target)
+            moved.append((center, target))
+        self._counters['dissolved'] += 1
+        return True
+
+    def _refresh(self, position):
+        group = self.groups[position]
+        self._different[position] = group.different_count
+        self._total[position] = group.total_plus if group.centers else 0
+        self._common[position] = group.total_plus - group.different_count if group.centers else 0
+
+    def _best_group(self, portfolio, exclude):
+        """Grupo (distinto de exclude) donde el portafolio queda con menos PLUs diferentes."""
+        # Cota inferior: agregar no quita PLUs diferentes, y los comunes del
+        # grupo resultante son a lo sumo los comunes actuales del portafolio
+        size = len(portfolio)
+        bound = np.maximum(
+            self._different,
+            np.maximum(self._total, size) - np.minimum(self._common, size)
+        )
+        candidates = np.flatnonzero((bound <= self.plu_limit) & (self._total > 0))
+
+        best, best_count = None, self.plu_limit + 1
+        for position in candidates.tolist():
+            if position == exclude:
+                continue
+            count = self.groups[position].test_add(portfolio)
+            if count < best_count:
+                best, best_count = position, count
+        return best
+
+    def _move(self, center, source, target):
+        portfolio = self.portfolios[center]
+        self.groups[source].remove(portfolio, [center])
+        self._add(target, portfolio, center)
+        self._refresh(source)
+        self._refresh(target)
+
+    def _add(self, position, portfolio, center):
+        """Agrega el centro al grupo (un centro solo se vuelve GroupAccumulator al unírsele otro)."""
+        group = self.groups[position]
+        if isinstance(group, _SingleCenter):
+            if not group.centers:
+                self.groups[position] = _SingleCenter(portfolio, center)
+                return
+            group = self.groups[position] = GroupAccumulator.from_portfolio(group.portfolio, list(group.centers))
+        group.add(portfolio, [center])
+
+    def _perturb(self, deadline):
+        """
+        Movimientos neutros desde grupos pequeños; True si se hizo alguno.
+
+        Un centro de un grupo pequeño (de dos o más) se mueve al grupo donde
+        mejor cabe o, si no cabe en ninguno, se intercambia con un centro de
+        otro grupo cuando ambos grupos quedan dentro del límite.
+        """
+        candidates = [position for position in self._small_groups() if len(self.groups[position]) > 1]
+        if not candidates:
+            return False
+
+        changed = False
+        for _ in range(self.PERTURBATION_MOVES):
+            if time.perf_counter() >= deadline:
+                break
+            self._check_cancelled()
+            position = self.random.choice(candidates)
+            group = self.groups[position]
+            if len(group) < 2:
+                continue
+            center = self.random.choice(sorted(group.centers))
+            target = self._best_group(self.portfolios[center], exclude=position)
+            if target is not None:
+                self._move(center, position, target)
+                self._counters['moves'] += 1
+                changed = True
+            elif self._swap(center, position):
+                self._counters['swaps'] += 1
+                changed = True
+        return changed
+
+    def _swap(self, center, source):
+        """Intercambia el centro con uno de otro grupo si ambos grupos quedan dentro del límite."""
+        portfolio = self.portfolios[center]
+        targets = [position for position, group in enumerate(self.groups) if position != source and group.centers]
+        for target in self.random.sample(targets, min(len(targets), 5)):
+            target_group = self.groups[target]
+            others = sorted(target_group.centers)
+            for other in self.random.sample(others, min(len(others), 5)):
+                other_portfolio = self.portfolios[other]
+                # Probar con el centro fuera de su grupo y el otro fuera del suyo
+                self.groups[source].remove(portfolio, [center])
+                target_group.remove(other_portfolio, [other])
+                fits = (
+                    self.groups[source].test_add(other_portfolio) <= self.plu_limit
+                    and target_group.test_add(portfolio) <= self.plu_limit
+                )
+                self._add(source, portfolio, center)
+                self._add(target, other_portfolio, other)
+                target_group = self.groups[target]
+                if fits:
+                    self._move(center, source, target)
+                    self._move(other, target, source)
+                    return True
+        return False
+
+
+class _SingleCenter:
+    """
+    Grupo de un solo centro sin conteos por PLU (ver GroupImprover).
+
+    Tiene lo que GroupImprover usa de GroupAccumulator: con un centro no hay
+    PLUs diferentes y agregar otro portafolio deja la diferencia simétrica.
+    """
+
+    def __init__(self, portfolio, center):
+        self.portfolio = portfolio
+        self.centers = {center}
+
+    def __len__(self):
+        return len(self.centers)
+
+    @property
+    def different_count(self):
+        return 0
+
+    @property
+    def total_plus(self):
+        return len(self.portfolio) if self.centers else 0
+
+    def test_add(self, portfolio):
+        if not self.centers:
+            return 0
+        return (self.portfolio.bits ^ portfolio.bits).bit_count()
+
+    def remove(self, portfolio, centers):
+        self.centers.difference_update(centers)
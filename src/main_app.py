@@ -2,6 +2,7 @@
 from collections import defaultdict
 import math
 import os
+import queue
 import threading
 import logging
 from datetime import datetime, time
@@ -16,6 +17,9 @@ import customtkinter as ctk
 
 # Importaciones locales
 from base_app import BaseApp
+from cancellation import CancellationToken, OperationCancelled
+from excel_export import ExcelExporter
+from portfolio_engine import PortfolioEngine
 from temp_handler import temp_handler
 from update_checker import AutoUpdater
 
@@ -706,179 +710,6 @@ class SimplePivotTable:
             print(f"Error al obtener datos de la tabla: {str(e)}")
             return pd.DataFrame()  # Retornar DataFrame vacío en caso de error
 
-class ColumnValidator:
-    def __init__(self):
-        self.COLUMN_VARIATIONS = {
-            'CENTRO': {
-                'valid': [
-                    'CENTRO', 'COD_CENTRO', 'CODIGO_CENTRO', 'CENTRO_ID',
-                    'ID_CENTRO', 'NUM_CENTRO', 'CENTRO_CODIGO'
-                ],
-                'excluded': [
-                    'NOMBRE_CENTRO', 'NOMBRE CENTRO', 'DESC_CENTRO',
-                    'DESCRIPCION_CENTRO', 'CENTRO_NOMBRE'
-                ],
-                'required_type': None,
-                'required': True
-            },
-            'PLU_SAP': {
-                'valid': [
-                    'PLU_SAP', 'PLU', 'CODIGO_PLU', 'COD_PLU', 'SKU',
-                    'CODIGO_PRODUCTO', 'COD_PRODUCTO'
-                ],
-                'excluded': [
-                    'DESCRIPCION_PLU', 'NOMBRE_PLU', 'PLU_DESCRIPCION'
-                ],
-                'required_type': None,
-                'required': True
-            },
-            'CATEGORIA': {
-                'valid': ['CATEGORIA', 'CATEGORIAS'],
-                'excluded': [],
-                'required_type': None,
-                'required': False
-            },
-            'SUBCATEGORIA': {
-                'valid': ['SUBCATEGORIA', 'SUBCATEGORIAS'],
-                'excluded': [],
-                'required_type': None,
-                'required': False
-            },
-            'SEGMENTO': {
-                'valid': ['SEGMENTO', 'SEGMENTOS'],
-                'excluded': [],
-                'required_type': None,
-                'required': False
-            },
-            'ARTICULO': {
-                'valid': ['ARTICULO', 'ARTICULOS'],
-                'excluded': [],
-                'required_type': None,
-                'required': False
-            },
-            'DISTRITO': {
-                'valid': ['Distrito'],  # Solo la columna exacta
-                'excluded': [],
-                'required_type': None,
-                'required': False,
-                'exact_match': True    # Requerir coincidencia exacta
-            },
-            'REGION': {
-                'valid': ['Región'],   # Solo la columna exacta
-                'excluded': [],
-                'required_type': None,
-                'required': False,
-                'exact_match': True    # Requerir coincidencia exacta
-            }
-        }
-
-    def normalize_column_name(self, column_name):
-        """
-        Normaliza el nombre de una columna para comparaciones consistentes.
-        """
-        return str(column_name).upper().replace(' ', '_').strip()
-
-    def find_column(self, df, column_type, raise_error=True):
-        """
-        Encuentra una columna específica en el DataFrame.
-
-        Args:
-            df: DataFrame donde buscar
-            column_type: Tipo de columna a buscar ('CENTRO', 'PLU_SAP', etc.)
-            raise_error: Si es True, lanza error cuando no encuentra la columna
-
-        Returns:
-            str: Nombre de la columna encontrada o None si no se encuentra
-        """
-
-        config = self.COLUMN_VARIATIONS[column_type]
-        exact_match = config.get('exact_match', False)
-
-        if exact_match:
-            # Buscar coincidencia exacta
-            for valid_name in config['valid']:
-                if valid_name in df.columns:
-                    return valid_name
-        else:
-            if column_type not in self.COLUMN_VARIATIONS:
-                raise ValueError(f"Tipo de columna no soportado: {column_type}")
-
-            valid_variations = self.COLUMN_VARIATIONS[column_type]['valid']
-            excluded_variations = self.COLUMN_VARIATIONS[column_type]['excluded']
-            required_type = self.COLUMN_VARIATIONS[column_type]['required_type']
-
-            # Normalizar nombres de columnas del DataFrame
-            df_columns = {col: self.normalize_column_name(col) for col in df.columns}
-
-            # Excluir columnas no deseadas
-            excluded_cols = []
-            for col, normalized_name in df_columns.items():
-                for excluded in excluded_variations:
-                    if self.normalize_column_name(excluded) in normalized_name:
-                        excluded_cols.append(col)
-
-            # Buscar coincidencias exactas primero
-            exact_matches = []
-            for col, normalized_name in df_columns.items():
-                if col not in excluded_cols:
-                    for valid_var in valid_variations:
-                        if normalized_name == self.normalize_column_name(valid_var):
-                            exact_matches.append(col)
-
-            if len(exact_matches) == 1:
-                found_column = exact_matches[0]
-                if self._validate_column_type(df, found_column, required_type):
-                    return found_column
-
-            # Si no hay coincidencias exactas, buscar coincidencias parciales
-            partial_matches = []
-            for col, normalized_name in df_columns.items():
-                if col not in excluded_cols:
-                    if column_type in normalized_name:
-                        if self._validate_column_type(df, col, required_type):
-                            partial_matches.append(col)
-
-            if len(partial_matches) == 1:
-                return partial_matches[0]
-            elif len(partial_matches) > 1:
-                if raise_error:
-                    raise ValueError(
-                        f"Se encontraron múltiples columnas que podrían ser '{column_type}': "
-                        f"{', '.join(partial_matches)}.\nPor favor, verifique el archivo "
-                        f"y asegúrese de que la columna '{column_type}' esté claramente identificada."
-                    )
-            elif raise_error:
-                raise ValueError(
-                    f"No se encontró la columna '{column_type}' en el archivo.\n"
-                    f"Columnas disponibles: {', '.join(df.columns)}"
-                )
-
-            return None
-
-    def _validate_column_type(self, df, column, required_type):
-        """
-        Valida el tipo de datos de una columna.
-        """
-        if required_type == 'numeric':
-            return df[column].astype(str).str.match(r'^\d+$').all()
-        return True
-
-    def validate_required_columns(self, df, required_columns):
-        """
-        Valida múltiples columnas requeridas en el DataFrame.
-
-        Args:
-            df: DataFrame a validar
-            required_columns: Lista de tipos de columnas requeridas
-
-        Returns:
-            dict: Diccionario con los nombres de las columnas encontradas
-        """
-        found_columns = {}
-        for col_type in required_columns:
-            found_columns[col_type] = self.find_column(df, col_type)
-        return found_columns
-
 class WidgetRecycler:
     def __init__(self):
         self.widget_pool = {}
@@ -1436,18 +1267,7 @@ class CustomGroupResults:
         detail_frame = ttk.Frame(group_frame, style="ContentCard.TFrame")
         
         def get_group_plus_count():
-            all_centers_plus = []
-            for center in group['centers']:
-                if center in self.app.unique_portfolios:
-                    # Si el centro tiene portafolio único
-                    all_centers_plus.append(len(self.app.unique_portfolios[center]))
-                else:
-                    # Si el centro está en un grupo idéntico, buscar su grupo
-                    for centers, plus in self.app.identical_portfolios.items():
-                        if center in centers:
-                            all_centers_plus.append(len(plus))
-                            break
-            return sum(all_centers_plus)
+            return sum(self.app.engine.center_index.plu_count(center) for center in group['centers'])
 
         total_plus = get_group_plus_count()
 
@@ -1704,22 +1524,36 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         </svg>"""
     }
 
+    # Rango del control de límite de PLUs (el mismo mínimo que acepta el
+    # diálogo de límite) y espera (ms) antes de recalcular
+    LIMIT_SLIDER_MIN = 1
+    LIMIT_SLIDER_MAX = 50
+    LIMIT_PREVIEW_DELAY_MS = 80
+    # Cada cuánto (ms) revisa la interfaz los eventos de los hilos de trabajo
+    WORKER_POLL_MS = 50
+    # Opciones del motor que cambia el diálogo de límite (se restauran si el análisis no termina)
+    ANALYSIS_OPTIONS = (
+        'pair_search_method', 'pair_search_recall', 'grouping_method', 'grouping_partition',
+        'grouping_cross_merge', 'improve_seconds'
+    )
+
     def __init__(self, root):
         self.root = root
         self.root.title("Analizador de Portafolios")
-        self.current_plu_limit = 10
+
+        # Motor de agrupación (sin interfaz): archivo analizado, portafolios,
+        # grupos finales y sus cachés. La ventana solo muestra sus resultados.
+        self.engine = PortfolioEngine()
 
         # Inicialización básica
         self._initialize_variables()
-        
-        # Agregar el validador de columnas
-        self.column_validator = ColumnValidator()
-        
-        # Agregar estos atributos
-        self.identical_portfolios = {}
-        self.unique_portfolios = {}
-        self.recommendations = []
-        self.non_compatible = []
+
+        # Control de límite en vivo (usa el LimitSweep del motor): espera
+        # pendiente, vista previa en curso en un hilo y si el control cambió
+        # mientras tanto
+        self._limit_preview_job = None
+        self._limit_preview_running = False
+        self._limit_preview_pending = False
 
         # Agregar variable para mensajes de carga
         self.loading_message = None
@@ -1730,9 +1564,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         self.root.geometry(f"{screen_width}x{screen_height}+0+0")
         self.root.state('zoomed')
         
-        # Variables de estado
-        self._initialize_state_variables()
-        
         # Iniciar la interfaz
         self._initialize_ui()
 
@@ -1745,25 +1576,13 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         self.identical_groups = tk.StringVar()
         self.initial_masters = tk.StringVar()
         self.final_masters = tk.StringVar()
+        # Control de límite de PLUs en vivo (vista previa de los másteres finales)
+        self.limit_slider_var = tk.IntVar(value=self.engine.current_plu_limit)
+        self.limit_preview_var = tk.StringVar(value="Analice un archivo para ajustar el límite")
+        # Grupos y centros sin agrupar del último análisis (texto del control en su límite)
+        self.limit_analysis_text = ""
         self.summary_ii_grid = None 
 
-    def _initialize_state_variables(self):
-        """Inicializar variables de estado y estilos"""
-        self.title_font = Font(name='Segoe UI', size=14, bold=True)
-        self.subtitle_font = Font(name='Segoe UI', size=12, bold=True)
-        self.base_font = Font(name='Segoe UI', size=11)
-        self.header_font = Font(name='Segoe UI', size=11, bold=True)
-        
-        # Alineaciones
-        self.center_alignment = Alignment(horizontal='center', vertical='center')
-        self.left_alignment = Alignment(horizontal='left', vertical='center')
-        
-        # Colores
-        self.header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
-        self.warning_fill = PatternFill(start_color='FEF2F2', end_color='FEF2F2', fill_type='solid')
-        self.success_fill = PatternFill(start_color='ECFDF5', end_color='ECFDF5', fill_type='solid')
-        self.alternate_fill = PatternFill(start_color='F9FAFB', end_color='F9FAFB', fill_type='solid')
-
     def _initialize_ui(self):
         """Inicializar la interfaz de usuario"""
         # Configurar el tema y estilo
@@ -1841,10 +1660,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             
             if criteria:
                 # Obtener todos los centros
-                all_centers = set()
-                for centers in self.identical_portfolios.keys():
-                    all_centers.update(centers)
-                all_centers.update(self.unique_portfolios.keys())
+                all_centers = set(self.engine.center_index.centers())
                 
                 # Realizar la agrupación personalizada
                 analyzer = CustomGroupingAnalysis(self)
@@ -1953,7 +1769,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         
         # Dimensiones y posicionamiento mejorados
         window_width = 480
-        window_height = 320
+        window_height = 510
         screen_width = dialog.winfo_screenwidth()
         screen_height = dialog.winfo_screenheight()
         x = (screen_width - window_width) // 2
@@ -2096,6 +1912,115 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         )
         entry.pack(side=tk.LEFT, padx=(0, 15))
         
+        # Vista previa aproximada (MinHash) para redes muy grandes
+        preview_frame = ctk.CTkFrame(
+            content_frame,
+            fg_color="transparent"
+        )
+        preview_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        preview_var = tk.BooleanVar(value=self.engine.pair_search_method == 'minhash')
+        preview_check = ctk.CTkCheckBox(
+            preview_frame,
+            text="Vista previa rápida (aproximada)",
+            variable=preview_var,
+            font=("Segoe UI", 11),
+            text_color="#1e293b"
+        )
+        preview_check.pack(side=tk.LEFT)
+        
+        recall_var = tk.StringVar(value=f"{self.engine.pair_search_recall:.2f}")
+        recall_menu = ctk.CTkOptionMenu(
+            preview_frame,
+            values=["0.80", "0.90", "0.95", "0.99"],
+            variable=recall_var,
+            width=90
+        )
+        recall_menu.pack(side=tk.RIGHT)
+        
+        recall_label = ctk.CTkLabel(
+            preview_frame,
+            text="Recall:",
+            font=("Segoe UI", 11),
+            text_color="#64748b"
+        )
+        recall_label.pack(side=tk.RIGHT, padx=5)
+        
+        # Algoritmo de los grupos finales
+        grouping_frame = ctk.CTkFrame(
+            content_frame,
+            fg_color="transparent"
+        )
+        grouping_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        grouping_names = {'greedy': "Voraz (original)", 'agglomerative': "Aglomerativo (cola de prioridad)"}
+        grouping_var = tk.StringVar(value=grouping_names[self.engine.grouping_method])
+        grouping_label = ctk.CTkLabel(
+            grouping_frame,
+            text="Agrupación:",
+            font=("Segoe UI", 11),
+            text_color="#1e293b"
+        )
+        grouping_label.pack(side=tk.LEFT)
+        
+        grouping_menu = ctk.CTkOptionMenu(
+            grouping_frame,
+            values=list(grouping_names.values()),
+            variable=grouping_var,
+            width=230
+        )
+        grouping_menu.pack(side=tk.RIGHT)
+        
+        # Partición geográfica de la agrupación (datos maestros)
+        partition_frame = ctk.CTkFrame(
+            content_frame,
+            fg_color="transparent"
+        )
+        partition_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        partition_names = {None: "Ninguna", 'Distrito': "Por distrito", 'Region': "Por región"}
+        partition_var = tk.StringVar(value=partition_names[self.engine.grouping_partition])
+        partition_label = ctk.CTkLabel(
+            partition_frame,
+            text="Partición:",
+            font=("Segoe UI", 11),
+            text_color="#1e293b"
+        )
+        partition_label.pack(side=tk.LEFT)
+        
+        partition_menu = ctk.CTkOptionMenu(
+            partition_frame,
+            values=list(partition_names.values()),
+            variable=partition_var,
+            width=230
+        )
+        partition_menu.pack(side=tk.RIGHT)
+        
+        # Segundos de mejora local de los grupos finales (ver GroupImprover)
+        improve_frame = ctk.CTkFrame(
+            content_frame,
+            fg_color="transparent"
+        )
+        improve_frame.pack(fill=tk.X, padx=20, pady=(0, 10))
+        
+        improve_names = {0: "Sin mejora", 5: "5 segundos", 30: "30 segundos"}
+        improve_var = tk.StringVar(value=improve_names.get(self.engine.improve_seconds, "Sin mejora"))
+        improve_label = ctk.CTkLabel(
+            improve_frame,
+            text="Mejora local:",
+            font=("Segoe UI", 11),
+            text_color="#1e293b"
+        )
+        improve_label.pack(side=tk.LEFT)
+        
+        improve_menu = ctk.CTkOptionMenu(
+            improve_frame,
+            values=list(improve_names.values()),
+            variable=improve_var,
+            width=230
+        )
+        improve_menu.pack(side=tk.RIGHT)
+        
         # Variable para almacenar el resultado
         result = [None]
         
@@ -2105,6 +2030,17 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 if value <= 0:
                     raise ValueError("El valor debe ser mayor que 0")
                 result[0] = value
+                self.engine.pair_search_method = 'minhash' if preview_var.get() else 'auto'
+                self.engine.pair_search_recall = float(recall_var.get())
+                self.engine.grouping_method = next(
+                    method for method, name in grouping_names.items() if name == grouping_var.get()
+                )
+                self.engine.grouping_partition = next(
+                    key for key, name in partition_names.items() if name == partition_var.get()
+                )
+                self.engine.improve_seconds = next(
+                    seconds for seconds, name in improve_names.items() if name == improve_var.get()
+                )
                 dialog.destroy()
             except ValueError:
                 # Frame de error con animación de shake
@@ -2312,8 +2248,14 @@ class ModernPortfolioAnalyzerApp(BaseApp):
 
         update_label(0)  # Iniciar la animación desde 0
 
-    def show_loading_spinner(self, message):
-        """Mostrar spinner de carga optimizado."""
+    def show_loading_spinner(self, message, cancel_token=None):
+        """
+        Mostrar spinner de carga optimizado.
+        
+        Si se indica cancel_token, el spinner tiene un botón Cancelar y
+        update_loading_message detiene la operación (OperationCancelled) en
+        cuanto se pulsa.
+        """
         loading_window = tk.Toplevel(self.root)
         loading_window.transient(self.root)
         loading_window.overrideredirect(True)
@@ -2374,6 +2316,17 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         )
         message_label.pack(pady=(0, 15))
         
+        loading_window.cancel_token = cancel_token
+        if cancel_token is not None:
+            def cancel_operation():
+                cancel_token.cancel()
+                cancel_button.configure(state='disabled')
+                self.loading_message.set("Cancelando...")
+            
+            cancel_button = ttk.Button(loading_frame, text="Cancelar", command=cancel_operation)
+            cancel_button.pack(pady=(0, 10))
+            loading_window.geometry(f"{window_width}x{window_height + 40}+{x}+{y}")
+        
         # Animación del spinner más suave
         rotation = [0]
         def update_spinner():
@@ -2396,7 +2349,13 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         """Actualizar mensaje de carga de manera eficiente."""
         if loading_window and loading_window.winfo_exists():
             self.loading_message.set(message)
-            loading_window.update_idletasks()
+            cancel_token = getattr(loading_window, 'cancel_token', None)
+            if cancel_token is None:
+                loading_window.update_idletasks()
+                return
+            # Atender el botón Cancelar antes de seguir con el siguiente paso
+            loading_window.update()
+            cancel_token.check()
 
     def create_widgets(self):
             # Contenedor principal
@@ -2483,6 +2442,57 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             self.create_stat_card(stats_frame, "Planogramas\nMásteres Iniciales", self.initial_masters, '#f97316', 3)
             self.create_stat_card(stats_frame, "Planogramas\nMásteres Finales", self.final_masters, '#ef4444', 4)
             
+            # Control de límite de PLUs: vista previa en vivo de los másteres finales
+            limit_frame = ttk.Frame(main_frame, style="Card.TFrame")
+            limit_frame.pack(fill=tk.X, pady=(0, 15))
+            
+            ttk.Label(
+                limit_frame,
+                text="Límite de PLUs:",
+                font=('Segoe UI', 11, 'bold'),
+                foreground='#1e293b',
+                background='white'
+            ).pack(side=tk.LEFT, padx=(10, 5))
+            
+            ttk.Label(
+                limit_frame,
+                textvariable=self.limit_slider_var,
+                width=3,
+                font=('Segoe UI', 11, 'bold'),
+                foreground='#2563eb',
+                background='white'
+            ).pack(side=tk.LEFT)
+            
+            self.limit_slider = ctk.CTkSlider(
+                limit_frame,
+                from_=self.LIMIT_SLIDER_MIN,
+                to=self.LIMIT_SLIDER_MAX,
+                number_of_steps=self.LIMIT_SLIDER_MAX - self.LIMIT_SLIDER_MIN,
+                variable=self.limit_slider_var,
+                command=self.preview_plu_limit,
+                state="disabled",
+                width=300
+            )
+            self.limit_slider.pack(side=tk.LEFT, padx=10)
+            
+            ttk.Label(
+                limit_frame,
+                textvariable=self.limit_preview_var,
+                font=('Segoe UI', 10),
+                foreground='#64748b',
+                background='white'
+            ).pack(side=tk.LEFT, padx=5)
+            
+            self.apply_limit_button = ctk.CTkButton(
+                limit_frame,
+                text="Aplicar límite",
+                command=self.apply_plu_limit,
+                state="disabled",
+                height=30,
+                width=120
+            )
+            self.apply_limit_button.pack(side=tk.RIGHT, padx=10)
+            
             # Línea divisoria horizontal negra y más gruesa
             separator = ttk.Frame(main_frame, height=4, style="BlackSeparator.TFrame")
             separator.pack(fill=tk.X, pady=(0, 15))
@@ -2872,94 +2882,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         
         return result[0]
 
-    def get_modulation_data(self, centers, category):
-        """
-        Obtiene los datos de modulación para un conjunto de centros y una categoría específica.
-        Incluye centros con datos vacíos y no encontrados.
-        
-        Args:
-            centers (list): Lista de centros a analizar
-            category (str): Categoría a buscar
-            
-        Returns:
-            dict: Diccionario con la estructura {num_modulos: {'count': n, 'centers': [...]}}
-        """
-        try:
-            maestro_file = self.get_data_path("Form.Maestro.Neg.xlsx")
-            
-            if not os.path.exists(maestro_file):
-                raise FileNotFoundError("No se encontró el archivo Form.Maestro.Neg.xlsx")
-            
-            # Convertir centros a set para búsqueda más eficiente
-            centers = set(str(c).strip() for c in centers)
-            
-            # Leer la hoja de MOBILIARIOS
-            df = pd.read_excel(maestro_file, sheet_name='MOBILIARIOS')
-            
-            # Normalizar la categoría y convertir columnas a string
-            category = category.upper().strip()
-            df['CENTRO'] = df['CENTRO'].astype(str).str.strip()
-            df['CATEGORIA'] = df['CATEGORIA'].astype(str).str.upper().str.strip()
-            
-            # Filtrar por categoría
-            df_filtered = df[df['CATEGORIA'] == category]
-            
-            # Identificar diferentes tipos de centros
-            centers_in_excel = set(df_filtered['CENTRO'].unique())
-            centers_with_empty_data = set()
-            centers_with_data = set()
-            
-            # Analizar cada centro en el Excel
-            for center in centers:
-                center_data = df_filtered[df_filtered['CENTRO'] == center]
-                if not center_data.empty:
-                    # Verificar si tiene valor en NÚMERO DE MÓDULOS
-                    if pd.isna(center_data['NÚMERO DE MÓDULOS'].iloc[0]) or center_data['NÚMERO DE MÓDULOS'].iloc[0] == '':
-                        centers_with_empty_data.add(center)
-                    else:
-                        centers_with_data.add(center)
-            
-            # Identificar centros no encontrados
-            centers_not_found = centers - centers_in_excel
-            
-            # Inicializar resultado
-            result = {}
-            
-            # Agregar datos por número de módulos
-            if not df_filtered.empty:
-                for num_modulos, group in df_filtered[df_filtered['CENTRO'].isin(centers_with_data)].groupby('NÚMERO DE MÓDULOS'):
-                    result[str(num_modulos)] = {
-                        'count': len(group),
-                        'centers': sorted(group['CENTRO'].tolist())
-                    }
-            
-            # Agregar centros con datos vacíos
-            if centers_with_empty_data:
-                result['Datos vacíos'] = {
-                    'count': len(centers_with_empty_data),
-                    'centers': sorted(list(centers_with_empty_data))
-                }
-                
-            # Agregar centros no encontrados
-            if centers_not_found:
-                result['No encontrados'] = {
-                    'count': len(centers_not_found),
-                    'centers': sorted(list(centers_not_found))
-                }
-                
-            # Imprimir información de diagnóstico
-            print(f"\nDiagnóstico de modulación:")
-            print(f"Total centros en grupo: {len(centers)}")
-            print(f"Centros con datos: {len(centers_with_data)}")
-            print(f"Centros con datos vacíos: {len(centers_with_empty_data)}")
-            print(f"Centros no encontrados: {len(centers_not_found)}")
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error al leer datos de modulación: {str(e)}")
-            return None
-
     def create_modulation_section(self, parent, category, modulation_data):
         """
         Crea una sección visual para mostrar el análisis de modulación.
@@ -3246,10 +3168,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 return
             
             # Obtener todos los centros analizados
-            all_centers = set()
-            for centers in self.identical_portfolios.keys():
-                all_centers.update(centers)
-            all_centers.update(self.unique_portfolios.keys())
+            all_centers = set(self.engine.center_index.centers())
             
             # Filtrar datos para los centros analizados
             centers_data = geo_data[geo_data['Centro'].isin(all_centers)]
@@ -3683,7 +3602,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 return
                 
             # Obtener grupos finales
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
             
             # Crear el contenedor principal
             main_container = ctk.CTkFrame(
@@ -4093,7 +4012,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 return
                 
             # Obtener los datos de modulación
-            modulation_data = self.get_modulation_data(centers, category)
+            modulation_data = self.engine.get_modulation_data(centers, category)
             if not modulation_data:
                 messagebox.showerror(
                     "Error",
@@ -4369,52 +4288,11 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             messagebox.showerror("Error", f"Error al mostrar el análisis: {str(e)}")
 
     def load_geographic_data(self):
-        """Cargar datos geográficos desde el archivo Excel."""
-        try:
-            # Usar el método de la clase base para obtener la ruta del archivo
-            db_file = self.get_data_path("db_maestrospdv.xlsx")
-            
-            # Leer archivo
-            df = pd.read_excel(db_file)
-        
-            # Verificar existencia de columnas exactas
-            required_columns = {
-                'Centro': self.column_validator.find_column(df, 'CENTRO'),
-                'Distrito': 'Distrito',  # Nombre exacto
-                'Region': 'Región'       # Nombre exacto con tilde
-            }
-            
-            # Verificar si las columnas existen
-            missing_columns = []
-            for col_name in ['Distrito', 'Región']:
-                if col_name not in df.columns:
-                    missing_columns.append(col_name)
-            
-            if missing_columns:
-                raise ValueError(
-                    f"No se encontraron las siguientes columnas exactas: "
-                    f"{', '.join(missing_columns)}"
-                )
-            
-            # Crear DataFrame con las columnas encontradas
-            result_df = pd.DataFrame({
-                'Centro': df[required_columns['Centro']],
-                'Distrito': df['Distrito'],
-                'Region': df['Región']
-            })
-            
-            # Limpiar datos manteniendo mayúsculas/minúsculas originales
-            for col in result_df.columns:
-                result_df[col] = result_df[col].astype(str).str.strip()
-                
-            result_df = result_df.drop_duplicates()
-            result_df = result_df.dropna()
-            
-            return result_df
-            
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            return None
+        """Cargar datos geográficos (ver PortfolioEngine) e informar si no se pudo."""
+        geo_data = self.engine.load_geographic_data()
+        if geo_data is None:
+            messagebox.showerror("Error", "No se pudieron cargar los datos geográficos (db_maestrospdv.xlsx)")
+        return geo_data
     
     def generate_district_distribution(self, group_centers, geo_data):
         """Generar visualización de distribución por distrito y región."""
@@ -4579,52 +4457,39 @@ class ModernPortfolioAnalyzerApp(BaseApp):
     def get_group_portfolio_data(self, centers, selected_fields):
         """Obtener datos del portafolio para el grupo seleccionado."""
         try:
-            # Leer archivo original
-            df = pd.read_excel(self.file_path_var.get())
-            
-            # Buscar la columna de centro ignorando mayúsculas/minúsculas y espacios
-            centro_column = None
-            plu_column = None
-            
-            for col in df.columns:
-                col_clean = str(col).upper().strip()
-                if 'CENTRO' in col_clean:
-                    centro_column = col
-                if 'PLU' in col_clean:
-                    plu_column = col
-            
-            if not centro_column or not plu_column:
-                raise ValueError(
-                    f"No se encontraron las columnas requeridas.\n"
-                    f"Columnas disponibles: {', '.join(df.columns)}"
-                )
+            # Usar los datos ya cargados del archivo original
+            try:
+                dataset = self.engine.get_dataset(self.file_path_var.get())
+            except Exception as e:
+                raise ValueError(f"No se encontraron las columnas requeridas.\n{str(e)}")
+            df = dataset.df
             
             # Filtrar por centros del grupo
-            df_group = df[df[centro_column].astype(str).isin([str(c) for c in centers])]
+            df_centers = df[dataset.centro_col].astype(str).str.strip()
+            df_group = df[df_centers.isin({str(c) for c in centers})]
+            group_plus = df_group[dataset.plu_col].astype(str).str.strip()
+            group_centers = df_centers[df_group.index]
+            
+            # Primera fila de cada PLU y centros que lo tienen
+            first_rows = df_group[~group_plus.duplicated()]
+            centers_by_plu = group_centers.groupby(group_plus).agg(set)
             
             # Crear diccionario para almacenar resultados
             results = []
             
-            # Obtener PLUs únicos
-            unique_plus = df_group[plu_column].unique()
-            
-            for plu in unique_plus:
+            for idx, plu in group_plus[first_rows.index].items():
                 item = {}
                 # Agregar campos seleccionados
                 for field in selected_fields:
                     if field in df.columns:
-                        value = df[df[plu_column] == plu][field].iloc[0]
-                        item[field] = value
+                        item[field] = first_rows.at[idx, field]
                     else:
                         item[field] = ''  # Valor vacío si no se encuentra el campo
                 
                 # Agregar marca de verificación para cada centro
+                plu_centers = centers_by_plu.get(plu, set())
                 for center in centers:
-                    has_plu = df[
-                        (df[plu_column] == plu) & 
-                        (df[centro_column].astype(str) == str(center))
-                    ].shape[0] > 0
-                    item[str(center)] = "✓" if has_plu else ""
+                    item[str(center)] = "✓" if str(center) in plu_centers else ""
                 
                 results.append(item)
             
@@ -4651,7 +4516,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
     def get_available_columns(self):
         """Obtener las columnas disponibles del archivo original."""
         try:
-            df = pd.read_excel(self.file_path_var.get())
+            df = self.engine.get_dataset(self.file_path_var.get()).df
             # Filtrar columnas, excluyendo la de centro que se agrega automáticamente
             columns = [col for col in df.columns if 'CENTRO' not in str(col).upper()]
             return columns
@@ -4760,55 +4625,12 @@ class ModernPortfolioAnalyzerApp(BaseApp):
     def show_portfolio_variation(self, group_num, centers):
         """Mostrar ventana de análisis de variación de portafolio."""
         try:
-            # Leer el archivo Excel
-            df = pd.read_excel(self.file_path_var.get(), sheet_name='Sheet1')
-            
-            # Validar columnas requeridas (CENTRO y PLU_SAP)
-            required_columns = self.column_validator.validate_required_columns(
-                df, ['CENTRO', 'PLU_SAP']
-            )
-            
-            # Intentar encontrar columnas opcionales
-            optional_columns = ['CATEGORIA', 'SUBCATEGORIA', 'SEGMENTO', 'ARTICULO']
-            for col_type in optional_columns:
-                try:
-                    found_col = self.column_validator.find_column(df, col_type, raise_error=False)
-                    if found_col:
-                        required_columns[col_type] = found_col
-                    else:
-                        # Si no se encuentra la columna, crear una columna con '-'
-                        df[col_type] = '-'
-                        required_columns[col_type] = col_type
-                except:
-                    # Si hay cualquier error, crear una columna con '-'
-                    df[col_type] = '-'
-                    required_columns[col_type] = col_type
-
-            # Primero filtrar usando el nombre original de la columna
-            centro_col = required_columns['CENTRO']
-            df_filtered = df[df[centro_col].astype(str).isin([str(c) for c in centers])]
-
-            # Crear una copia para evitar SettingWithCopyWarning
-            df_filtered = df_filtered.copy()
-
-            # Renombrar las columnas al formato esperado por SimplePivotTable
-            column_mapping = {
-                required_columns['CENTRO']: 'Centro',
-                required_columns['PLU_SAP']: 'PLU_SAP',
-                required_columns['CATEGORIA']: 'Categoria',
-                required_columns['SUBCATEGORIA']: 'Subcategoria',
-                required_columns['SEGMENTO']: 'Segmento',
-                required_columns['ARTICULO']: 'Articulo'
-            }
-            
-            # Aplicar el renombramiento
-            df_filtered = df_filtered.rename(columns=column_mapping)
-            
-            # Verificar que tenemos todas las columnas necesarias
-            expected_columns = ['Centro', 'PLU_SAP', 'Categoria', 'Subcategoria', 'Segmento', 'Articulo']
-            for col in expected_columns:
-                if col not in df_filtered.columns:
-                    df_filtered[col] = '-'
+            # Datos ya cargados con las columnas en el formato de SimplePivotTable
+            dataset = self.engine.get_dataset(self.file_path_var.get())
+            df = dataset.analysis_frame()
+
+            # Filtrar los centros del grupo
+            df_filtered = df[dataset.center_mask(centers)].copy()
             
             # Crear la ventana de pivot
             SimplePivotTable(
@@ -4843,7 +4665,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 return
             
             # Obtener grupos finales
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
             
             # Crear reporte para cada grupo
             for i, group in enumerate(final_groups, 1):
@@ -4856,182 +4678,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         except Exception as e:
             messagebox.showerror("Error", f"Error al generar reportes: {str(e)}")
 
-    def adjust_column_widths(self, worksheet, min_width=8, max_width=60):
-        """
-        Ajusta el ancho de las columnas según el contenido.
-        
-        Args:
-            worksheet: Worksheet de openpyxl
-            min_width: Ancho mínimo de columna
-            max_width: Ancho máximo de columna
-        """
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            
-            # Calcular el ancho máximo necesario
-            for cell in column:
-                try:
-                    if cell.value:
-                        cell_length = len(str(cell.value))
-                        # Considerar saltos de línea
-                        if '\n' in str(cell.value):
-                            cell_length = max(len(line) for line in str(cell.value).split('\n'))
-                        max_length = max(max_length, cell_length)
-                except:
-                    pass
-            
-            # Ajustar el ancho con padding
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column_letter].width = max(min(adjusted_width, max_width), min_width)
-
-    def configure_group_final_sheet(self, worksheet):
-        """
-        Configura el formato específico para las hojas de grupos finales.
-        
-        Args:
-            worksheet: Worksheet de openpyxl
-        """
-        # Fijar ancho de columnas específicas
-        fixed_width_columns = {'A': 40, 'B': 40, 'D': 40, 'E': 40}
-        for col, width in fixed_width_columns.items():
-            worksheet.column_dimensions[col].width = width
-        
-        # Activar wrap text para todas las celdas
-        for row in worksheet.rows:
-            for cell in row:
-                if cell.value:  # Solo configurar celdas con contenido
-                    cell.alignment = Alignment(
-                        horizontal='left',
-                        vertical='center',
-                        wrap_text=True
-                    )
-
-    def create_centers_sheet(self, workbook, title, centers_data, base_font, header_font, header_fill):
-        """
-        Crea una hoja para listar centros con formato profesional.
-        
-        Args:
-            workbook: Workbook de openpyxl
-            title: Título de la hoja
-            centers_data: Lista de tuplas (centro, plus)
-            base_font: Fuente base
-            header_font: Fuente para encabezados
-            header_fill: Relleno para encabezados
-        """
-        ws = workbook.create_sheet(title)
-        current_row = 1
-        
-        # Título
-        cell = ws.cell(row=current_row, column=1, value=title)
-        cell.font = Font(name='Segoe UI', size=14, bold=True)
-        cell.alignment = Alignment(horizontal='left', vertical='center')
-        current_row += 2
-        
-        # Encabezados
-        headers = ["Centro", "Cantidad de PLUs", "PLUs"]
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=current_row, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        current_row += 1
-        
-        # Datos
-        for center, plus_set in centers_data:
-            row_data = [
-                center,
-                len(plus_set),
-                ", ".join(map(str, sorted(plus_set)))
-            ]
-            
-            for col, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col, value=value)
-                cell.font = base_font
-                cell.alignment = Alignment(
-                    horizontal='left' if col == 3 else 'center',
-                    vertical='center',
-                    wrap_text=True
-                )
-            current_row += 1
-        
-        # Ajustar ancho de columnas
-        self.adjust_column_widths(ws)
-        
-        return ws
-
-    def create_title_row(self, ws, title, row=1, subtitle=None):
-        """Crear fila de título con formato y opcional subtítulo."""
-        cell = ws.cell(row=row, column=1, value=title)
-        cell.font = self.title_font
-        cell.alignment = self.left_alignment
-        
-        if subtitle:
-            sub_cell = ws.cell(row=row+1, column=1, value=subtitle)
-            sub_cell.font = self.subtitle_font
-            sub_cell.alignment = self.left_alignment
-            return row + 3
-        return row + 2
-
-    def add_table_headers(self, ws, headers, row):
-        """Agregar encabezados de tabla con formato."""
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=row, column=col, value=header)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.center_alignment
-        return row + 1
-
-    def format_pivot_tables(self, workbook):
-        """
-        Aplica formato de tabla dinámica y ajuste de texto a todas las hojas.
-        
-        Args:
-            workbook: Workbook de openpyxl
-        """
-        for ws in workbook.worksheets:
-            # Aplicar wrap_text y alineación a todas las celdas con contenido
-            for row in ws.rows:
-                for cell in row:
-                    if cell.value:  # Solo configurar celdas con contenido
-                        cell.alignment = Alignment(
-                            horizontal='left',
-                            vertical='center',
-                            wrap_text=True
-                        )
-            
-            # Ajustar ancho de columnas para todas las hojas
-            self.adjust_column_widths(ws)
-            
-            # Aplicar formato de tabla solo a las hojas que no son de grupos finales
-            if not ws.title.startswith("Grupo Final"):
-                try:
-                    # Encontrar el rango de datos
-                    data_range = f"A3:{get_column_letter(ws.max_column)}{ws.max_row}"
-                    
-                    # Crear tabla con estilo personalizado
-                    table = Table(
-                        displayName=f"Table_{ws.title.replace(' ', '_')}",
-                        ref=data_range
-                    )
-                    
-                    # Aplicar estilo de tabla
-                    style = TableStyleInfo(
-                        name="TableStyleMedium20",
-                        showFirstColumn=False,
-                        showLastColumn=False,
-                        showRowStripes=True,
-                        showColumnStripes=False
-                    )
-                    table.tableStyleInfo = style
-                                
-                    # Agregar tabla a la hoja
-                    ws.add_table(table)
-                    
-                except Exception:
-                    # Ignorar errores si la hoja no puede tener formato de tabla
-                    continue
-
     def normalize_text(self, text):
         """Elimina tildes, normaliza espacios y símbolos"""
         text = str(text).strip()
@@ -5086,484 +4732,33 @@ class ModernPortfolioAnalyzerApp(BaseApp):
 
         return group_name
 
-    def add_variation_analysis_sheets(self, writer):
+    def extract_group_info(self, group_frame):
         """
-        Agrega hojas de análisis de variación para cada grupo final al archivo Excel.
+        Extrae la información de un grupo desde su frame.
+        
+        Args:
+            group_frame: Frame que contiene la información del grupo
+            
+        Returns:
+            dict: Diccionario con la información del grupo o None si no se puede extraer
         """
         try:
-            # Obtener grupos finales
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
-            
-            # Leer específicamente Sheet1
-            df = pd.read_excel(self.file_path_var.get(), sheet_name='Sheet1')
+            group_info = {}
             
-            # Validar columnas requeridas (CENTRO y PLU_SAP)
-            required_columns = self.column_validator.validate_required_columns(
-                df, ['CENTRO', 'PLU_SAP']
-            )
+            # Buscar los labels que contienen la información
+            for widget in group_frame.winfo_children():
+                if isinstance(widget, ttk.Label):
+                    text = widget.cget("text")
+                    if "Centros:" in text:
+                        # Extraer y limpiar la lista de centros
+                        centers_text = text.split("Centros:")[1].strip()
+                        centers = [c.strip() for c in centers_text.split(",")]
+                        group_info['centers'] = centers
+                        
+                    # Añadir más extracciones según sea necesario
+                    # Por ejemplo, criterios de agrupación si los hay
             
-            # Intentar encontrar columnas opcionales
-            optional_columns = ['CATEGORIA', 'SUBCATEGORIA', 'SEGMENTO', 'ARTICULO']
-            for col_type in optional_columns:
-                try:
-                    found_col = self.column_validator.find_column(df, col_type, raise_error=False)
-                    if found_col:
-                        required_columns[col_type] = found_col
-                    else:
-                        # Si no se encuentra la columna, crear una columna con '-'
-                        df[col_type] = '-'
-                        required_columns[col_type] = col_type
-                except:
-                    # Si hay cualquier error, crear una columna con '-'
-                    df[col_type] = '-'
-                    required_columns[col_type] = col_type
-
-            # Limpiar y preparar los datos
-            for col_name in required_columns.values():
-                df[col_name] = df[col_name].fillna('-').astype(str).str.strip()
-            
-            # Procesar cada grupo final
-            for group_num, group in enumerate(final_groups, 1):
-                try:
-                    sheet_name = f'Análisis GF. {group_num}'
-                    
-                    # Filtrar datos para el grupo actual
-                    centers = [str(c) for c in group['centers']]
-                    df_group = df[df[required_columns['CENTRO']].isin(centers)].copy()
-                    
-                    # Crear una columna auxiliar para el conteo
-                    df_group['count'] = 1
-                    
-                    # Configurar las columnas para el pivot
-                    index_columns = [
-                        required_columns['CATEGORIA'],
-                        required_columns['SUBCATEGORIA'],
-                        required_columns['SEGMENTO'],
-                        required_columns['PLU_SAP'],
-                        required_columns['ARTICULO']
-                    ]
-                    
-                    # Crear el pivot table
-                    pivot = pd.pivot_table(
-                        df_group,
-                        index=index_columns,
-                        columns=[required_columns['CENTRO']],
-                        values='count',
-                        aggfunc='sum',
-                        fill_value=0
-                    )
-                    
-                    # Convertir a 1s y 0s
-                    pivot = (pivot > 0).astype(int)
-                    
-                    # Resetear índice
-                    pivot = pivot.reset_index()
-                    
-                    # Renombrar columnas al formato esperado
-                    column_mapping = {
-                        required_columns['CATEGORIA']: 'Categoria',
-                        required_columns['SUBCATEGORIA']: 'Subcategoria',
-                        required_columns['SEGMENTO']: 'Segmento',
-                        required_columns['PLU_SAP']: 'PLU_SAP',
-                        required_columns['ARTICULO']: 'Articulo'
-                    }
-                    
-                    # Renombrar columnas de índice
-                    pivot = pivot.rename(columns=column_mapping)
-                    
-                    # Ordenar columnas
-                    fixed_cols = ['Categoria', 'Subcategoria', 'Segmento', 'PLU_SAP', 'Articulo']
-                    center_cols = sorted([col for col in pivot.columns if col not in fixed_cols])
-                    pivot = pivot[fixed_cols + center_cols]
-                    
-                    # Escribir a Excel
-                    pivot.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    # Obtener la hoja y aplicar formato
-                    worksheet = writer.sheets[sheet_name]
-                    
-                    # Quitar las líneas de cuadrícula
-                    worksheet.sheet_view.showGridLines = False
-
-                    # Aplicar formato base a toda la hoja
-                    worksheet.font = Font(name='Segoe UI', size=10)
-
-                    # Formato para encabezados
-                    header_font = Font(name='Segoe UI', size=11, bold=True)
-                    header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
-                    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-
-                    # Aplicar formato a los encabezados
-                    for col in range(1, worksheet.max_column + 1):
-                        cell = worksheet.cell(row=1, column=col)
-                        cell.font = header_font
-                        cell.fill = header_fill
-                        cell.alignment = header_alignment
-
-                    # Ajustar anchos de columna y aplicar formatos
-                    for col in range(1, worksheet.max_column + 1):
-                        column_letter = get_column_letter(col)
-                        
-                        # Obtener el máximo ancho necesario para la columna
-                        max_length = 0
-                        for row in range(1, worksheet.max_row + 1):
-                            cell = worksheet.cell(row=row, column=col)
-                            if cell.value:
-                                try:
-                                    max_length = max(max_length, len(str(cell.value)))
-                                except:
-                                    pass
-
-                        # Ajustar ancho basado en el contenido
-                        if worksheet.cell(row=1, column=col).value in ['Categoria', 'Subcategoria', 'Segmento', 'Articulo']:
-                            worksheet.column_dimensions[column_letter].width = min(max_length + 2, 40)
-                        elif 'PLU' in str(worksheet.cell(row=1, column=col).value):
-                            worksheet.column_dimensions[column_letter].width = 15
-                        else:
-                            worksheet.column_dimensions[column_letter].width = 8
-
-                    # Aplicar formato a las celdas de datos
-                    normal_font = Font(name='Segoe UI', size=10)
-                    normal_alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
-                    center_alignment = Alignment(horizontal='center', vertical='center')
-
-                    for row in worksheet.iter_rows(min_row=2):
-                        for idx, cell in enumerate(row, 1):
-                            cell.font = normal_font
-                            
-                            # Alineación basada en el tipo de columna
-                            if idx <= 5:  # Primeras 5 columnas (categoría, subcategoría, etc.)
-                                cell.alignment = normal_alignment
-                            else:  # Columnas de centros
-                                cell.alignment = center_alignment
-
-                    # Congelar panel superior
-                    worksheet.freeze_panes = 'A2'
-                    
-                    print(f"Se exportó el análisis del Grupo Final {group_num}")
-                    
-                except Exception as e:
-                    print(f"Error al procesar Grupo Final {group_num}: {str(e)}")
-                    continue
-                        
-        except Exception as e:
-            print(f"Error al exportar análisis de variación: {str(e)}")
-            raise
-
-    def add_initial_sheet(self, writer):
-        try:
-            # Leer la hoja Sheet1 del archivo original
-            df = pd.read_excel(self.file_path_var.get(), sheet_name='Sheet1')
-            
-            # Función para normalizar texto (eliminar tildes y mayúsculas)
-            def normalize_text(text):
-                """Elimina tildes y convierte a mayúsculas"""
-                # Convertir a string por si acaso
-                text = str(text)
-                # Convertir a mayúsculas
-                text = text.upper()
-                # Normalizar caracteres (NFD descompone los caracteres con tilde)
-                text = unicodedata.normalize('NFD', text)
-                # Eliminar los caracteres diacríticos
-                text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
-                return text.strip()
-
-            # Columnas exactas que queremos (sin variaciones)
-            exact_columns = {
-                'DIRECCION NAL.': ['Dirección Nal.', 'DIRECCION NAL', 'DIRECCION NACIONAL'],
-                'CLUSTER': ['Cluster', 'CLUSTER'],
-                'LLAVECP': ['LLAVECP', 'LLAVE CP', 'LLAVE_CP'],
-                'MARCA': ['Marca', 'MARCA'],
-                'CLASEMARCA': ['ClaseMarca', 'CLASE MARCA', 'CLASE_MARCA'],
-                'VENTA 6 MESES': ['Venta 6 Meses', 'VENTA 6 MESES', 'VENTA_6_MESES']
-            }
-            
-            # Columnas que tienen variaciones en ColumnValidator
-            column_types = [
-                'CENTRO', 'PLU_SAP', 'CATEGORIA', 'SUBCATEGORIA', 
-                'SEGMENTO', 'ARTICULO'
-            ]
-            
-            # Normalizar nombres de columnas del DataFrame
-            df.columns = [str(col) for col in df.columns]  # Convertir a string
-            normalized_columns = {normalize_text(col): col for col in df.columns}
-            
-            # Usar el validador para encontrar las columnas con variaciones
-            found_columns = {}
-            for col_type in column_types:
-                try:
-                    found_col = self.column_validator.find_column(df, col_type, raise_error=False)
-                    if found_col:
-                        found_columns[col_type] = found_col
-                except Exception:
-                    continue
-            
-            # Buscar columnas exactas normalizando nombres
-            exact_found_columns = {}
-            for col_key, variations in exact_columns.items():
-                for variation in variations:
-                    normalized_variation = normalize_text(variation)
-                    if normalized_variation in normalized_columns.keys():
-                        exact_found_columns[col_key] = normalized_columns[normalized_variation]
-                        break
-            
-            # Crear lista de todas las columnas a mantener
-            columns_to_keep = []
-            
-            # Agregar columnas encontradas por el validador
-            columns_to_keep.extend(found_columns.values())
-            
-            # Agregar columnas exactas encontradas
-            columns_to_keep.extend(exact_found_columns.values())
-            
-            # Verificar si tenemos al menos la columna Centro para poder agregar el grupo
-            if 'CENTRO' not in found_columns:
-                raise ValueError("La columna Centro es requerida para generar la hoja Sheet1")
-            
-            # Crear nuevo DataFrame con todas las columnas encontradas
-            df_new = df[columns_to_keep].copy()
-            
-            # Obtener grupos finales
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
-            
-            # Crear diccionario de mapeo centro -> grupo
-            centro_grupo_map = {}
-            for group_num, group in enumerate(final_groups, 1):
-                for center in group['centers']:
-                    centro_grupo_map[str(center)] = f'Grupo Final {group_num}'
-            
-            # Insertar columna de Grupo al inicio
-            centro_col = found_columns['CENTRO']
-            df_new.insert(0, 'Grupo', df_new[centro_col].astype(str).map(centro_grupo_map).fillna('-'))
-            
-            # Escribir a Excel
-            df_new.to_excel(writer, sheet_name='Sheet1', index=False)
-            
-            # Aplicar formato
-            worksheet = writer.sheets['Sheet1']
-            
-            # Formato para encabezados
-            header_format = Font(name='Segoe UI', size=11, bold=True)
-            header_fill = PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid')
-            
-            # Aplicar formato a encabezados
-            for col in range(1, len(df_new.columns) + 1):
-                cell = worksheet.cell(row=1, column=col)
-                cell.font = header_format
-                cell.fill = header_fill
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # Formato para datos y formato especial para Venta 6 Meses
-            for row in range(2, len(df_new) + 2):
-                for col in range(1, len(df_new.columns) + 1):
-                    cell = worksheet.cell(row=row, column=col)
-                    cell.font = Font(name='Segoe UI', size=10)
-                    cell.alignment = Alignment(horizontal='left', vertical='center')
-                    
-                    # Aplicar formato de contabilidad a Venta 6 Meses
-                    if normalize_text(df_new.columns[col-1]) == 'VENTA 6 MESES':
-                        cell.number_format = '"$"#,##0_);("$"#,##0)'
-            
-            # Ajustar anchos de columna
-            for col in worksheet.columns:
-                max_length = 0
-                for cell in col:
-                    try:
-                        max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-                worksheet.column_dimensions[col[0].column_letter].width = min(max_length + 2, 40)
-            
-            # Agregar bordes
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            for row in worksheet.iter_rows(min_row=1, max_row=len(df_new) + 1):
-                for cell in row:
-                    cell.border = border
-            
-            # Congelar panel superior
-            worksheet.freeze_panes = 'A2'
-            
-        except Exception as e:
-            print(f"Error al crear hoja Sheet1: {str(e)}")
-            raise
-
-    def add_consolidated_sheet(self, writer):
-        """
-        Agrega una hoja consolidada con información detallada de cada centro.
-        """
-        try:
-            # Cargar datos maestros
-            maestro_file = self.get_data_path("db_maestrospdv.xlsx")
-            
-            if not os.path.exists(maestro_file):
-                raise FileNotFoundError("No se encontró el archivo db_maestrospdv.xlsx")
-                
-            # Leer datos maestros
-            df_maestro = pd.read_excel(maestro_file)
-            
-            # Obtener grupos finales
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
-            
-            # Crear DataFrame para la hoja consolidada
-            consolidated_data = []
-            
-            # Procesar cada grupo final
-            for group_num, group in enumerate(final_groups, 1):
-                # Procesar cada centro del grupo
-                for center in sorted(group['centers']):
-                    # Buscar información del centro en datos maestros
-                    centro_info = df_maestro[df_maestro['Centro'].astype(str).str.strip() == str(center)]
-                    
-                    # Obtener cantidad de PLUs para este centro
-                    if center in self.unique_portfolios:
-                        plus_count = len(self.unique_portfolios[center])
-                    else:
-                        for centers, plus in self.identical_portfolios.items():
-                            if str(center) in [str(c) for c in centers]:
-                                plus_count = len(plus)
-                                break
-                        else:
-                            plus_count = 0
-                    
-                    # Agregar fila al consolidado
-                    row = {
-                        'Grupo': f'Grupo Final {group_num}',
-                        'Centro': center,
-                        'Formato': centro_info['Formato'].iloc[0] if not centro_info.empty else '-',
-                        'Región': centro_info['Región'].iloc[0] if not centro_info.empty else '-',
-                        'Ciudad': centro_info['Ciudad'].iloc[0] if not centro_info.empty else '-',
-                        'Estrato': centro_info['Estrato'].iloc[0] if not centro_info.empty else '-',
-                        'Cant. PLUs': plus_count
-                    }
-                    consolidated_data.append(row)
-            
-            # Agregar centros sin recomendación
-            for center in sorted(self.non_compatible):
-                # Buscar información del centro en datos maestros
-                centro_info = df_maestro[df_maestro['Centro'].astype(str).str.strip() == str(center)]
-                
-                # Obtener cantidad de PLUs del centro
-                plus_count = len(self.unique_portfolios[center]) if center in self.unique_portfolios else 0
-                
-                # Agregar fila al consolidado
-                row = {
-                    'Grupo': '-',
-                    'Centro': center,
-                    'Formato': centro_info['Formato'].iloc[0] if not centro_info.empty else '-',
-                    'Región': centro_info['Región'].iloc[0] if not centro_info.empty else '-',
-                    'Ciudad': centro_info['Ciudad'].iloc[0] if not centro_info.empty else '-',
-                    'Estrato': centro_info['Estrato'].iloc[0] if not centro_info.empty else '-',
-                    'Cant. PLUs': plus_count
-                }
-                consolidated_data.append(row)
-
-            # Crear DataFrame
-            df_consolidated = pd.DataFrame(consolidated_data)
-            
-            # Escribir a Excel con formato
-            df_consolidated.to_excel(writer, sheet_name='Consolidado', index=False)
-            
-            # Obtener la hoja
-            worksheet = writer.sheets['Consolidado']
-            
-            # Configurar formato
-            header_format = {
-                'font': Font(name='Segoe UI', size=11, bold=True),
-                'fill': PatternFill(start_color='F3F4F6', end_color='F3F4F6', fill_type='solid'),
-                'alignment': Alignment(horizontal='center', vertical='center')
-            }
-            
-            # Aplicar formato a encabezados
-            for col in range(1, len(df_consolidated.columns) + 1):
-                cell = worksheet.cell(row=1, column=col)
-                cell.font = header_format['font']
-                cell.fill = header_format['fill']
-                cell.alignment = header_format['alignment']
-            
-            # Formato para celdas de datos
-            data_format = Font(name='Segoe UI', size=10)
-            center_alignment = Alignment(horizontal='center', vertical='center')
-            left_alignment = Alignment(horizontal='left', vertical='center')
-            
-            # Aplicar formato a datos
-            for row in range(2, len(df_consolidated) + 2):
-                for col in range(1, len(df_consolidated.columns) + 1):
-                    cell = worksheet.cell(row=row, column=col)
-                    cell.font = data_format
-                    
-                    # Alineación específica por columna
-                    if col in [1, 2, 7]:  # Grupo, Centro, Cant. PLUs
-                        cell.alignment = center_alignment
-                    else:
-                        cell.alignment = left_alignment
-            
-            # Ajustar anchos de columna
-            for col in worksheet.columns:
-                max_length = 0
-                column = col[0].column_letter
-                
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                        
-                adjusted_width = (max_length + 2)
-                worksheet.column_dimensions[column].width = min(adjusted_width, 40)
-            
-            # Agregar bordes a la tabla
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            for row in worksheet.iter_rows(min_row=1, max_row=len(df_consolidated) + 1):
-                for cell in row:
-                    cell.border = border
-            
-            # Congelar panel superior
-            worksheet.freeze_panes = 'A2'
-            
-        except Exception as e:
-            print(f"Error al crear hoja consolidada: {str(e)}")
-            raise
-
-    def extract_group_info(self, group_frame):
-        """
-        Extrae la información de un grupo desde su frame.
-        
-        Args:
-            group_frame: Frame que contiene la información del grupo
-            
-        Returns:
-            dict: Diccionario con la información del grupo o None si no se puede extraer
-        """
-        try:
-            group_info = {}
-            
-            # Buscar los labels que contienen la información
-            for widget in group_frame.winfo_children():
-                if isinstance(widget, ttk.Label):
-                    text = widget.cget("text")
-                    if "Centros:" in text:
-                        # Extraer y limpiar la lista de centros
-                        centers_text = text.split("Centros:")[1].strip()
-                        centers = [c.strip() for c in centers_text.split(",")]
-                        group_info['centers'] = centers
-                        
-                    # Añadir más extracciones según sea necesario
-                    # Por ejemplo, criterios de agrupación si los hay
-            
-            return group_info if 'centers' in group_info else None
+            return group_info if 'centers' in group_info else None
             
         except Exception as e:
             print(f"Error al extraer información del grupo: {str(e)}")
@@ -5579,7 +4774,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         
         # Centrar el diálogo
         window_width = 500
-        window_height = 700
+        window_height = 740
         screen_width = dialog.winfo_screenwidth()
         screen_height = dialog.winfo_screenheight()
         x = (screen_width - window_width) // 2
@@ -5613,6 +4808,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             'analisis_modulacion': tk.BooleanVar(value=False),
             'centros_unicos': tk.BooleanVar(value=True),
             'centros_no_compatibles': tk.BooleanVar(value=True),
+            'curva_limites': tk.BooleanVar(value=bool(self.engine.limit_sweep_results)),
             'analisis_variacion': tk.BooleanVar(value=True),
             'consolidado': tk.BooleanVar(value=True),
             'agrupacion_personalizada': tk.BooleanVar(value=True),
@@ -5719,6 +4915,15 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             text_color="#374151"
         ).pack(anchor="w", pady=5)
 
+        ctk.CTkCheckBox(
+            options_frame,
+            text="Curva por Límite de PLUs",
+            variable=options['curva_limites'],
+            font=("Segoe UI", 12),
+            text_color="#374151",
+            state="normal" if self.engine.limit_sweep_results else "disabled"
+        ).pack(anchor="w", pady=5)
+
         ctk.CTkCheckBox(
             options_frame,
             text="Análisis de Variación",
@@ -5872,7 +5077,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
 
                 # Análisis de Modulación
                 if category:
-                    modulation_data = self.get_modulation_data(group['centers'], category)
+                    modulation_data = self.engine.get_modulation_data(group['centers'], category)
                     if modulation_data:
                         # Título de modulación
                         cell = ws.cell(row=current_row, column=1, value="Análisis de Modulación")
@@ -5937,53 +5142,25 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             sheet_name: Nombre de la hoja
         """
         try:
-            # Leer el archivo Excel
-            df = pd.read_excel(self.file_path_var.get(), sheet_name='Sheet1')
-            
-            # Validar columnas requeridas (CENTRO y PLU_SAP)
-            required_columns = self.column_validator.validate_required_columns(
-                df, ['CENTRO', 'PLU_SAP']
-            )
-            centro_col = required_columns['CENTRO']
-            plu_col = required_columns['PLU_SAP']
-            
-            # Intentar encontrar columnas opcionales
-            optional_columns = ['CATEGORIA', 'SUBCATEGORIA', 'SEGMENTO', 'ARTICULO']
-            for col_type in optional_columns:
-                try:
-                    found_col = self.column_validator.find_column(df, col_type, raise_error=False)
-                    if found_col:
-                        required_columns[col_type] = found_col
-                    else:
-                        # Si no se encuentra la columna, crear una columna con '-'
-                        df[col_type] = '-'
-                        required_columns[col_type] = col_type
-                except:
-                    # Si hay cualquier error, crear una columna con '-'
-                    df[col_type] = '-'
-                    required_columns[col_type] = col_type
+            # Datos de Sheet1 ya cargados con columnas en formato estándar (los del
+            # análisis; se usa desde el hilo de exportación, sin leer la ventana)
+            dataset = self.engine.get_dataset()
+            df = dataset.analysis_frame()
             
             # Filtrar datos para los centros del grupo
-            centers = [str(c) for c in centers]  # Asegurar que los centros sean strings
-            df_group = df[df[centro_col].astype(str).isin(centers)].copy()
+            df_group = df[dataset.center_mask(centers)].copy()
             
             # Crear una columna auxiliar para el conteo
             df_group['count'] = 1
             
             # Configurar las columnas para el pivot
-            index_columns = [
-                required_columns['CATEGORIA'],
-                required_columns['SUBCATEGORIA'],
-                required_columns['SEGMENTO'],
-                required_columns['PLU_SAP'],
-                required_columns['ARTICULO']
-            ]
+            fixed_cols = ['Categoria', 'Subcategoria', 'Segmento', 'PLU_SAP', 'Articulo']
             
             # Crear el pivot table
             pivot = pd.pivot_table(
                 df_group,
-                index=index_columns,
-                columns=[centro_col],
+                index=fixed_cols,
+                columns=['Centro'],
                 values='count',
                 aggfunc='sum',
                 fill_value=0
@@ -5995,20 +5172,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             # Resetear índice
             pivot = pivot.reset_index()
             
-            # Renombrar columnas al formato esperado
-            column_mapping = {
-                required_columns['CATEGORIA']: 'Categoria',
-                required_columns['SUBCATEGORIA']: 'Subcategoria',
-                required_columns['SEGMENTO']: 'Segmento',
-                required_columns['PLU_SAP']: 'PLU_SAP',
-                required_columns['ARTICULO']: 'Articulo'
-            }
-            
-            # Renombrar columnas de índice
-            pivot = pivot.rename(columns=column_mapping)
-            
             # Ordenar columnas
-            fixed_cols = ['Categoria', 'Subcategoria', 'Segmento', 'PLU_SAP', 'Articulo']
             center_cols = sorted([col for col in pivot.columns if col not in fixed_cols])
             pivot = pivot[fixed_cols + center_cols]
             
@@ -6091,7 +5255,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 # Si hay análisis de modulación, obtener los datos
                 modulation_data = None
                 if category:
-                    modulation_data = self.get_modulation_data(group['centers'], category)
+                    modulation_data = self.engine.get_modulation_data(group['centers'], category)
                 
                 # Procesar cada centro del grupo
                 for center in sorted(group['centers']):
@@ -6099,15 +5263,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                     centro_info = df_maestro[df_maestro['Centro'].astype(str).str.strip() == str(center)]
                     
                     # Obtener cantidad de PLUs para este centro
-                    if center in self.unique_portfolios:
-                        plus_count = len(self.unique_portfolios[center])
-                    else:
-                        for centers, plus in self.identical_portfolios.items():
-                            if str(center) in [str(c) for c in centers]:
-                                plus_count = len(plus)
-                                break
-                        else:
-                            plus_count = 0
+                    plus_count = self.engine.center_index.plu_count(center)
                     
                     # Obtener número de módulos si existe el análisis
                     num_modulos = '-'
@@ -6208,281 +5364,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             print(f"Error al crear hoja consolidada II: {str(e)}")
             raise
 
-    def export_summary_sheet(self, writer, final_groups):
-        """Exportar hoja de resumen general."""
-        try:
-            if hasattr(self, 'loading_window'):
-                self.update_loading_message(self.loading_window, "Generando resumen general...")
-            ws_summary = writer.book.create_sheet("Resumen General", 0)
-            current_row = 1
-
-            # Estadísticas generales
-            current_row = self.create_title_row(ws_summary, "Estadísticas Generales")
-            
-            stats_headers = ["Métrica", "Valor", "Porcentaje"]
-            current_row = self.add_table_headers(ws_summary, stats_headers, current_row)
-
-            # Calcular estadísticas
-            stats_data = self._calculate_summary_statistics(final_groups)
-
-            for stat in stats_data:
-                for col, value in enumerate(stat, 1):
-                    cell = ws_summary.cell(row=current_row, column=col, value=value)
-                    cell.font = self.base_font
-                    cell.alignment = self.center_alignment if col > 1 else self.left_alignment
-                current_row += 1
-
-        except Exception as e:
-            print(f"Error al crear resumen general: {str(e)}")
-            raise
-
-    def export_unique_centers_sheet(self, writer):
-        """Exportar hoja de centros únicos."""
-        try:
-            self.update_loading_message(self.loading_window, "Procesando centros únicos...")
-            unique_centers_data = [
-                (center, plus_set) 
-                for center, plus_set in self.unique_portfolios.items()
-                if center not in self.non_compatible
-            ]
-            self.create_centers_sheet(
-                writer.book,
-                "Centros únicos",
-                unique_centers_data,
-                self.base_font,
-                self.header_font,
-                self.header_fill
-            )
-        except Exception as e:
-            print(f"Error al procesar centros únicos: {str(e)}")
-            raise
-
-    def _calculate_summary_statistics(self, final_groups):
-        """Calcular estadísticas para el resumen."""
-        total_centers = int(self.total_centers.get())
-        unique_centers = int(self.unique_centers.get())
-        identical_centers = total_centers - unique_centers
-        initial_masters = len(self.identical_portfolios) + len(self.unique_portfolios)
-        final_masters = len(final_groups) + len(self.non_compatible)
-        optimization_percentage = ((initial_masters - final_masters) / initial_masters * 100 
-                            if initial_masters > 0 else 0)
-        
-        return [
-            ("Total de Centros", total_centers, "100%"),
-            ("Centros en Grupos", identical_centers, f"{(identical_centers/total_centers)*100:.1f}%"),
-            ("Centros Únicos", unique_centers, f"{(unique_centers/total_centers)*100:.1f}%"),
-            ("Grupos Idénticos Iniciales", len(self.identical_portfolios), "-"),
-            ("Planogramas Másteres Iniciales", initial_masters, "-"),
-            ("Planogramas Másteres Finales", final_masters, "-"),
-            ("Optimización de Planogramas", final_masters - initial_masters, 
-            f"{optimization_percentage:.1f}%"),
-            ("Centros sin Recomendación", len(self.non_compatible), 
-            f"{(len(self.non_compatible)/total_centers)*100:.1f}%")
-        ]
-
-    def export_identical_groups_sheet(self, writer):
-        """Exportar hoja de grupos idénticos."""
-        try:
-            self.update_loading_message(self.loading_window, "Procesando grupos idénticos...")
-            ws_identical = writer.book.create_sheet("Grupos Idénticos")
-            current_row = 1
-
-            current_row = self.create_title_row(ws_identical, "Grupos con Portafolios Idénticos")
-            
-            headers = ["Grupo", "Centros", "Cantidad de Centros", "PLUs", "Cantidad de PLUs"]
-            current_row = self.add_table_headers(ws_identical, headers, current_row)
-
-            for i, (centers, plus) in enumerate(self.identical_portfolios.items(), 1):
-                self._add_identical_group_row(ws_identical, current_row, i, centers, plus)
-                current_row += 1
-
-        except Exception as e:
-            print(f"Error al procesar grupos idénticos: {str(e)}")
-            raise
-
-    def _add_identical_group_row(self, worksheet, row, group_num, centers, plus):
-        """Añadir una fila de grupo idéntico."""
-        row_data = [
-            f"Grupo {group_num}",
-            ", ".join(sorted(centers)),
-            len(centers),
-            ", ".join(map(str, sorted(plus))),
-            len(plus)
-        ]
-        
-        for col, value in enumerate(row_data, 1):
-            cell = worksheet.cell(row=row, column=col, value=value)
-            cell.font = self.base_font
-            cell.alignment = self.left_alignment if col in [2, 4] else self.center_alignment
-
-    def export_final_groups_sheet(self, writer, final_groups, geo_data=None, category=None):
-        """Exportar hoja de grupos finales y sus análisis."""
-        try:
-            self.update_loading_message(self.loading_window, "Generando información de grupos finales...")
-            ws_final = writer.book.create_sheet("Grupos Finales")
-            current_row = 1
-
-            current_row = self.create_title_row(ws_final, "Grupos Finales Optimizados")
-            
-            headers = ["Grupo", "Centros", "Cantidad de Centros", 
-                    "PLUs Diferentes", "Cantidad PLUs Dif.", "Total PLUs"]
-            current_row = self.add_table_headers(ws_final, headers, current_row)
-
-            for i, group in enumerate(final_groups, 1):
-                try:
-                    # Exportar grupo principal usando la hoja
-                    self._export_final_group(ws_final, i, group, current_row)
-                    current_row += 1
-
-                    # Crear nueva hoja para el grupo y exportar detalles
-                    ws_group = writer.book.create_sheet(f"Grupo Final {i}")
-                    self.configure_group_final_sheet(ws_group)
-                    
-                    group_row = 1
-                    
-                    # 1. Información básica del grupo
-                    group_row = self.create_title_row(
-                        ws_group, 
-                        f"Grupo Final {i}", 
-                        row=group_row,
-                        subtitle=f"Total centros: {len(group['centers'])}"
-                    )
-                    
-                    # Calcular PLUs diferentes
-                    diff_plus, all_plus = self.calculate_total_different_plus(group['centers'])
-                    
-                    # Lista de centros
-                    headers = ["Centros", "PLUs Diferentes", "Total PLUs"]
-                    group_row = self.add_table_headers(ws_group, headers, group_row)
-                    
-                    # Datos básicos del grupo
-                    group_data = [
-                        ", ".join(sorted(group['centers'])),
-                        ", ".join(map(str, sorted(diff_plus))),
-                        len(all_plus)
-                    ]
-                    
-                    for col, value in enumerate(group_data, 1):
-                        cell = ws_group.cell(row=group_row, column=col, value=value)
-                        cell.font = self.base_font
-                        cell.alignment = self.left_alignment
-                    group_row += 2
-
-                    # Continuar con análisis adicionales si es necesario
-                    if geo_data is not None:
-                        self._add_region_distribution(ws_group, group, geo_data, group_row)
-                    
-                    if category:
-                        self._add_modulation_analysis(ws_group, group, category, group_row)
-
-                except Exception as e:
-                    print(f"Error al procesar Grupo Final {i}: {str(e)}")
-                    continue
-
-        except Exception as e:
-            print(f"Error al generar grupos finales: {str(e)}")
-            raise
-
-    def _export_final_group(self, worksheet, group_num, group, row):
-        """Exportar un grupo final a la hoja."""
-        try:
-            diff_plus, all_plus = self.calculate_total_different_plus(group['centers'])
-            
-            row_data = [
-                f"Grupo Final {group_num}",
-                ", ".join(sorted(group['centers'])),
-                len(group['centers']),
-                ", ".join(map(str, sorted(diff_plus))),
-                len(diff_plus),
-                len(all_plus)
-            ]
-            
-            # Usar worksheet en lugar de writer
-            for col, value in enumerate(row_data, 1):
-                cell = worksheet.cell(row=row, column=col, value=value)
-                cell.font = self.base_font
-                cell.alignment = self.left_alignment if col in [2, 4] else self.center_alignment
-        except Exception as e:
-            print(f"Error al exportar grupo final {group_num}: {str(e)}")
-            raise
-
-    def _export_group_detail_sheet(self, writer, group_num, group, geo_data=None, category=None):
-        """Exportar hoja de detalle para un grupo específico."""
-        self.update_loading_message(self.loading_window, f"Procesando Grupo Final {group_num}...")
-        ws_group = writer.book.create_sheet(f"Grupo Final {group_num}")
-        
-        # Configurar la hoja
-        self.configure_group_final_sheet(ws_group)
-        group_row = 1
-
-        # Información básica
-        group_row = self._export_group_basic_info(ws_group, group_num, group, group_row)
-
-        # Distribución por región
-        if geo_data is not None:
-            group_row = self._export_group_region_distribution(
-                ws_group, group, geo_data, group_row
-            )
-
-        # Análisis de modulación
-        if category:
-            group_row = self._export_group_modulation_analysis(
-                ws_group, group, category, group_row
-            )
-
-        # Ajustar dimensiones
-        self._adjust_sheet_dimensions(ws_group)
-
-    def export_non_compatible_centers_sheet(self, writer):
-        """Exportar hoja de centros no compatibles."""
-        try:
-            self.update_loading_message(self.loading_window, "Procesando centros no compatibles...")
-            non_compatible_data = [
-                (center, self.unique_portfolios[center])
-                for center in sorted(self.non_compatible)
-            ]
-            self.create_centers_sheet(
-                writer.book,
-                "Centros no compatibles",
-                non_compatible_data,
-                self.base_font,
-                self.header_font,
-                self.header_fill
-            )
-        except Exception as e:
-            print(f"Error al procesar centros no compatibles: {str(e)}")
-            raise
-
-    def _adjust_sheet_dimensions(self, worksheet):
-        """Ajustar dimensiones de columnas y filas."""
-        # Ajustar columnas
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            
-            for cell in column:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except:
-                    continue
-            
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column_letter].width = min(adjusted_width, 100)
-
-        # Ajustar filas
-        for row in worksheet.rows:
-            max_height = 0
-            for cell in row:
-                if cell.value:
-                    text_lines = str(cell.value).count('\n') + 1
-                    line_height = 15
-                    needed_height = text_lines * line_height
-                    max_height = max(max_height, needed_height)
-            
-            if max_height > 15:
-                worksheet.row_dimensions[row[0].row].height = max_height
-
     def export_to_excel(self):
         # Mostrar diálogo de opciones
         export_options = self.show_export_options()
@@ -6508,91 +5389,53 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 ):
                     return
                     
-            # Mostrar spinner
-            self.loading_window = self.show_loading_spinner("Preparando exportación...")
+            # Mostrar spinner (el botón Cancelar detiene el hilo en su próxima revisión)
+            cancel_token = CancellationToken()
+            self.loading_window = self.show_loading_spinner("Preparando exportación...", cancel_token)
+            loading_window = self.loading_window
             
             category = None
             if (export_options['analisis_grupos'] and export_options['analisis_modulacion']) or \
             (export_options['agrupacion_personalizada'] and export_options['agrupacion_personalizada_modulacion']):
                 category = self.get_category_input()
-
-            # Crear Excel writer
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                try:
-                    # Cargar datos básicos según necesidad
-                    self.update_loading_message(self.loading_window, "Cargando datos necesarios...")
-                    
-                    df = None
-                    final_groups = None
-                    geo_data = None
-
-                    # Cargar datos solo si son necesarios
-                    df = self._load_basic_data(export_options) if self._needs_basic_data(export_options) else None
-                    final_groups = self.calculate_final_groups(self.current_plu_limit) if self._needs_final_groups(export_options) else None
-                    geo_data = self.load_geographic_data() if self._needs_geo_data(export_options) else None
-
-                    # Resumen General
-                    if export_options['resumen']:
-                        self.export_summary_sheet(writer, final_groups)
-
-                    # Grupos Idénticos
-                    if export_options['grupos_identicos']:
-                        self.export_identical_groups_sheet(writer)
-
-                    # Grupos Finales
-                    if export_options['grupos_finales']:
-                        self.export_final_groups_sheet(writer, final_groups, geo_data, category)
-
-                    # Centros Únicos
-                    if export_options['centros_unicos']:
-                        self.export_unique_centers_sheet(writer)
-
-                    # Centros No Compatibles
-                    if export_options['centros_no_compatibles']:
-                        self.export_non_compatible_centers_sheet(writer)
-
-                    # Ajustar formato final
-                    self.update_loading_message(self.loading_window, "Aplicando formato final...")
-                    self.format_pivot_tables(writer.book)
-
-                    # Análisis de Variación
-                    if export_options['analisis_variacion']:
-                        self.add_variation_analysis_sheets(writer)
-
-                    # Consolidado
-                    if export_options['consolidado']:
-                        self.add_consolidated_sheet(writer)
-
-                    # Sheet1 (Datos originales)
-                    if export_options['sheet1']:
-                        self.add_initial_sheet(writer)
-
-                    # Agrupación Personalizada (usar la misma categoría)
-                    if export_options['agrupacion_personalizada']:
-                        if hasattr(self, 'custom_groups') and self.custom_groups:
-                            self.update_loading_message(self.loading_window, "Exportando agrupación personalizada...")
-                            
-                            # Ya no pedimos la categoría aquí, usamos la que ya tenemos
-                            self.add_custom_grouping_sheet(writer, self.custom_groups, category)
-                            
-                            if export_options['consolidado_personalizado']:
-                                self.update_loading_message(self.loading_window, 
-                                    "Generando consolidado de grupos personalizados...")
-                                self.add_custom_grouping_consolidated(writer, self.custom_groups, category)
-                            
-                            if export_options['agrupacion_personalizada_variacion']:
-                                self.update_loading_message(self.loading_window, 
-                                    "Exportando análisis de variación para grupos personalizados...")
-                                self._export_custom_variation_analysis(writer)
-                        else:
-                            messagebox.showwarning("Aviso", "No se ha realizado una agrupación personalizada.")
-
-                except Exception as e:
-                    print(f"Error durante la exportación: {str(e)}")
-                    raise
-
-            # Verificar y finalizar exportación
-            self._verify_and_finish_export(file_path, self.loading_window)
+            
+            custom_sheets = export_options['agrupacion_personalizada'] and bool(getattr(self, 'custom_groups', None))
+            if export_options['agrupacion_personalizada'] and not custom_sheets:
+                messagebox.showwarning("Aviso", "No se ha realizado una agrupación personalizada.")
+
+            def export_work(report):
+                # Hilo de trabajo: las hojas del análisis las escribe el motor; la
+                # agrupación personalizada (creada en la ventana) se agrega al final
+                exporter = ExcelExporter(self.engine, progress_callback=report, cancel_token=cancel_token)
+                return exporter.export(
+                    file_path,
+                    export_options,
+                    category,
+                    extra_sheets=(
+                        lambda writer: self._export_custom_grouping_sheets(
+                            writer, export_options, category, exporter.update_progress
+                        )
+                    ) if custom_sheets else None
+                )
+            
+            def on_progress(message):
+                if loading_window.winfo_exists():
+                    self.loading_message.set(message)
+            
+            def on_done(path):
+                del self.loading_window
+                # Verificar y finalizar exportación
+                self._verify_and_finish_export(path, loading_window)
+            
+            def on_error(error):
+                del self.loading_window
+                loading_window.destroy()
+                if isinstance(error, OperationCancelled):
+                    self.status_var.set("Exportación cancelada")
+                    return
+                messagebox.showerror("Error", f"Error al exportar el archivo: {str(error)}")
+            
+            self.run_in_worker(export_work, on_progress=on_progress, on_done=on_done, on_error=on_error)
                     
         except Exception as e:
             # Limpiar la referencia a loading_window
@@ -6601,114 +5444,35 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 delattr(self, 'loading_window')
             messagebox.showerror("Error", f"Error al exportar el archivo: {str(e)}")
 
-    def _add_region_distribution(self, worksheet, group, geo_data, row):
-        """Agregar distribución por región a la hoja del grupo."""
-        try:
-            row = self.create_title_row(worksheet, "Distribución por Región", row)
-            
-            # Obtener datos del grupo
-            group_geo_data = geo_data[geo_data['Centro'].isin(group['centers'])]
-            
-            # Análisis por distrito
-            district_headers = ["Distrito", "Región", "Cantidad", "Porcentaje", "Centros"]
-            row = self.add_table_headers(worksheet, district_headers, row)
-            
-            # Colores para distritos
-            district_colors = {
-                'COSTA': PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid'),
-                'INTERIOR': PatternFill(start_color='E8F5E9', end_color='E8F5E9', fill_type='solid')
-            }
-
-            # Procesar cada distrito
-            for district in group_geo_data['Distrito'].unique():
-                district_data = group_geo_data[group_geo_data['Distrito'] == district]
-                
-                for region in district_data['Region'].unique():
-                    region_data = district_data[district_data['Region'] == region]
-                    centers = region_data['Centro'].tolist()
-                    percentage = (len(centers) / len(group['centers'])) * 100
-                    
-                    row_data = [
-                        district,
-                        region,
-                        len(centers),
-                        f"{percentage:.1f}%",
-                        ", ".join(sorted(centers))
-                    ]
-                    
-                    for col, value in enumerate(row_data, 1):
-                        cell = worksheet.cell(row=row, column=col, value=value)
-                        cell.font = self.base_font
-                        cell.alignment = self.left_alignment if col == 5 else self.center_alignment
-                        cell.fill = district_colors.get(district, self.alternate_fill)
-                    row += 1
-                    
-            return row + 2
-
-        except Exception as e:
-            print(f"Error al agregar distribución por región: {str(e)}")
-            raise
-
-    def _add_modulation_analysis(self, worksheet, group, category, row):
-        """Agregar análisis de modulación a la hoja del grupo."""
-        try:
-            row = self.create_title_row(
-                worksheet,
-                "Análisis de Modulación",
-                row,
-                subtitle=f"Categoría: {category}"
-            )
-            
-            modulation_data = self.get_modulation_data(group['centers'], category)
-            if modulation_data:
-                headers = ["No. Módulos", "Cantidad de Centros", "Porcentaje", "Centros"]
-                row = self.add_table_headers(worksheet, headers, row)
-                
-                total_centers = sum(data['count'] for data in modulation_data.values())
-                
-                for num_modulos, data in modulation_data.items():
-                    percentage = (data['count'] / total_centers) * 100
-                    row_data = [
-                        num_modulos,
-                        data['count'],
-                        f"{percentage:.1f}%",
-                        ", ".join(sorted(data['centers']))
-                    ]
-                    
-                    for col, value in enumerate(row_data, 1):
-                        cell = worksheet.cell(row=row, column=col, value=value)
-                        cell.font = self.base_font
-                        cell.alignment = self.left_alignment if col == 4 else self.center_alignment
-                        
-                        # Colorear según el tipo de dato
-                        if num_modulos == "Datos vacíos":
-                            cell.fill = PatternFill(start_color='FEF3C7', end_color='FEF3C7', fill_type='solid')
-                        elif num_modulos == "No encontrados":
-                            cell.fill = self.warning_fill
-                    row += 1
-            else:
-                cell = worksheet.cell(
-                    row=row,
-                    column=1,
-                    value="No se encontraron datos de modulación para este grupo"
-                )
-                cell.font = self.base_font
-                cell.fill = self.warning_fill
-                row += 1
-
-            return row + 2
-
-        except Exception as e:
-            print(f"Error al agregar análisis de modulación: {str(e)}")
-            raise
+    def _export_custom_grouping_sheets(self, writer, export_options, category, report):
+        """
+        Agrega las hojas de la agrupación personalizada (usa la misma categoría).
+        
+        Se ejecuta en el hilo de exportación: informa el avance con report(mensaje),
+        que también se detiene si se canceló (ExcelExporter.update_progress).
+        """
+        report("Exportando agrupación personalizada...")
+        
+        # Ya no pedimos la categoría aquí, usamos la que ya tenemos
+        self.add_custom_grouping_sheet(writer, self.custom_groups, category)
+        
+        if export_options['consolidado_personalizado']:
+            report("Generando consolidado de grupos personalizados...")
+            self.add_custom_grouping_consolidated(writer, self.custom_groups, category)
+        
+        if export_options['agrupacion_personalizada_variacion']:
+            self._export_custom_variation_analysis(writer, report)
 
-    def _export_custom_variation_analysis(self, writer):
+    def _export_custom_variation_analysis(self, writer, report=None):
         """Exportar análisis de variación para grupos personalizados."""
+        if report is None:
+            def report(message):
+                self.update_loading_message(self.loading_window, message)
         try:
-            self.update_loading_message(self.loading_window, 
-                "Exportando análisis de variación para grupos personalizados...")
+            report("Exportando análisis de variación para grupos personalizados...")
             
             for i, group in enumerate(self.custom_groups, 1):
+                report(f"Análisis de variación: grupo {i}...")
                 try:
                     # Obtener nombre del grupo
                     group_name = self.get_group_name(group)
@@ -6719,84 +5483,19 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                         sheet_name = f'Var. Grupo {i}'
                     
                     # Exportar análisis de variación para este grupo
-                    self.add_variation_analysis_for_group(
-                        writer,
-                        group['centers'],
-                        sheet_name
-                    )
-                    
-                except Exception as e:
-                    print(f"Error al exportar variación del grupo {i}: {str(e)}")
-                    continue
-
-        except Exception as e:
-            print(f"Error al exportar análisis de variación personalizado: {str(e)}")
-            raise
-
-    def _adjust_group_sheet_dimensions(self, worksheet):
-        """Ajustar dimensiones de la hoja de grupo."""
-        try:
-            # Ajustar columnas
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = get_column_letter(column[0].column)
-                
-                for cell in column:
-                    try:
-                        if cell.value:
-                            max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        continue
-                
-                adjusted_width = (max_length + 2)
-                worksheet.column_dimensions[column_letter].width = min(adjusted_width, 100)
-
-            # Ajustar filas
-            for row in worksheet.rows:
-                max_height = 0
-                for cell in row:
-                    if cell.value:
-                        text_lines = str(cell.value).count('\n') + 1
-                        line_height = 15
-                        needed_height = text_lines * line_height
-                        max_height = max(max_height, needed_height)
-                
-                if max_height > 15:
-                    worksheet.row_dimensions[row[0].row].height = max_height
+                    self.add_variation_analysis_for_group(
+                        writer,
+                        group['centers'],
+                        sheet_name
+                    )
+                    
+                except Exception as e:
+                    print(f"Error al exportar variación del grupo {i}: {str(e)}")
+                    continue
 
         except Exception as e:
-            print(f"Error al ajustar dimensiones de la hoja: {str(e)}")
-
-    def _needs_basic_data(self, options):
-        """Verificar si se necesitan datos básicos."""
-        return any([
-            options['sheet1'],
-            options['analisis_variacion'],
-            options['consolidado']
-        ])
-
-    def _needs_final_groups(self, options):
-        """Verificar si se necesitan grupos finales."""
-        return any([
-            options['resumen'],
-            options['grupos_finales'],
-            options['analisis_grupos']
-        ])
-
-    def _needs_geo_data(self, options):
-        """Verificar si se necesitan datos geográficos."""
-        return options['analisis_grupos'] and options['distribucion_region']
-
-    def _needs_modulation_analysis(self, options):
-        """Verificar si se necesita análisis de modulación."""
-        return options['analisis_grupos'] and options['analisis_modulacion']
-
-    def _load_basic_data(self, options):
-        """Cargar datos básicos del archivo Excel."""
-        df = pd.read_excel(self.file_path_var.get())
-        if df.empty:
-            raise ValueError("El archivo Excel está vacío")
-        return df
+            print(f"Error al exportar análisis de variación personalizado: {str(e)}")
+            raise
 
     def export_custom_grouping(self, writer, options):
         """Exportar agrupación personalizada."""
@@ -7183,13 +5882,11 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         math_vars = ['X', 'Y', 'Z', 'α', 'β', 'γ', 'δ', 'ε', 'ζ', 'η', 'θ', 'ι', 'κ', 'λ', 'μ', 'ν', 'ξ', 'π', 'ρ', 'σ', 'τ', 'υ', 'φ', 'χ', 'ψ', 'ω']
         
         # Obtener los números de grupo
-        groups = list(self.identical_portfolios.keys())
         group_numbers = []
         for group in groups_list:
-            try:
-                group_numbers.append(str(groups.index(group) + 1))
-            except ValueError:
-                continue
+            group_number = self.engine.center_index.identical_group_number(group)
+            if group_number is not None:
+                group_numbers.append(str(group_number))
         
         # Asignar variable matemática basada en el índice del grupo
         if not hasattr(self, 'math_var_counter'):
@@ -7212,10 +5909,10 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         centers_plus_dict = {}
         for centers in groups_list:
             centers_str = str(centers)  # Convertir a string para usar como clave
-            plus_set = self.identical_portfolios[centers]
+            plus_set = self.engine.identical_portfolios[centers]
             centers_plus_dict[centers_str] = plus_set
         
-        max_missing, _, _ = self.calculate_plu_differences_multi(centers_plus_dict)
+        max_missing, _, _ = self.engine.calculate_plu_differences_multi(centers_plus_dict)
         
         # Estadísticas actualizadas
         stats_text = f"Max. PLUs dif: {max_missing}"
@@ -7365,12 +6062,12 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         
         # Calcular el máximo de PLUs diferentes
         centers_plus_dict = {
-            'grupo_existente': set(self.identical_portfolios[suggested_group])
+            'grupo_existente': self.engine.identical_portfolios[suggested_group]
         }
         for centro in unique_centers:
-            centers_plus_dict[centro] = set(self.unique_portfolios[centro])
+            centers_plus_dict[centro] = self.engine.unique_portfolios[centro]
         
-        max_missing, _, _ = self.calculate_plu_differences_multi(centers_plus_dict)
+        max_missing, _, _ = self.engine.calculate_plu_differences_multi(centers_plus_dict)
         
         # Estadísticas actualizadas
         stats_text = f"Grupo {group_number} • Max. PLUs dif: {max_missing}"
@@ -7736,9 +6433,9 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         # Calcular el máximo de PLUs diferentes
         centers_plus_dict = {}
         for center in centers:
-            centers_plus_dict[center] = set(self.unique_portfolios[center])
+            centers_plus_dict[center] = self.engine.unique_portfolios[center]
         
-        max_missing, _, _ = self.calculate_plu_differences_multi(centers_plus_dict)
+        max_missing, _, _ = self.engine.calculate_plu_differences_multi(centers_plus_dict)
         
         # Estadísticas actualizadas
         stats_text = f"Max. PLUs dif: {max_missing}"
@@ -7868,8 +6565,8 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                     tooltip_window = None
             
             # Calcular porcentajes (necesarios para tooltips)
-            with_rec = unique - len(self.non_compatible)
-            no_rec = len(self.non_compatible)
+            with_rec = unique - len(self.engine.non_compatible)
+            no_rec = len(self.engine.non_compatible)
             
             # Calcular ángulos para el gráfico principal
             unique_angle = (unique / total) * 360
@@ -8707,159 +7404,227 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         
         return group_frame
 
-    def calculate_total_different_plus(self, centers_list):
+    def preview_plu_limit(self, value):
         """
-        Calcula el total de PLUs diferentes en un grupo de centros.
-        Un PLU es diferente si está presente en algunos centros pero no en todos.
-        
-        Args:
-            centers_list: Conjunto de centros a analizar
-            
-        Returns:
-            tuple: (different_plus, all_plus)
-                - different_plus: Conjunto de PLUs que difieren entre centros
-                - all_plus: Conjunto de todos los PLUs del grupo
+        Movimiento del control de límite: recalcula la agrupación poco después
+        de que el control se detiene, sin leer el archivo ni reconstruir la vista.
         """
-        # Obtener PLUs de cada centro
-        centers_plus = {}
-        for center in centers_list:
-            if center in self.unique_portfolios:
-                centers_plus[center] = set(self.unique_portfolios[center])
-            else:
-                for centers, plus in self.identical_portfolios.items():
-                    if center in centers:
-                        centers_plus[center] = set(plus)
-                        break
-        
-        # Encontrar PLUs presentes en todos los centros y PLUs diferentes
-        if not centers_plus:
-            return set(), set()
-            
-        all_plus = set.union(*centers_plus.values())
-        common_plus = set.intersection(*centers_plus.values())
-        different_plus = all_plus - common_plus
-        
-        return different_plus, all_plus
+        self.limit_slider_var.set(int(round(float(value))))
+        if self._limit_preview_job is not None:
+            self.root.after_cancel(self._limit_preview_job)
+        self._limit_preview_job = self.root.after(
+            self.LIMIT_PREVIEW_DELAY_MS, self._update_limit_preview
+        )
 
-    def calculate_final_groups(self, plu_limit):
+    def _update_limit_preview(self):
         """
-        Calcula los grupos finales donde cada grupo puede tener máximo 10 PLUs diferentes en total.
-        Un PLU se considera diferente si está presente en algunos centros del grupo pero no en otros.
+        Muestra junto al control los másteres finales con el límite elegido.
         
-        Returns:
-            list: Lista de diccionarios con los grupos finales
+        La tarjeta de másteres finales conserva siempre el resultado del
+        análisis (el de las pestañas y la exportación); con otro límite el
+        texto es una vista previa de LimitSweep, que se calcula en un hilo de
+        trabajo (una a la vez; si el control se mueve mientras tanto, se
+        calcula de nuevo al terminar).
         """
-        assigned_centers = set()
-        final_groups = []
-
-        # FASE 1: Fusionar grupos existentes
-        groups = list(self.identical_portfolios.items())
-        n = len(groups)
-        used_groups = set()
+        self._limit_preview_job = None
+        plu_limit = self.limit_slider_var.get()
+        if plu_limit == self.engine.current_plu_limit:
+            self.limit_preview_var.set(self.limit_analysis_text)
+            return
+        if self._limit_preview_running:
+            self._limit_preview_pending = True
+            return
         
-        for i in range(n):
-            if i in used_groups:
-                continue
-                
-            current_group = {
-                'centers': set(groups[i][0]),
-                'plus': set(groups[i][1])
-            }
-            used_groups.add(i)
-            
-            # Intentar fusionar con otros grupos
-            changed = True
-            while changed:
-                changed = False
-                for j in range(n):
-                    if j in used_groups:
-                        continue
-                        
-                    # Probar fusión
-                    test_centers = current_group['centers'] | set(groups[j][0])
-                    diff_plus, _ = self.calculate_total_different_plus(test_centers)
-                    
-                    if len(diff_plus) <= plu_limit:
-                        # Fusionar grupos
-                        current_group['centers'] = test_centers
-                        current_group['plus'].update(groups[j][1])
-                        used_groups.add(j)
-                        changed = True
-            
-            # Añadir grupo a grupos finales
-            final_groups.append(current_group)
-            assigned_centers.update(current_group['centers'])
-        
-        # FASE 2: Intentar agregar centros únicos a grupos existentes
-        unassigned_centers = set(self.unique_portfolios.keys()) - assigned_centers
-        non_compatible = []
-        
-        for center in unassigned_centers:
-            assigned = False
-            
-            # Intentar agregar a cada grupo existente
-            for group in final_groups:
-                test_centers = group['centers'] | {center}
-                diff_plus, _ = self.calculate_total_different_plus(test_centers)
-                
-                if len(diff_plus) <= plu_limit: 
-                    group['centers'].add(center)
-                    group['plus'].update(self.unique_portfolios[center])
-                    assigned = True
-                    assigned_centers.add(center)
-                    break
-            
-            if not assigned:
-                non_compatible.append(center)
+        self._limit_preview_running = True
+        self.limit_preview_var.set(f"Calculando vista previa con {plu_limit}...")
+        sweep = self.engine.get_limit_sweep()
+        max_limit = int(self.limit_slider.cget("to"))
+        
+        def preview_work(report):
+            # Los pares se buscan una sola vez para todo el rango del control
+            sweep.prepare(max_limit)
+            return sweep.result(plu_limit)
+        
+        def finish(text):
+            self._limit_preview_running = False
+            # Solo se muestra si sigue siendo la vista del control y del análisis actuales
+            if (sweep is self.engine.limit_sweep and plu_limit == self.limit_slider_var.get()
+                    and plu_limit != self.engine.current_plu_limit):
+                self.limit_preview_var.set(text)
+            if self._limit_preview_pending or plu_limit != self.limit_slider_var.get():
+                self._limit_preview_pending = False
+                self._update_limit_preview()
+        
+        def on_done(result):
+            finish(
+                f"Vista previa: {result['final_masters']} másteres ({result['final_groups']} grupos, "
+                f"{result['non_compatible']} centros sin agrupar{self._limit_preview_note()}); "
+                f"análisis con {self.engine.current_plu_limit}"
+            )
         
-        # Formar nuevos grupos con centros no compatibles
-        remaining_centers = non_compatible.copy()
-        non_compatible = []
+        self.run_in_worker(
+            preview_work,
+            on_progress=lambda message: None,
+            on_done=on_done,
+            on_error=lambda error: finish(f"Error: {str(error)}")
+        )
+
+    def _limit_preview_note(self):
+        """Opciones del análisis que la vista previa de LimitSweep no aplica."""
+        return "".join(f", {note}" for note in self.engine.limit_sweep_notes())
+
+    def apply_plu_limit(self):
+        """Rehace el análisis con el límite del control (el archivo no se vuelve a leer)."""
+        self.analyze_portfolios(plu_limit=max(self.LIMIT_SLIDER_MIN, self.limit_slider_var.get()))
+
+    def _enable_limit_slider(self, plu_limit):
+        """Deja el control de límite en el límite analizado, con sus resultados."""
+        self.limit_slider_var.set(plu_limit)
+        limit_max = max(self.LIMIT_SLIDER_MAX, plu_limit)
+        self.limit_slider.configure(state="normal", to=limit_max,
+                                    number_of_steps=limit_max - self.LIMIT_SLIDER_MIN)
+        self.apply_limit_button.configure(state="normal")
+        self._update_limit_preview()
+
+    def run_limit_sweep(self):
+        """Pide el rango de límites, calcula la curva y la muestra en el Resumen."""
+        if not self.engine.identical_portfolios and not self.engine.unique_portfolios:
+            messagebox.showerror("Error", "Primero debe analizar un archivo")
+            return
         
-        while remaining_centers:
-            center = remaining_centers.pop(0)
-            current_group = {
-                'centers': {center},
-                'plus': set(self.unique_portfolios[center])
-            }
-            
-            # Intentar agregar otros centros restantes
-            for other_center in remaining_centers[:]:
-                test_centers = current_group['centers'] | {other_center}
-                diff_plus, _ = self.calculate_total_different_plus(test_centers)
-                
-                if len(diff_plus) <= plu_limit:
-                    current_group['centers'].add(other_center)
-                    current_group['plus'].update(self.unique_portfolios[other_center])
-                    remaining_centers.remove(other_center)
-            
-            if len(current_group['centers']) > 1:
-                final_groups.append(current_group)
-            else:
-                non_compatible.append(center)
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Curva por límite de PLUs")
+        dialog.grab_set()
         
-        # Actualizar lista de centros no compatibles
-        self.non_compatible = sorted(non_compatible)
+        window_width = 420
+        window_height = 220
+        x = (dialog.winfo_screenwidth() - window_width) // 2
+        y = (dialog.winfo_screenheight() - window_height) // 2
+        dialog.geometry(f"{window_width}x{window_height}+{x}+{y}")
         
-        # Ordenar grupos por tamaño
-        final_groups.sort(key=lambda x: len(x['centers']), reverse=True)
+        main_frame = ctk.CTkFrame(dialog, fg_color="white", corner_radius=10)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
-        # Imprimir estadísticas
-        print("\nDetalle de grupos finales:")
-        for i, group in enumerate(final_groups, 1):
-            diff_plus, all_plus = self.calculate_total_different_plus(group['centers'])
-            print(f"\nGrupo Final {i}:")
-            print(f"Centros ({len(group['centers'])}): {sorted(group['centers'])}")
-            print(f"PLUs diferentes ({len(diff_plus)}): {sorted(diff_plus)}")
-            print(f"Total PLUs en el grupo: {len(all_plus)}")
+        ctk.CTkLabel(
+            main_frame,
+            text="Rango de límites de PLUs diferentes",
+            font=("Segoe UI", 14, "bold"),
+            text_color="#1e293b"
+        ).pack(pady=(0, 15))
+        
+        range_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        range_frame.pack(fill=tk.X)
+        
+        range_vars = {}
+        for label, default in (("Desde", "5"), ("Hasta", "40"), ("Cada", "5")):
+            ctk.CTkLabel(range_frame, text=label, font=("Segoe UI", 12), text_color="#374151").pack(side=tk.LEFT, padx=(10, 5))
+            range_vars[label] = tk.StringVar(value=default)
+            ctk.CTkEntry(range_frame, textvariable=range_vars[label], width=60).pack(side=tk.LEFT)
+        
+        result = [None]
+        
+        def on_accept():
+            try:
+                start, stop, step = (int(range_vars[label].get()) for label in ("Desde", "Hasta", "Cada"))
+                if start < 0 or stop < start or step <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "Ingrese un rango válido de números enteros", parent=dialog)
+                return
+            result[0] = list(range(start, stop + 1, step))
+            dialog.destroy()
+        
+        button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        button_frame.pack(fill=tk.X, pady=(20, 0))
+        ctk.CTkButton(
+            button_frame,
+            text="Cancelar",
+            command=dialog.destroy,
+            fg_color="#f1f5f9",
+            hover_color="#e2e8f0",
+            text_color="#64748b",
+            width=100
+        ).pack(side=tk.RIGHT, padx=5)
+        ctk.CTkButton(button_frame, text="Calcular", command=on_accept, width=100).pack(side=tk.RIGHT, padx=5)
+        
+        dialog.wait_window()
+        if result[0] is None:
+            return
+        
+        # La búsqueda de pares y la agrupación de cada límite se hacen en un
+        # hilo de trabajo; el Resumen se reconstruye al terminar
+        cancel_token = CancellationToken()
+        loading_window = self.show_loading_spinner("Calculando curva por límite...", cancel_token)
+        limits = result[0]
+        
+        def on_done(results):
+            loading_window.destroy()
+            self.update_summary_tab()
+        
+        def on_error(error):
+            loading_window.destroy()
+            if isinstance(error, OperationCancelled):
+                self.status_var.set("Cálculo de la curva cancelado")
+                return
+            messagebox.showerror("Error", f"Error al calcular la curva: {str(error)}")
+        
+        self.run_in_worker(
+            lambda report: self.engine.compute_limit_sweep(limits, cancel_token),
+            on_progress=lambda message: None,
+            on_done=on_done,
+            on_error=on_error
+        )
+
+    def create_limit_sweep_section(self, parent):
+        """Sección del Resumen con la curva de másteres finales por límite."""
+        section_frame = ttk.Frame(parent, style="Card.TFrame")
+        
+        header_frame = ttk.Frame(section_frame, style="Card.TFrame")
+        header_frame.pack(fill=tk.X, pady=(10, 5))
+        
+        # La curva (LimitSweep) no aplica la partición geográfica ni la mejora
+        # local, así que en el límite analizado puede diferir de la tarjeta
+        notes = self.engine.limit_sweep_notes()
+        ttk.Label(
+            header_frame,
+            text="Másteres finales por límite de PLUs" + (f" ({', '.join(notes)})" if notes else ""),
+            font=('Segoe UI', 14, 'bold'),
+            foreground='#1F2937',
+            background='white'
+        ).pack(side=tk.LEFT, padx=10)
         
-        print(f"\nEstadísticas finales:")
-        print(f"Grupos idénticos originales: {len(self.identical_portfolios)}")
-        print(f"Grupos después de fusiones: {len(final_groups)}")
-        print(f"Centros sin agrupar: {len(self.non_compatible)}")
-        print(f"Total centros agrupados: {sum(len(g['centers']) for g in final_groups)}")
+        ctk.CTkButton(
+            header_frame,
+            text="Calcular curva",
+            width=150,
+            height=35,
+            command=self.run_limit_sweep,
+            fg_color="#2563eb",
+            hover_color="#1d4ed8"
+        ).pack(side=tk.RIGHT, padx=10)
+        
+        if not self.engine.limit_sweep_results:
+            return section_frame
+        
+        limits = [result['limit'] for result in self.engine.limit_sweep_results]
+        fig = Figure(figsize=(8, 3), dpi=100)
+        ax = fig.add_subplot(111)
+        ax.plot(limits, [result['final_masters'] for result in self.engine.limit_sweep_results],
+                marker='o', color='#2563eb', label='Másteres finales')
+        ax.plot(limits, [result['non_compatible'] for result in self.engine.limit_sweep_results],
+                marker='o', color='#EF4444', label='Centros sin agrupar')
+        ax.axvline(self.engine.current_plu_limit, color='#9CA3AF', linestyle='--', linewidth=1)
+        ax.set_xlabel('Límite de PLUs diferentes')
+        ax.set_xticks(limits)
+        ax.legend(frameon=False)
+        for spine in ('top', 'right'):
+            ax.spines[spine].set_visible(False)
+        fig.tight_layout(pad=0.5)
         
-        return final_groups
+        canvas = FigureCanvasTkAgg(fig, master=section_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        return section_frame
 
     def update_summary_tab(self):
         # Limpiar el grid existente
@@ -8867,18 +7632,18 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             widget.destroy()
         
         # Calcular grupos finales
-        final_groups = self.calculate_final_groups(self.current_plu_limit)
+        final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
         
         # Frame para estadísticas principales
         stats_frame = ttk.Frame(self.summary_grid, style="Card.TFrame")
         stats_frame.grid(row=0, column=0, columnspan=3, sticky='ew', padx=5, pady=5)
         
         # Calcular estadísticas
-        groups_orig = len(self.identical_portfolios)
+        groups_orig = len(self.engine.identical_portfolios)
         groups_final = len(final_groups)
         groups_reduction = groups_orig - groups_final
         total_centers = sum(len(group['centers']) for group in final_groups)
-        total_ungrouped = len(self.non_compatible)
+        total_ungrouped = len(self.engine.non_compatible)
         
         optimization_percentage = (groups_reduction / groups_orig * 100) if groups_orig > 0 else 0
         grouping_efficiency = (total_centers / (total_centers + total_ungrouped) * 100) if (total_centers + total_ungrouped) > 0 else 0
@@ -8911,15 +7676,19 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         )
         bar_canvas.grid(row=0, column=1, padx=10, pady=10, sticky='nsew')
         
+        # Curva de másteres finales por límite (debajo de los gráficos)
+        sweep_frame = self.create_limit_sweep_section(charts_frame)
+        sweep_frame.grid(row=1, column=0, columnspan=2, sticky='ew', padx=10, pady=(0, 10))
+        
         # Dibujar gráfico de embudo
         def draw_funnel():
             width = funnel_canvas.winfo_width()
             height = funnel_canvas.winfo_height()
             
             # Calcular los valores necesarios usando las nuevas métricas
-            masteres_iniciales = len(self.identical_portfolios) + len(self.unique_portfolios)
-            final_groups = self.calculate_final_groups(self.current_plu_limit)
-            masteres_finales = len(final_groups) + len(self.non_compatible)
+            masteres_iniciales = len(self.engine.identical_portfolios) + len(self.engine.unique_portfolios)
+            final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
+            masteres_finales = len(final_groups) + len(self.engine.non_compatible)
 
             # Validar para evitar división por cero
             if masteres_iniciales == 0:
@@ -9078,9 +7847,9 @@ class ModernPortfolioAnalyzerApp(BaseApp):
         ).pack(pady=(10,0))
 
         # Calcular los valores necesarios usando las nuevas métricas
-        masteres_iniciales = len(self.identical_portfolios) + len(self.unique_portfolios)
-        final_groups = self.calculate_final_groups(self.current_plu_limit)
-        masteres_finales = len(final_groups) + len(self.non_compatible)
+        masteres_iniciales = len(self.engine.identical_portfolios) + len(self.engine.unique_portfolios)
+        final_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
+        masteres_finales = len(final_groups) + len(self.engine.non_compatible)
         planogramas_reduction = masteres_iniciales - masteres_finales
 
         ttk.Label(
@@ -9164,7 +7933,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             last_row = row
 
         # Mostrar centros sin recomendación al final
-        if self.non_compatible:
+        if self.engine.non_compatible:
             separator = ttk.Frame(self.summary_grid, height=2, style="BlackSeparator.TFrame")
             separator.grid(row=last_row + 1, column=0, columnspan=3, sticky='ew', pady=15)
             
@@ -9177,11 +7946,11 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             )
             title_label.grid(row=last_row + 2, column=0, columnspan=3, sticky='w', padx=5, pady=(0, 15))
             
-            for i, centro in enumerate(sorted(self.non_compatible), 1):
+            for i, centro in enumerate(sorted(self.engine.non_compatible), 1):
                 center_frame = self.create_unique_center_frame(
                     self.summary_grid,
                     centro,
-                    self.unique_portfolios[centro],
+                    self.engine.unique_portfolios[centro],
                     non_compatible=True
                 )
                 row = last_row + 3 + ((i - 1) // 3)
@@ -9189,130 +7958,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 center_frame.grid(row=row, column=col, padx=5, pady=5, sticky='ew')
                 self.summary_grid.grid_rowconfigure(row, weight=1)
 
-    def optimize_groups_by_geography(self):
-        """
-        Optimiza los grupos pequeños y centros sin recomendación usando criterios geográficos.
-        """
-        try:
-            # Cargar datos geográficos
-            geo_data = self.load_geographic_data()
-            if geo_data is None:
-                raise ValueError("No se pudieron cargar los datos geográficos")
-
-            # Obtener grupos finales actuales
-            current_groups = self.calculate_final_groups(self.current_plu_limit)
-            
-            # Identificar grupos pequeños (menos de 10 centros)
-            small_groups = []
-            normal_groups = []
-            for group in current_groups:
-                if len(group['centers']) < 10:
-                    small_groups.append(group)
-                else:
-                    normal_groups.append(group)
-
-            # Recolectar todos los centros que necesitan reasignación
-            centers_to_assign = set()
-            for group in small_groups:
-                centers_to_assign.update(group['centers'])
-            centers_to_assign.update(self.non_compatible)
-
-            # Crear DataFrame con información geográfica solo para los centros relevantes
-            centers_geo = geo_data[geo_data['Centro'].isin(centers_to_assign)].copy()
-            
-            # Crear matriz de similitud geográfica
-            def calculate_geo_similarity(row1, row2):
-                """Calcula similitud geográfica entre dos centros."""
-                score = 0
-                if row1['Distrito'] == row2['Distrito']:
-                    score += 4  # Mayor peso al distrito
-                if row1['Region'] == row2['Region']:
-                    score += 3  # Peso medio-alto a la región
-                if row1['Departamento'] == row2['Departamento']:
-                    score += 2  # Peso medio al departamento
-                if row1['Estrato'] == row2['Estrato']:
-                    score += 1  # Peso menor al estrato
-                return score
-
-            # Crear grupos geográficos optimizados
-            new_groups = []
-            remaining_centers = set(centers_to_assign)
-
-            while remaining_centers:
-                # Tomar un centro como semilla
-                seed_center = remaining_centers.pop()
-                seed_data = centers_geo[centers_geo['Centro'] == seed_center].iloc[0]
-                
-                current_group = {seed_center}
-                
-                # Encontrar centros similares
-                best_matches = []
-                for center in remaining_centers:
-                    center_data = centers_geo[centers_geo['Centro'] == center].iloc[0]
-                    similarity = calculate_geo_similarity(seed_data, center_data)
-                    best_matches.append((center, similarity))
-                
-                # Ordenar por similitud
-                best_matches.sort(key=lambda x: x[1], reverse=True)
-                
-                # Agregar los mejores matches al grupo
-                for center, similarity in best_matches:
-                    if similarity >= 4:  # Mínimo distrito igual
-                        current_group.add(center)
-                        remaining_centers.discard(center)
-                        
-                        # Limitar tamaño del grupo
-                        if len(current_group) >= 20:  # Tamaño máximo razonable
-                            break
-                
-                # Agregar el nuevo grupo
-                if len(current_group) >= 3:  # Mínimo 3 centros por grupo
-                    new_groups.append({
-                        'centers': current_group,
-                        'criteria': {
-                            'Distrito': seed_data['Distrito'],
-                            'Region': seed_data['Region'],
-                            'Departamento': seed_data['Departamento'],
-                            'Estrato': seed_data['Estrato']
-                        }
-                    })
-                else:
-                    # Si el grupo es muy pequeño, intentar unirlo a un grupo existente
-                    best_group = None
-                    best_similarity = -1
-                    
-                    for group in new_groups:
-                        group_center = next(iter(group['centers']))
-                        group_data = centers_geo[centers_geo['Centro'] == group_center].iloc[0]
-                        similarity = calculate_geo_similarity(seed_data, group_data)
-                        
-                        if similarity > best_similarity:
-                            best_similarity = similarity
-                            best_group = group
-                    
-                    if best_group and best_similarity >= 3:
-                        best_group['centers'].update(current_group)
-                    else:
-                        # Si no se puede unir, crear grupo nuevo
-                        new_groups.append({
-                            'centers': current_group,
-                            'criteria': {
-                                'Distrito': seed_data['Distrito'],
-                                'Region': seed_data['Region'],
-                                'Departamento': seed_data['Departamento'],
-                                'Estrato': seed_data['Estrato']
-                            }
-                        })
-
-            # Combinar grupos normales con nuevos grupos
-            final_optimized_groups = normal_groups + new_groups
-            
-            return final_optimized_groups
-            
-        except Exception as e:
-            print(f"Error en optimize_groups_by_geography: {str(e)}")
-            return None
-
     def update_summary_ii_tab(self):
         """
         Actualiza la pestaña de Resumen II con los grupos optimizados geográficamente.
@@ -9328,7 +7973,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 return
 
             # Obtener grupos actuales
-            current_groups = self.calculate_final_groups(self.current_plu_limit)
+            current_groups = self.engine.calculate_final_groups(self.engine.current_plu_limit)
             
             # Identificar grupos pequeños y normales
             small_groups = []
@@ -9354,7 +7999,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 total_small_groups,  # Grupos pequeños originales
                 len(normal_groups),  # Grupos normales
                 total_small_centers,  # Centros en grupos pequeños
-                len(self.non_compatible)  # Centros sin recomendación
+                len(self.engine.non_compatible)  # Centros sin recomendación
             )
             
             # Separador
@@ -9375,7 +8020,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             row_counter = 3
             for i, group in enumerate(normal_groups, 1):
                 # Obtener información geográfica del grupo
-                geo_info = self.get_group_geo_info(group['centers'], geo_data)
+                geo_info = self.engine.get_group_geo_info(group['centers'], geo_data)
                 
                 group_frame = self.create_geo_group_frame(
                     self.summary_ii_grid,
@@ -9405,13 +8050,13 @@ class ModernPortfolioAnalyzerApp(BaseApp):
 
             # Procesar grupos pequeños y centros no compatibles
             centers_to_process = {center for group in small_groups for center in group['centers']}
-            centers_to_process.update(self.non_compatible)
+            centers_to_process.update(self.engine.non_compatible)
             
             # Obtener datos geográficos solo para los centros relevantes
             relevant_geo_data = geo_data[geo_data['Centro'].isin(centers_to_process)]
             
             # Agrupar por criterios geográficos
-            geo_groups = self.group_by_geography(centers_to_process, relevant_geo_data)
+            geo_groups = self.engine.group_by_geography(centers_to_process, relevant_geo_data)
             
             # Mostrar grupos optimizados
             for i, group in enumerate(geo_groups, 1):
@@ -9430,66 +8075,6 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             print(f"Error en update_summary_ii_tab: {str(e)}")
             messagebox.showerror("Error", f"Error al actualizar Resumen II: {str(e)}")
 
-    def group_by_geography(self, centers, geo_data):
-        """
-        Agrupa centros basándose en criterios geográficos estrictos.
-        """
-        groups = []
-        remaining_centers = set(centers)
-        
-        while remaining_centers:
-            # Tomar un centro como semilla
-            seed_center = remaining_centers.pop()
-            seed_data = geo_data[geo_data['Centro'] == seed_center].iloc[0]
-            
-            current_group = {seed_center}
-            current_criteria = {
-                'Distrito': seed_data['Distrito'],
-                'Region': seed_data['Region'],
-                'Departamento': seed_data.get('Departamento', '-')
-            }
-            
-            # Encontrar centros que coincidan exactamente en los criterios
-            for center in list(remaining_centers):
-                center_data = geo_data[geo_data['Centro'] == center].iloc[0]
-                
-                # Verificar coincidencia exacta en los tres criterios principales
-                if (center_data['Distrito'] == current_criteria['Distrito'] and
-                    center_data['Region'] == current_criteria['Region'] and
-                    center_data.get('Departamento', '-') == current_criteria['Departamento']):
-                    current_group.add(center)
-                    remaining_centers.discard(center)
-            
-            # Agregar el grupo independientemente de su tamaño
-            groups.append({
-                'centers': current_group,
-                'criteria': current_criteria
-            })
-        
-        return groups
-
-    def get_group_geo_info(self, centers, geo_data):
-        """
-        Obtiene todos los valores únicos de información geográfica del grupo.
-        """
-        centers_data = geo_data[geo_data['Centro'].isin(centers)]
-        if centers_data.empty:
-            return None
-        
-        # Obtener valores únicos para cada criterio
-        distrito = sorted(centers_data['Distrito'].unique())
-        region = sorted(centers_data['Region'].unique())
-        departamento = sorted(centers_data['Departamento'].unique()) if 'Departamento' in centers_data else ['-']
-        estrato = sorted(centers_data['Estrato'].unique()) if 'Estrato' in centers_data else ['-']
-        
-        # Formatear los valores para mostrarlos
-        return {
-            'Distrito': ' - '.join(distrito),
-            'Region': ' - '.join(region),
-            'Departamento': ' - '.join(departamento),
-            'Estrato': ' - '.join(str(e) for e in estrato)
-        }
-
     def create_stat_cards_summary_ii(self, parent, orig_small_groups, normal_groups, 
                                 small_centers, unrec_centers):
         """
@@ -9841,330 +8426,60 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             self.file_path_var.set(filename)
             self.status_var.set("Archivo seleccionado - Listo para analizar")
             
-    def find_identical_and_unique_portfolios(self, file_path):
-        try:
-            # Leer el archivo Excel
-            df = pd.read_excel(file_path, sheet_name='Sheet1')
-            
-            # Validar columnas requeridas
-            try:
-                columns = self.column_validator.validate_required_columns(
-                    df, ['CENTRO', 'PLU_SAP']
-                )
-                centro_col = columns['CENTRO']
-                plu_col = columns['PLU_SAP']
-            except ValueError as e:
-                raise Exception(f"Error en la validación de columnas: {str(e)}")
-                
-            # Verificar si hay datos
-            if df.empty:
-                raise Exception("El archivo Excel está vacío")
-            
-            # Verificar valores nulos
-            null_counts = df[[centro_col, plu_col]].isnull().sum()
-            if null_counts.any():
-                null_info = "\n".join([
-                    f"{col}: {count} valores nulos" 
-                    for col, count in null_counts.items() 
-                    if count > 0
-                ])
-                raise Exception(f"Se encontraron valores nulos en:\n{null_info}")
-            
-            # Limpiar y procesar datos
-            df[centro_col] = df[centro_col].astype(str).str.strip()
-            df[plu_col] = df[plu_col].astype(str).str.strip()
-            
-            # Procesar los datos y convertir explícitamente a sets
-            centro_portfolios = df.groupby(centro_col)[plu_col].apply(set).reset_index()
-                
-            portfolio_dict = {}
-            for idx, row in centro_portfolios.iterrows():
-                portfolio = tuple(sorted(row[plu_col]))
-                centro = str(row[centro_col])
-                if portfolio in portfolio_dict:
-                    portfolio_dict[portfolio].append(centro)
-                else:
-                    portfolio_dict[portfolio] = [centro]
-            
-            # Separar portafolios idénticos y únicos, manteniendo los PLUs como sets
-            identical_portfolios = {
-                tuple(sorted(centros)): set(portfolio)  # Convertir explícitamente a set
-                for portfolio, centros in portfolio_dict.items() 
-                if len(centros) > 1
-            }
-            
-            unique_portfolios = {
-                centros[0]: set(portfolio)  # Convertir explícitamente a set
-                for portfolio, centros in portfolio_dict.items() 
-                if len(centros) == 1
-            }
-            
-            return identical_portfolios, unique_portfolios
-            
-        except Exception as e:
-            raise Exception(f"Error al procesar el archivo Excel: {str(e)}")
-
-    def calculate_plu_differences_multi(self, centers_plus_dict):
+    def run_in_worker(self, work, on_progress, on_done, on_error):
         """
-        Calcula la diferencia simétrica de PLUs entre múltiples centros.
+        Ejecuta work en un hilo de trabajo y atiende sus eventos en el hilo principal.
         
-        Args:
-            centers_plus_dict: Diccionario donde las claves son los centros y los valores son sus conjuntos de PLUs
-            
-        Returns:
-            tuple: (symmetric_diff_size, center_ref, all_differences)
-                - symmetric_diff_size: Tamaño de la diferencia simétrica
-                - center_ref: Centro de referencia (primer centro)
-                - all_differences: Conjunto de todos los PLUs diferentes entre los centros
+        work(report) no debe tocar widgets: informa su avance con report(mensaje),
+        que solo deja el mensaje en una cola. La interfaz revisa la cola con
+        root.after y llama a on_progress(mensaje), on_done(resultado) u
+        on_error(excepción), que sí pueden construir widgets.
         """
-        if len(centers_plus_dict) < 2:
-            return 0, None, set()
-        
-        # Tomar el primer conjunto como referencia
-        center_ref, base_plus = next(iter(centers_plus_dict.items()))
-        all_differences = set()
+        events = queue.Queue()
         
-        # Calcular diferencia simétrica acumulativa
-        for center, plus_set in centers_plus_dict.items():
-            if center != center_ref:
-                diff = base_plus.symmetric_difference(plus_set)
-                all_differences.update(diff)
+        def target():
+            try:
+                result = work(lambda message: events.put(('progress', message)))
+            except Exception as e:
+                events.put(('error', e))
+            else:
+                events.put(('done', result))
         
-        return len(all_differences), center_ref, all_differences
-
-    def analyze_group_mergers(self, plu_limit):
-        """
-        Encuentra fusiones de grupos usando un enfoque voraz optimizado.
-        Solo usa diferencias simétricas de 10 PLUs como límite.
-        """
-        group_recommendations = []
-        groups = list(self.identical_portfolios.items())
-        n = len(groups)
-        used_groups = set()
-
-        # Precalcular y almacenar solo las mejores conexiones para cada grupo
-        group_connections = {i: [] for i in range(n)}
-        
-        # Calcular diferencias simétricas solo una vez
-        for i in range(n):
-            for j in range(i + 1, n):
-                diff = groups[i][1].symmetric_difference(groups[j][1])
-                if len(diff) <= plu_limit: 
-                    group_connections[i].append((j, diff))
-                    group_connections[j].append((i, diff))
-        
-        def build_group_from_seed(seed_idx):
-            """Construye un grupo comenzando desde un grupo semilla."""
-            if seed_idx in used_groups:
-                return None
-                
-            current_group = {seed_idx}
-            group_plus = set(groups[seed_idx][1])
-            current_differences = set()
-            
-            # Conjunto de grupos candidatos conectados al grupo actual
-            candidates = set(idx for idx, _ in group_connections[seed_idx])
-            
-            while candidates:
-                best_addition = None
-                min_new_diffs = float('inf')
-                best_total_diffs = None
-                
-                # Probar cada candidato
-                for candidate in candidates:
-                    if candidate in used_groups:
-                        continue
-                    
-                    # Calcular nuevas diferencias al agregar este candidato
-                    test_diffs = current_differences.copy()
-                    for member in current_group:
-                        for connected_idx, diff in group_connections[member]:
-                            if connected_idx == candidate:
-                                test_diffs.update(diff)
-                    
-                    if len(test_diffs) <= plu_limit and len(test_diffs) < min_new_diffs:  # Cambiado a 10 PLUs
-                        min_new_diffs = len(test_diffs)
-                        best_addition = candidate
-                        best_total_diffs = test_diffs
-                
-                if best_addition is None:
-                    break
-                    
-                # Agregar el mejor candidato al grupo
-                current_group.add(best_addition)
-                current_differences = best_total_diffs
-                
-                # Actualizar candidatos con nuevas conexiones
-                new_candidates = set(idx for idx, _ in group_connections[best_addition])
-                candidates = (candidates | new_candidates) - current_group - used_groups
-            
-            if len(current_group) > 1:
-                return {
-                    'groups': [groups[idx][0] for idx in current_group],
-                    'differences': current_differences,
-                    'indices': current_group
-                }
-            return None
-
-        # Procesar grupos en orden de más conexiones a menos
-        group_order = sorted(
-            range(n), 
-            key=lambda x: len(group_connections[x]), 
-            reverse=True
-        )
-        
-        # Construir grupos
-        for seed_idx in group_order:
-            result = build_group_from_seed(seed_idx)
-            if result:
-                group_recommendations.append({
-                    'Groups': result['groups'],
-                    'PLU_Differences': sorted(list(result['differences']))
-                })
-                used_groups.update(result['indices'])
-                
-                # Verificar si ya procesamos todos los grupos
-                if len(used_groups) == n:
-                    break
+        threading.Thread(target=target, daemon=True).start()
+        self._poll_worker_events(events, on_progress, on_done, on_error)
 
-        return group_recommendations
-
-    def analyze_unique_portfolios(self, identical_portfolios, unique_portfolios, plu_limit):
-        """
-        Analiza los portafolios únicos con enfoque optimizado.
-        Usa límite de 10 PLUs para diferencias simétricas.
-        """
-        recommendations = []
-        non_compatible = []
-        assigned_centers = set()
-        unique_groups = []
-        
-        # Convertir grupos existentes a formato manejable
-        existing_groups = []
-        for idx, (centers, plu_set) in enumerate(identical_portfolios.items()):
-            existing_groups.append({
-                'centers': set(centers),
-                'plus': set(plu_set),
-                'group_number': idx + 1
-            })
-        
-        # Pre-calcular diferencias para centros únicos
-        center_differences = {}
-        for center in unique_portfolios:
-            center_plus = set(unique_portfolios[center])
-            best_diff = float('inf')
-            best_group = None
-            best_differences = None
-            
-            for group in existing_groups:
-                diff = center_plus.symmetric_difference(group['plus'])
-                if len(diff) <= plu_limit and len(diff) < best_diff:  # Cambiado a 10 PLUs
-                    best_diff = len(diff)
-                    best_group = group
-                    best_differences = diff
-            
-            if best_group:
-                center_differences[center] = {
-                    'group': best_group,
-                    'differences': best_differences,
-                    'diff_size': len(best_differences)
-                }
-        
-        # Asignar centros a grupos existentes basado en las mejores diferencias
-        for center, data in sorted(
-            center_differences.items(), 
-            key=lambda x: x[1]['diff_size']
-        ):
-            if center not in assigned_centers:
-                recommendations.append({
-                    'Centro Único': center,
-                    'Grupo Sugerido': tuple(sorted(data['group']['centers'])),
-                    'Grupo Número': data['group']['group_number'],
-                    'PLU Diferentes': sorted(list(data['differences']))
-                })
-                assigned_centers.add(center)
-        
-        # Procesar centros restantes para nuevos grupos
-        remaining_centers = set(unique_portfolios.keys()) - assigned_centers
-        
-        # Pre-calcular diferencias entre centros restantes
-        remaining_connections = {}
-        for center1 in remaining_centers:
-            plus1 = set(unique_portfolios[center1])
-            remaining_connections[center1] = []
-            
-            for center2 in remaining_centers:
-                if center1 != center2:
-                    diff = plus1.symmetric_difference(unique_portfolios[center2])
-                    if len(diff) <= plu_limit:  # Cambiado a 10 PLUs
-                        remaining_connections[center1].append((center2, diff))
-        
-        # Construir nuevos grupos usando enfoque voraz
-        while remaining_centers:
-            # Seleccionar centro con más conexiones como semilla
-            seed_center = max(
-                remaining_centers,
-                key=lambda x: len(remaining_connections.get(x, []))
-            )
-            
-            current_group = {seed_center}
-            current_differences = set()
-            candidates = set(c for c, _ in remaining_connections.get(seed_center, []))
-            
-            while candidates:
-                best_addition = None
-                min_new_diffs = float('inf')
-                best_total_diffs = None
-                
-                for candidate in candidates:
-                    if candidate not in remaining_centers:
-                        continue
-                    
-                    # Calcular nuevas diferencias
-                    test_diffs = current_differences.copy()
-                    seed_plus = set(unique_portfolios[seed_center])
-                    candidate_plus = set(unique_portfolios[candidate])
-                    new_diff = seed_plus.symmetric_difference(candidate_plus)
-                    test_diffs.update(new_diff)
-                    
-                    if len(test_diffs) <= plu_limit and len(test_diffs) < min_new_diffs:  # Cambiado a 10 PLUs
-                        min_new_diffs = len(test_diffs)
-                        best_addition = candidate
-                        best_total_diffs = test_diffs
-                
-                if best_addition is None:
-                    break
-                    
-                current_group.add(best_addition)
-                current_differences = best_total_diffs
-                candidates = set(c for c, _ in remaining_connections.get(best_addition, [])) - current_group
-            
-            # Procesar el grupo formado
-            if len(current_group) > 1:
-                unique_groups.append({
-                    'Centros': sorted(list(current_group)),
-                    'PLU Diferentes': sorted(list(current_differences))
-                })
+    def _poll_worker_events(self, events, on_progress, on_done, on_error):
+        """Procesa los eventos pendientes del hilo y vuelve a revisar la cola más tarde."""
+        while True:
+            try:
+                kind, value = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                on_progress(value)
+            elif kind == 'done':
+                on_done(value)
+                return
             else:
-                non_compatible.extend(current_group)
-                
-            # Remover centros procesados
-            remaining_centers -= current_group
-        
-        return recommendations, sorted(non_compatible), unique_groups
+                on_error(value)
+                return
+        self.root.after(self.WORKER_POLL_MS, self._poll_worker_events, events, on_progress, on_done, on_error)
 
-    def analyze_portfolios(self):
+    def analyze_portfolios(self, plu_limit=None):
         file_path = self.file_path_var.get()
         if not file_path:
             messagebox.showerror("Error", "Por favor seleccione un archivo Excel")
             return
         
-        # Obtener el límite de PLUs diferentes
-        plu_limit = self.get_plu_limit()
+        # Opciones antes del diálogo, para que un análisis cancelado deje las
+        # mismas opciones con las que se calcularon los resultados mostrados
+        previous_options = {name: getattr(self.engine, name) for name in self.ANALYSIS_OPTIONS}
+        
+        # Obtener el límite de PLUs diferentes (salvo que venga del control de límite)
+        if plu_limit is None:
+            plu_limit = self.get_plu_limit()
         if plu_limit is None:  # Usuario canceló
             return
-            
-        self.current_plu_limit = plu_limit
 
         try:
             # Crear y mostrar el spinner
@@ -10245,10 +8560,76 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             self.root.update_idletasks()
             self.root.update()
             
-            # Limpiar grupos existentes
-            status_label.config(text="Preparando análisis...")
+            # Botón para cancelar: el hilo revisa el token entre pasos y, al
+            # cancelar, se restauran los resultados del análisis anterior
+            cancel_token = CancellationToken()
+            
+            def cancel_analysis():
+                cancel_token.cancel()
+                cancel_button.configure(state='disabled')
+                status_label.config(text="Cancelando...")
+            
+            cancel_button = ttk.Button(loading_frame, text="Cancelar", command=cancel_analysis)
+            cancel_button.pack(pady=(0, 10))
+            loading_window.geometry(f"{window_width}x{window_height + 40}+{x}+{y}")
+            
+            # Estado del motor antes del análisis, para restaurarlo si se cancela
+            previous_state = {
+                name: getattr(self.engine, name)
+                for name in (
+                    'file_path', 'dataset', 'identical_portfolios', 'unique_portfolios', 'center_index',
+                    'analysis_fingerprint', 'limit_sweep_results', 'recommendations', 'non_compatible',
+                    'current_plu_limit'
+                )
+            }
+            previous_state['pair_search_stats'] = dict(self.engine.pair_search_stats)
+            previous_state.update(previous_options)
+            
+            # Realizar el análisis
+            status_label.config(text="Analizando portafolios...")
             loading_window.update()
             
+            def analysis_work(report):
+                # Hilo de trabajo: lectura del archivo y todas las etapas de agrupación
+                return self.engine.analyze(file_path, plu_limit, report=report, cancel_token=cancel_token)
+            
+            def on_error(error):
+                loading_window.destroy()
+                # Los resultados mostrados siguen siendo los del análisis anterior
+                for name, value in previous_state.items():
+                    setattr(self.engine, name, value)
+                if isinstance(error, OperationCancelled):
+                    self.status_var.set("Análisis cancelado")
+                    return
+                self.status_var.set("Error en el análisis")
+                messagebox.showerror("Error", str(error))
+            
+            # La ventana de carga bloquea la ventana principal mientras trabaja el hilo
+            loading_window.grab_set()
+            self.run_in_worker(
+                analysis_work,
+                on_progress=lambda message: status_label.config(text=message),
+                on_done=lambda results: self._show_analysis_results(
+                    results, plu_limit, status_label, loading_window
+                ),
+                on_error=on_error
+            )
+                
+        except Exception as e:
+            if 'loading_window' in locals():
+                loading_window.destroy()
+            for name, value in previous_options.items():
+                setattr(self.engine, name, value)
+            self.status_var.set("Error en el análisis")
+            messagebox.showerror("Error", str(e))
+
+    def _show_analysis_results(self, results, plu_limit, status_label, loading_window):
+        """
+        Construye la vista con los resultados del hilo de análisis (en el hilo principal).
+        """
+        try:
+            # Limpiar grupos existentes (solo ahora, para que un análisis
+            # cancelado deje a la vista los resultados anteriores)
             for widget in self.groups_grid.winfo_children():
                 widget.destroy()
             for widget in self.unique_grid.winfo_children():
@@ -10261,49 +8642,29 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             # Resetear el contador de letras
             self.letter_counter = 0
             
-            # Realizar el análisis
-            status_label.config(text="Analizando portafolios...")
-            loading_window.update()
-            
-            self.identical_portfolios, self.unique_portfolios = self.find_identical_and_unique_portfolios(file_path)
-            
-            # Obtener recomendaciones
-            status_label.config(text="Generando recomendaciones...")
-            loading_window.update()
-            
-            # Pasar el límite a los métodos que lo necesitan
-            self.recommendations, self.non_compatible, unique_groups = self.analyze_unique_portfolios(
-                self.identical_portfolios,
-                self.unique_portfolios,
-                plu_limit
+            # El motor ya guardó los portafolios, las recomendaciones y los
+            # centros no compatibles de los grupos finales
+            merges = results['merges']
+            unique_groups = merges['unique_groups']
+            group_recommendations = merges['group_recommendations']
+            
+            # Convertir no compatibles (de las recomendaciones) a set
+            self.non_compatible_set = set(merges['non_compatible'])
+            
+            report_data = results['report_data']
+            unique_count = report_data['unique_count']
+            identical_count = report_data['identical_count']
+            initial_masters = report_data['initial_masters']
+            final_masters = report_data['final_masters']
+            final_groups = results['final_groups']
+            self.limit_analysis_text = (
+                f"{len(final_groups['groups'])} grupos, {len(final_groups['non_compatible'])} centros sin agrupar"
             )
             
-            # Obtener recomendaciones de fusión
-            status_label.config(text="Analizando fusiones posibles...")
-            loading_window.update()
-            
-            group_recommendations = self.analyze_group_mergers(plu_limit)
-            
-            # Convertir no compatibles a set
-            self.non_compatible_set = set(self.non_compatible)
-            
-            # Calcular estadísticas
-            status_label.config(text="Calculando estadísticas...")
-            loading_window.update()
-            
-            unique_count = len(self.unique_portfolios)
-            identical_count = sum(len(centers) for centers in self.identical_portfolios.keys())
-            initial_masters = len(self.identical_portfolios) + unique_count
-            final_groups = self.calculate_final_groups(plu_limit)
-            if not final_groups and not self.non_compatible:
-                # Si no hay grupos finales ni centros no compatibles, crear un grupo vacío
-                final_groups = [{'centers': set(), 'plus': set()}] 
-            final_masters = len(final_groups) + len(self.non_compatible)
-
             # Usa animate_stat para cada estadística
             self.animate_stat(self.total_centers, identical_count + unique_count)
             self.animate_stat(self.unique_centers, unique_count)
-            self.animate_stat(self.identical_groups, len(self.identical_portfolios))
+            self.animate_stat(self.identical_groups, len(self.engine.identical_portfolios))
             self.animate_stat(self.initial_masters, initial_masters)
             self.animate_stat(self.final_masters, final_masters)
             
@@ -10315,7 +8676,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             self.distribution_chart(unique_count, identical_count)
             self.total_centers.set(str(identical_count + unique_count))
             self.unique_centers.set(str(unique_count))
-            self.identical_groups.set(str(len(self.identical_portfolios)))
+            self.identical_groups.set(str(len(self.engine.identical_portfolios)))
             self.initial_masters.set(str(initial_masters))
             self.final_masters.set(str(final_masters))
             
@@ -10325,12 +8686,12 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             
             # Mostrar portafolios idénticos
             batch_size = 10
-            for i, (centros, productos) in enumerate(self.identical_portfolios.items(), 1):
+            for i, (centros, productos) in enumerate(self.engine.identical_portfolios.items(), 1):
                 if i % batch_size == 0:
-                    status_label.config(text=f"Procesando grupo {i} de {len(self.identical_portfolios)}...")
+                    status_label.config(text=f"Procesando grupo {i} de {len(self.engine.identical_portfolios)}...")
                     loading_window.update()
                     self.root.update_idletasks()
-                
+            
                 group_frame = self.create_group_frame(
                     parent=self.groups_grid,
                     group_num=i,
@@ -10345,13 +8706,13 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 self.groups_grid.grid_rowconfigure(row, weight=1)
             
             # Mostrar portafolios únicos
-            for i, (centro, plu_list) in enumerate(self.unique_portfolios.items(), 1):
+            for i, (centro, plu_list) in enumerate(self.engine.unique_portfolios.items(), 1):
                 if i % batch_size == 0:
-                    status_label.config(text=f"Procesando centro único {i} de {len(self.unique_portfolios)}...")
+                    status_label.config(text=f"Procesando centro único {i} de {len(self.engine.unique_portfolios)}...")
                     loading_window.update()
                     self.root.update_idletasks()
-                
-                is_non_compatible = centro in self.non_compatible
+            
+                is_non_compatible = centro in self.engine.non_compatible
                 center_frame = self.create_unique_center_frame(
                     self.unique_grid,
                     centro,
@@ -10365,7 +8726,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             
             # Agrupar recomendaciones por grupo sugerido
             grouped_recommendations = {}
-            for rec in self.recommendations:
+            for rec in self.engine.recommendations:
                 group_key = (rec['Grupo Número'], tuple(sorted(rec['Grupo Sugerido'])))
                 if group_key not in grouped_recommendations:
                     grouped_recommendations[group_key] = {
@@ -10387,7 +8748,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                     single_center_recs.append((group_number, group_centers, data))
             
             # Obtener el último número de grupo de portafolios idénticos
-            last_group_number = len(self.identical_portfolios)
+            last_group_number = len(self.engine.identical_portfolios)
             
             # Posibles grupos (PG X)
             possible_groups = [(i, group) for i, group in enumerate(unique_groups, last_group_number + 1)]
@@ -10410,7 +8771,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 )
                 rec_frame.grid(row=row, column=col, padx=5, pady=5, sticky='ew')
                 self.recommendations_grid.grid_rowconfigure(row, weight=1)
-                
+            
                 col += 1
                 if col == 3:
                     col = 0
@@ -10427,7 +8788,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 )
                 rec_frame.grid(row=row, column=col, padx=5, pady=5, sticky='ew')
                 self.recommendations_grid.grid_rowconfigure(row, weight=1)
-                
+            
                 col += 1
                 if col == 3:
                     col = 0
@@ -10443,7 +8804,7 @@ class ModernPortfolioAnalyzerApp(BaseApp):
                 )
                 rec_frame.grid(row=row, column=col, padx=5, pady=5, sticky='ew')
                 self.recommendations_grid.grid_rowconfigure(row, weight=1)
-                
+            
                 col += 1
                 if col == 3:
                     col = 0
@@ -10473,6 +8834,9 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             # Habilitar botón de reportes
             self.report_button.configure(state="normal")
             
+            # Habilitar el control de límite en vivo
+            self._enable_limit_slider(plu_limit)
+            
             # Actualizar estado final
             self.status_var.set("Análisis completado")
             
@@ -10481,11 +8845,11 @@ class ModernPortfolioAnalyzerApp(BaseApp):
             self.add_custom_grouping_tab()
                 
         except Exception as e:
-            if 'loading_window' in locals():
-                loading_window.destroy()
+            loading_window.destroy()
             self.status_var.set("Error en el análisis")
             messagebox.showerror("Error", str(e))
 
+
 def main():
     root = tk.Tk()
     app = ModernPortfolioAnalyzerApp(root)
@@ -0,0 +1,810 @@
+# src/pair_search.py
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from lazy_loader import LazyLoader
+from shared_arrays import SharedArrays, attach
+
+np = LazyLoader('numpy')
+sparse = LazyLoader('scipy.sparse')
+
+
+class ClosePairs:
+    """
+    Pares de portafolios cuya diferencia simétrica no supera el límite.
+
+    left y right son posiciones en las listas de portafolios de la búsqueda
+    (en una búsqueda dentro de una sola lista, left < right). Los pares están
+    ordenados por (left, right).
+    """
+
+    def __init__(self, left, right, distances, stats):
+        self.left = left
+        self.right = right
+        self.distances = distances
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.left)
+
+    def __iter__(self):
+        return zip(self.left.tolist(), self.right.tolist(), self.distances.tolist())
+
+
+class PairSearch:
+    """
+    Búsqueda de pares de portafolios a distancia menor o igual a plu_limit.
+
+    La distancia es el número de PLUs de la diferencia simétrica. Los
+    portafolios (BitPortfolio de un mismo índice) se convierten en una matriz
+    dispersa centro x PLU y la intersección de todos los pares se obtiene con
+    un producto de matrices por bloques de filas:
+
+        |A Δ B| = |A| + |B| - 2 |A ∩ B|
+
+    Solo se guardan los pares dentro del límite, por lo que la memoria queda
+    acotada por el tamaño de bloque. Los PLUs presentes en más de la mitad de
+    los portafolios se invierten antes del producto (la diferencia simétrica
+    no cambia si un PLU se invierte en todos), así la matriz sigue siendo
+    dispersa aunque haya un surtido común a casi todos los centros.
+
+    Métodos disponibles:
+        - 'matrix': producto de matrices por bloques (todos los pares)
+        - 'window': ordena por número de PLUs y solo compara los pares cuyo
+          tamaño difiere en plu_limit o menos; los que pasan se filtran por
+          los conteos de PLUs por grupo (categoría) antes de la comprobación
+          exacta con XOR/popcount
+        - 'prefix': unión exacta por filtrado de prefijos. Con los PLUs
+          ordenados del más raro al más común, dos portafolios a distancia
+          <= plu_limit con algún PLU en común comparten un PLU entre los
+          plu_limit + 1 primeros de cada uno, así que un índice invertido de
+          esos prefijos da todos los candidatos (los pares sin PLUs en común
+          se buscan aparte entre los portafolios pequeños)
+        - 'minhash': aproximado, para redes muy grandes. Propone candidatos
+          con firmas MinHash y LSH por bandas y los comprueba de forma exacta;
+          recall regula el equilibrio entre pares encontrados y velocidad
+        - 'auto': 'window' si deja pocos candidatos; si no, 'prefix' si deja
+          menos, o 'matrix' si ambos dejan demasiados ('auto' siempre es exacto)
+
+    Con workers > 1 la comprobación exacta (y el producto de 'matrix') se
+    reparte en bloques disjuntos de filas entre procesos. Los portafolios
+    como bits empaquetados, los conteos por grupo y la matriz dispersa se
+    copian una sola vez a memoria compartida (ver SharedArrays) y cada
+    proceso los lee sin copiarlos; el resultado es el mismo que con un solo
+    proceso.
+    """
+    METHODS = ('auto', 'matrix', 'window', 'prefix', 'minhash')
+    DEFAULT_BLOCK_SIZE = 512
+    DEFAULT_BUCKETS = 16
+    # Candidatos por tanda en la comprobación exacta y máximo para no usar 'matrix' en 'auto'
+    CHUNK_PAIRS = 1_000_000
+    MAX_CANDIDATES = 2_000_000
+    MINHASH_SIZE = 64
+    DEFAULT_RECALL = 0.95
+    # Pares por tanda de XOR/popcount en la comprobación con bits empaquetados
+    POPCOUNT_PAIRS = 65_536
+
+    def __init__(self, portfolios, method='auto', block_size=DEFAULT_BLOCK_SIZE, plu_groups=None,
+                 recall=DEFAULT_RECALL, seed=0, cancel_token=None, workers=1):
+        """
+        Args:
+            portfolios: Lista de BitPortfolio de un mismo PluIndex
+            method: Uno de METHODS
+            block_size: Filas por bloque del producto de matrices
+            plu_groups: Grupo (por ejemplo la categoría) de cada posición del
+                índice de PLUs; por defecto se reparten en DEFAULT_BUCKETS grupos
+            recall: Proporción de pares que 'minhash' intenta encontrar
+                (más alto es más exhaustivo y más lento)
+            seed: Semilla de los hashes de 'minhash'
+            cancel_token: CancellationToken opcional; se revisa en cada bloque
+            workers: Procesos para la comprobación de candidatos y el
+                producto de matrices (1 = en este proceso)
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Método de búsqueda de pares no válido: {method}")
+        self.portfolios = list(portfolios)
+        self.method = method
+        self.block_size = block_size
+        self.plu_groups = plu_groups
+        self.recall = recall
+        self.seed = seed
+        self.cancel_token = cancel_token
+        self.workers = max(1, int(workers or 1))
+        self._incidence = {}
+        self._group_counts = None
+        self._signatures = None
+        self._lsh_stats = {}
+
+    def __len__(self):
+        return len(self.portfolios)
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+
+    def incidence(self, flip_mask=0):
+        """
+        Matriz dispersa (CSR) portafolio x PLU con un 1 por cada PLU presente.
+
+        Args:
+            flip_mask: Bits de los PLUs que se invierten en todos los portafolios
+        """
+        if flip_mask not in self._incidence:
+            n_plus = len(self.portfolios[0].index) if self.portfolios else 0
+            rows = [
+                portfolio.index.decode_codes(portfolio.bits ^ flip_mask)
+                for portfolio in self.portfolios
+            ]
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(row) for row in rows])
+            indices = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+            self._incidence[flip_mask] = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int32), indices, indptr),
+                shape=(len(rows), n_plus)
+            )
+        return self._incidence[flip_mask]
+
+    def packed_bits(self):
+        """Portafolios como matriz de palabras de 64 bits (una fila por portafolio)."""
+        n_words = max((len(self.portfolios[0].index) + 63) // 64, 1) if self.portfolios else 1
+        raw = b''.join(portfolio.bits.to_bytes(n_words * 8, 'little') for portfolio in self.portfolios)
+        return np.frombuffer(raw, dtype='<u8').reshape(len(self.portfolios), n_words)
+
+    def sizes(self, flip_mask=0):
+        """Número de PLUs de cada portafolio (con los PLUs de flip_mask invertidos)."""
+        return np.diff(self.incidence(flip_mask).indptr)
+
+    def _common_plus_mask(self, other):
+        """Bits de los PLUs presentes en más de la mitad de los portafolios."""
+        counts = np.asarray(self.incidence().sum(axis=0)).ravel()
+        total = len(self)
+        if other is not self:
+            counts = counts + np.asarray(other.incidence().sum(axis=0)).ravel()
+            total += len(other)
+        common = np.flatnonzero(counts * 2 > total)
+        if len(common) == 0:
+            return 0
+        return self.portfolios[0].index.encode_codes(common)
+
+    def find_pairs(self, plu_limit, others=None):
+        """
+        Busca los pares a distancia <= plu_limit.
+
+        Args:
+            plu_limit: Máximo de PLUs diferentes
+            others: PairSearch con otra lista de portafolios. Si se indica, se
+                buscan pares (uno de cada lista); si no, pares dentro de esta
+
+        Returns:
+            ClosePairs
+        """
+        other = self if others is None else others
+        start_time = time.time()
+        same = other is self
+        total_pairs = len(self) * (len(self) - 1) // 2 if same else len(self) * len(other)
+        method = self.method
+        checked = total_pairs
+
+        if total_pairs == 0:
+            left = right = distances = np.zeros(0, dtype=np.int64)
+        else:
+            windows = postings = None
+            if method in ('auto', 'window'):
+                windows = self._size_windows(plu_limit, other)
+            if method == 'auto' and int(windows[2].sum()) <= self.MAX_CANDIDATES:
+                method = 'window'
+            if method in ('auto', 'prefix'):
+                postings = self._prefix_postings(plu_limit, other)
+            if method == 'auto':
+                method = self._choose_method(windows, postings, same)
+
+            if method == 'window':
+                left, right, distances, checked = self._window_pairs(plu_limit, other, windows)
+            elif method == 'prefix':
+                left, right, distances, checked = self._prefix_pairs(plu_limit, other, postings)
+            elif method == 'minhash':
+                left, right, distances, checked = self._minhash_pairs(plu_limit, other)
+            else:
+                flip_mask = self._common_plus_mask(other)
+                left, right, distances = self._matrix_pairs(plu_limit, other, flip_mask)
+                left, right, distances = self._add_disjoint_pairs(
+                    plu_limit, other, flip_mask, left, right, distances
+                )
+
+            order = np.lexsort((right, left))
+            left, right, distances = left[order], right[order], distances[order]
+
+        stats = {
+            'method': method,
+            'total_pairs': total_pairs,
+            'checked': checked,
+            'pruned': total_pairs - checked,
+            'pairs': len(left),
+            'seconds': time.time() - start_time
+        }
+        if method == 'minhash':
+            stats.update(self._lsh_stats)
+        return ClosePairs(left, right, distances, stats)
+
+    def group_counts(self):
+        """Número de PLUs de cada portafolio en cada grupo de PLUs (matriz densa)."""
+        if self._group_counts is None:
+            incidence = self.incidence()
+            n_plus = incidence.shape[1]
+            if self.plu_groups is None:
+                groups = np.arange(n_plus) % self.DEFAULT_BUCKETS
+            else:
+                groups = np.asarray(self.plu_groups, dtype=np.int64)
+            membership = sparse.csr_matrix(
+                (np.ones(n_plus, dtype=np.int32), (np.arange(n_plus), groups)),
+                shape=(n_plus, int(groups.max()) + 1 if n_plus else 1)
+            )
+            self._group_counts = (incidence @ membership).toarray()
+        return self._group_counts
+
+    def _size_windows(self, plu_limit, other):
+        """
+        Ventanas de candidatos por tamaño.
+
+        Returns:
+            tuple: (order, start, count) donde los candidatos del portafolio i
+                son other[order[start[i]:start[i] + count[i]]]
+        """
+        sizes, other_sizes = self.sizes(), other.sizes()
+        order = np.argsort(other_sizes, kind='stable')
+        sorted_sizes = other_sizes[order]
+        start = np.searchsorted(sorted_sizes, sizes - plu_limit, side='left')
+        stop = np.searchsorted(sorted_sizes, sizes + plu_limit, side='right')
+        if other is self:
+            # Cada par una sola vez: solo los que van después de i en el orden
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            start = rank + 1
+        return order, start, np.maximum(stop - start, 0)
+
+    def _window_pairs(self, plu_limit, other, windows):
+        """Pares dentro del límite entre los candidatos de las ventanas de tamaño."""
+        same = other is self
+        order, start, count = windows
+
+        # Tandas de portafolios con a lo sumo CHUNK_PAIRS candidatos
+        blocks = []
+        cumulative = np.cumsum(count)
+        first = 0
+        while first < len(count):
+            base = cumulative[first - 1] if first else 0
+            last = int(np.searchsorted(cumulative, base + self.CHUNK_PAIRS, side='right'))
+            last = max(last, first + 1)
+            blocks.append((first, last))
+            first = last
+
+        if self._parallel(blocks):
+            arrays = dict(self._shared_check_arrays(other), order=order, start=start, count=count)
+            return self._run_shared(
+                _window_block, arrays, [(plu_limit, same, first, last) for first, last in blocks]
+            )
+
+        found = []
+        checked = 0
+        for first, last in blocks:
+            self._check_cancelled()
+            left, right = _window_candidates(order, start, count, first, last, same)
+            left, right, distances, chunk_checked = self._check_candidates(plu_limit, other, left, right)
+            found.append((left, right, distances))
+            checked += chunk_checked
+
+        left, right, distances = (np.concatenate(parts) for parts in zip(*found))
+        return left, right, distances, checked
+
+    def _prefix_postings(self, plu_limit, other):
+        """
+        Índice invertido de los prefijos de plu_limit + 1 PLUs.
+
+        Los PLUs se ordenan por frecuencia (los más raros primero), así los
+        prefijos tienen pocos portafolios en común.
+
+        Returns:
+            tuple: (tokens, owners, sides) ordenados por token; sides es 0
+                para los portafolios de esta búsqueda y 1 para los de other
+        """
+        same = other is self
+        frequency = np.asarray(self.incidence().sum(axis=0)).ravel()
+        if not same:
+            frequency = frequency + np.asarray(other.incidence().sum(axis=0)).ravel()
+        rank = np.empty(len(frequency), dtype=np.int64)
+        rank[np.argsort(frequency, kind='stable')] = np.arange(len(frequency))
+
+        tokens, owners, sides = [], [], []
+        for side, search in enumerate([self] if same else [self, other]):
+            incidence = search.incidence()
+            rows = np.repeat(np.arange(len(search), dtype=np.int64), np.diff(incidence.indptr))
+            # Ordenar por (portafolio, rareza) con una sola clave entera
+            keys = rows * len(rank) + rank[incidence.indices]
+            keys.sort()
+            rows, row_tokens = keys // len(rank), keys % len(rank)
+
+            # Posición de cada PLU dentro de su portafolio (ordenado por rareza)
+            position = np.arange(len(rows)) - incidence.indptr[rows]
+            keep = position <= plu_limit
+            tokens.append(row_tokens[keep])
+            owners.append(rows[keep])
+            sides.append(np.full(int(keep.sum()), side, dtype=np.int8))
+
+        tokens, owners, sides = np.concatenate(tokens), np.concatenate(owners), np.concatenate(sides)
+        order = np.argsort(tokens, kind='stable')
+        return tokens[order], owners[order], sides[order]
+
+    def _posting_bounds(self, tokens):
+        """Inicio y fin de cada lista invertida (un token) en los arreglos ordenados."""
+        starts = np.flatnonzero(np.r_[True, tokens[1:] != tokens[:-1]]) if len(tokens) else np.zeros(0, dtype=np.int64)
+        return starts, np.r_[starts[1:], len(tokens)].astype(np.int64)
+
+    def _prefix_candidate_count(self, postings, same):
+        """Cota superior del número de candidatos del índice de prefijos."""
+        tokens, _, sides = postings
+        starts, stops = self._posting_bounds(tokens)
+        if same:
+            sizes = (stops - starts).astype(np.int64)
+            return int((sizes * (sizes - 1) // 2).sum())
+        other_side = np.add.reduceat(sides.astype(np.int64), starts) if len(starts) else starts
+        return int(((stops - starts - other_side) * other_side).sum())
+
+    def _prefix_pairs(self, plu_limit, other, postings):
+        """Pares dentro del límite entre los portafolios que comparten un PLU del prefijo."""
+        keys = self._posting_keys(postings, other is self, len(other))
+        return self._check_keys(plu_limit, other, keys)
+
+    def _posting_keys(self, postings, same, n_right, keys=None):
+        """
+        Claves left * n_right + right de los pares que comparten una lista invertida.
+
+        Las listas largas (un PLU muy común en los prefijos o un balde grande
+        de LSH) se expanden por tandas de a lo sumo CHUNK_PAIRS pares, y las
+        claves se compactan (sin repeticiones) cuando las nuevas superan
+        CHUNK_PAIRS y a las ya compactadas, así la memoria depende de los
+        candidatos distintos y no de las repeticiones ni del cuadrado de la
+        lista más larga.
+
+        Args:
+            keys: Lista de arreglos de claves a la que se agregan (opcional,
+                para acumular varias llamadas; el primero ya compactado)
+
+        Returns:
+            list: Arreglos de claves (con repeticiones entre ellos)
+        """
+        tokens, owners, sides = postings
+        starts, stops = self._posting_bounds(tokens)
+        keys = [] if keys is None else keys
+        pending = sum(len(part) for part in keys[1:])
+
+        def add(part):
+            nonlocal pending
+            keys.append(part)
+            pending += len(part)
+            if pending > max(self.CHUNK_PAIRS, len(keys[0]) if len(keys) > 1 else 0):
+                keys[:] = [_unique_keys(keys)]
+                pending = 0
+
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            if stop - start < 2:
+                continue
+            members = owners[start:stop]
+            if same:
+                count = len(members)
+                step = max(1, self.CHUNK_PAIRS // count)
+                for first in range(0, count - 1, step):
+                    left, right = _list_pairs(count, first, min(first + step, count - 1))
+                    add(members[left] * n_right + members[right])
+            else:
+                member_sides = sides[start:stop]
+                mine, theirs = members[member_sides == 0], members[member_sides == 1]
+                if len(mine) and len(theirs):
+                    step = max(1, self.CHUNK_PAIRS // len(theirs))
+                    for first in range(0, len(mine), step):
+                        add((mine[first:first + step, None] * n_right + theirs[None, :]).ravel())
+        return keys
+
+    def _check_keys(self, plu_limit, other, keys):
+        """
+        Comprueba los pares candidatos dados como claves (con repeticiones) y
+        agrega los pares sin PLUs en común, que ningún índice ve.
+        """
+        n_right = len(other)
+        keys = _unique_keys(keys)
+
+        blocks = [(start, min(start + self.CHUNK_PAIRS, len(keys))) for start in range(0, len(keys), self.CHUNK_PAIRS)]
+        if self._parallel(blocks):
+            arrays = dict(self._shared_check_arrays(other), keys=keys)
+            left, right, distances, checked = self._run_shared(
+                _keys_block, arrays, [(plu_limit, n_right, start, stop) for start, stop in blocks]
+            )
+        else:
+            found = []
+            checked = 0
+            for start, stop in blocks:
+                self._check_cancelled()
+                chunk = keys[start:stop]
+                left, right, distances, chunk_checked = self._check_candidates(
+                    plu_limit, other, chunk // n_right, chunk % n_right
+                )
+                found.append((left, right, distances))
+                checked += chunk_checked
+
+            empty = np.zeros(0, dtype=np.int64)
+            left, right, distances = (
+                (np.concatenate(parts) for parts in zip(*found)) if found else (empty, empty, empty)
+            )
+        left, right, distances = self._add_disjoint_pairs(plu_limit, other, 0, left, right, distances)
+        return left, right, distances, checked
+
+    def minhash_signatures(self):
+        """
+        Firmas MinHash de una sola permutación (MINHASH_SIZE valores por portafolio).
+
+        Cada PLU se asigna con un hash a una de las casillas y cada casilla
+        guarda el menor valor de hash de los PLUs del portafolio. Las casillas
+        vacías toman el valor de la siguiente casilla ocupada (densificación
+        por rotación), de modo que la probabilidad de que dos portafolios
+        coincidan en una casilla es su índice de Jaccard.
+        """
+        if self._signatures is None:
+            incidence = self.incidence()
+            n_bins = self.MINHASH_SIZE
+            hashes = np.random.default_rng(self.seed).integers(
+                0, np.iinfo(np.int64).max, size=incidence.shape[1], dtype=np.int64
+            ).astype(np.uint64)
+
+            rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(incidence.indptr))
+            plu_hashes = hashes[incidence.indices]
+            bins = (plu_hashes % np.uint64(n_bins)).astype(np.int64)
+            empty = np.iinfo(np.int64).max
+            signatures = np.full(len(self) * n_bins, empty, dtype=np.int64)
+            np.minimum.at(signatures, rows * n_bins + bins, (plu_hashes >> np.uint64(33)).astype(np.int64))
+            signatures = signatures.reshape(len(self), n_bins)
+
+            # Densificación: casilla vacía = siguiente casilla ocupada (circular) + desplazamiento
+            doubled = np.concatenate([signatures, signatures], axis=1)
+            positions = np.where(doubled != empty, np.arange(2 * n_bins), 2 * n_bins)
+            following = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :n_bins]
+            has_values = following < 2 * n_bins
+            source = np.minimum(following, 2 * n_bins - 1)
+            shifted = (
+                np.take_along_axis(doubled, source, axis=1)
+                + (source - np.arange(n_bins)) * (1 << 31)
+            )
+            self._signatures = np.where(has_values, shifted, empty)
+        return self._signatures
+
+    def lsh_bands(self, plu_limit):
+        """
+        Bandas y filas por banda para alcanzar la exhaustividad (recall) pedida.
+
+        Un par a distancia plu_limit entre portafolios de tamaño típico tiene
+        un Jaccard de aproximadamente J = 1 - plu_limit / (tamaño + plu_limit);
+        la probabilidad de que coincida en alguna banda es 1 - (1 - J^r)^b.
+        Se eligen las bandas más largas (menos candidatos falsos) que cumplen
+        el objetivo.
+
+        Returns:
+            tuple: (bandas, filas por banda, recall esperado)
+        """
+        typical_size = float(np.median(self.sizes())) if len(self) else 0.0
+        jaccard = 1 - plu_limit / max(typical_size + plu_limit, plu_limit + 1)
+
+        best = (self.MINHASH_SIZE, 1, 1 - (1 - jaccard) ** self.MINHASH_SIZE)
+        for rows in range(1, self.MINHASH_SIZE + 1):
+            bands = self.MINHASH_SIZE // rows
+            expected = 1 - (1 - jaccard ** rows) ** bands
+            if expected >= self.recall:
+                best = (bands, rows, expected)
+        return best
+
+    def _minhash_pairs(self, plu_limit, other):
+        """
+        Pares dentro del límite entre los candidatos de LSH por bandas.
+
+        Dos portafolios son candidatos si coinciden en todas las filas de al
+        menos una banda de sus firmas MinHash. Es un método aproximado: puede
+        perder pares, pero todos los que devuelve están dentro del límite.
+        """
+        same = other is self
+        bands, rows, expected = self.lsh_bands(plu_limit)
+        self._lsh_stats = {'bands': bands, 'rows': rows, 'expected_recall': expected}
+
+        signatures = self.minhash_signatures()
+        other_signatures = signatures if same else other.minhash_signatures()
+        mixers = np.random.default_rng(self.seed + 1).integers(
+            1, np.iinfo(np.int64).max, size=rows, dtype=np.int64
+        ) | 1
+
+        keys = []
+        for band in range(bands):
+            self._check_cancelled()
+            columns = slice(band * rows, (band + 1) * rows)
+            tokens = [(signatures[:, columns] * mixers).sum(axis=1)]
+            if not same:
+                tokens.append((other_signatures[:, columns] * mixers).sum(axis=1))
+            tokens = np.concatenate(tokens)
+            owners = np.concatenate([np.arange(len(self))] + ([] if same else [np.arange(len(other))]))
+            sides = np.concatenate(
+                [np.zeros(len(self), dtype=np.int8)] + ([] if same else [np.ones(len(other), dtype=np.int8)])
+            )
+            order = np.argsort(tokens, kind='stable')
+            keys = self._posting_keys((tokens[order], owners[order], sides[order]), same, len(other), keys)
+
+        return self._check_keys(plu_limit, other, keys)
+
+    def _choose_method(self, windows, postings, same):
+        """Método de 'auto': el filtro con menos candidatos, o 'matrix' si ambos dejan demasiados."""
+        candidates = {
+            'window': int(windows[2].sum()),
+            'prefix': self._prefix_candidate_count(postings, same)
+        }
+        method = min(candidates, key=candidates.get)
+        return method if candidates[method] <= self.MAX_CANDIDATES else 'matrix'
+
+    def _check_candidates(self, plu_limit, other, left, right):
+        """
+        Comprobación exacta de pares candidatos.
+
+        Primero descarta los pares cuya diferencia de conteos por grupo (cota
+        inferior de la distancia) supera el límite y calcula la distancia
+        exacta con XOR/popcount solo para los demás.
+
+        Returns:
+            tuple: (left, right, distances, checked)
+        """
+        bound = np.abs(self.group_counts()[left] - other.group_counts()[right]).sum(axis=1)
+        keep = bound <= plu_limit
+        left, right = left[keep], right[keep]
+
+        bits = [portfolio.bits for portfolio in self.portfolios]
+        other_bits = bits if other is self else [portfolio.bits for portfolio in other.portfolios]
+        distances = np.fromiter(
+            ((bits[i] ^ other_bits[j]).bit_count() for i, j in zip(left.tolist(), right.tolist())),
+            dtype=np.int64,
+            count=len(left)
+        )
+        keep = distances <= plu_limit
+        return left[keep], right[keep], distances[keep], len(left)
+
+    def _matrix_pairs(self, plu_limit, other, flip_mask):
+        """Distancias de los pares con algún PLU en común, por bloques de filas."""
+        same = other is self
+        incidence = self.incidence(flip_mask)
+        sizes, other_sizes = self.sizes(flip_mask), other.sizes(flip_mask)
+
+        blocks = [(start, min(start + self.block_size, len(self))) for start in range(0, len(self), self.block_size)]
+        if self._parallel(blocks):
+            # Cada proceso multiplica sus filas por la transpuesta completa
+            # (en una sola lista luego descarta los pares j <= i)
+            other_t = other.incidence(flip_mask).T.tocsr()
+            arrays = {
+                'indptr': incidence.indptr, 'indices': incidence.indices, 'data': incidence.data,
+                'other_t_indptr': other_t.indptr, 'other_t_indices': other_t.indices,
+                'other_t_data': other_t.data, 'sizes': sizes, 'other_sizes': other_sizes
+            }
+            left, right, distances, _ = self._run_shared(
+                _matrix_block, arrays,
+                [(plu_limit, same, incidence.shape, other_t.shape, start, stop) for start, stop in blocks]
+            )
+            return left, right, distances
+
+        other_t = None if same else other.incidence(flip_mask).T.tocsr()
+        found = []
+        for start in range(0, len(self), self.block_size):
+            self._check_cancelled()
+            stop = min(start + self.block_size, len(self))
+            # En una sola lista basta con las columnas desde start (pares i < j)
+            first_col = start if same else 0
+            block_t = incidence[first_col:].T if same else other_t
+            common = (incidence[start:stop] @ block_t).tocoo()
+
+            rows = common.row.astype(np.int64) + start
+            cols = common.col.astype(np.int64) + first_col
+            distances = sizes[rows] + other_sizes[cols] - 2 * common.data.astype(np.int64)
+
+            keep = distances <= plu_limit
+            if same:
+                keep &= cols > rows
+            found.append((rows[keep], cols[keep], distances[keep]))
+
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+    def _parallel(self, blocks):
+        """True si conviene repartir los bloques entre procesos."""
+        return self.workers > 1 and len(blocks) > 1
+
+    def _shared_check_arrays(self, other):
+        """Datos de la comprobación exacta: bits empaquetados y conteos por grupo."""
+        arrays = {'bits': self.packed_bits(), 'groups': self.group_counts()}
+        if other is not self:
+            arrays.update(other_bits=other.packed_bits(), other_groups=other.group_counts())
+        return arrays
+
+    def _run_shared(self, func, arrays, tasks):
+        """
+        Ejecuta func(spec, *tarea) en un grupo de procesos con los arreglos
+        en memoria compartida y une los resultados en el orden de las tareas.
+
+        Returns:
+            tuple: (left, right, distances, checked)
+        """
+        results = [None] * len(tasks)
+        with SharedArrays(arrays) as shared:
+            executor = ProcessPoolExecutor(max_workers=min(self.workers, len(tasks)))
+            try:
+                futures = {executor.submit(func, shared.spec, *task): position for position, task in enumerate(tasks)}
+                pending = set(futures)
+                while pending:
+                    # La cancelación se revisa mientras los procesos trabajan
+                    self._check_cancelled()
+                    done, pending = wait(pending, timeout=0.1)
+                    for future in done:
+                        results[futures[future]] = future.result()
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        left, right, distances, checked = zip(*results)
+        return np.concatenate(left), np.concatenate(right), np.concatenate(distances), sum(checked)
+
+    def _add_disjoint_pairs(self, plu_limit, other, flip_mask, left, right, distances):
+        """
+        Agrega los pares sin PLUs en común, que el producto de matrices no ve.
+
+        Solo pueden estar dentro del límite si |A| + |B| <= plu_limit, así que
+        basta con revisar los portafolios pequeños.
+        """
+        same = other is self
+        sizes, other_sizes = self.sizes(flip_mask), other.sizes(flip_mask)
+        small = np.flatnonzero(sizes <= plu_limit)
+        other_small = np.flatnonzero(other_sizes <= plu_limit)
+        if len(small) == 0 or len(other_small) == 0:
+            return left, right, distances
+
+        small_rows = self.incidence(flip_mask)[small]
+        other_small_t = other.incidence(flip_mask)[other_small].T.tocsr()
+
+        found = [(left, right, distances)]
+        for start in range(0, len(small), self.block_size):
+            self._check_cancelled()
+            rows = small[start:start + self.block_size]
+            common = (small_rows[start:start + self.block_size] @ other_small_t).toarray()
+            total = sizes[rows][:, None] + other_sizes[other_small][None, :]
+
+            keep = (total <= plu_limit) & (common == 0)
+            if same:
+                keep &= other_small[None, :] > rows[:, None]
+            block_rows, block_cols = np.nonzero(keep)
+            found.append((rows[block_rows], other_small[block_cols], total[block_rows, block_cols]))
+
+        # Un par puede venir de ambos lados (por ejemplo, los candidatos de
+        # 'minhash' de portafolios vacíos): se deja la primera aparición
+        left, right, distances = (np.concatenate(parts) for parts in zip(*found))
+        _, first = np.unique(left * len(other) + right, return_index=True)
+        first.sort()
+        return left[first], right[first], distances[first]
+
+
+def _unique_keys(keys):
+    """Claves ordenadas y sin repeticiones de una lista de arreglos."""
+    keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+    keys.sort()
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+
+def _list_pairs(count, first, last):
+    """Pares (i, j) de una lista de count elementos con first <= i < last e i < j."""
+    pair_counts = count - 1 - np.arange(first, last)
+    left = np.repeat(np.arange(first, last), pair_counts)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    return left, left + 1 + offsets
+
+
+def _window_candidates(order, start, count, first, last, same):
+    """Candidatos (left, right) de los portafolios first..last-1 según sus ventanas de tamaño."""
+    chunk_count = count[first:last]
+    left = np.repeat(np.arange(first, last), chunk_count)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(chunk_count) - chunk_count, chunk_count)
+    right = order[np.repeat(start[first:last], chunk_count) + offsets]
+    if same:
+        left, right = np.minimum(left, right), np.maximum(left, right)
+    return left, right
+
+
+def _check_shared(arrays, plu_limit, left, right):
+    """
+    Comprobación exacta en un proceso de trabajo (como PairSearch._check_candidates,
+    con XOR/popcount sobre los bits empaquetados en memoria compartida).
+    """
+    groups = arrays['groups']
+    other_groups = arrays.get('other_groups', groups)
+    bits = arrays['bits']
+    other_bits = arrays.get('other_bits', bits)
+
+    bound = np.abs(groups[left] - other_groups[right]).sum(axis=1)
+    keep = bound <= plu_limit
+    left, right = left[keep], right[keep]
+
+    distances = np.empty(len(left), dtype=np.int64)
+    for start in range(0, len(left), PairSearch.POPCOUNT_PAIRS):
+        stop = start + PairSearch.POPCOUNT_PAIRS
+        distances[start:stop] = np.bitwise_count(
+            bits[left[start:stop]] ^ other_bits[right[start:stop]]
+        ).sum(axis=1, dtype=np.int64)
+    keep = distances <= plu_limit
+    return left[keep], right[keep], distances[keep], len(left)
+
+
+def _window_block(spec, plu_limit, same, first, last):
+    """Bloque de filas de PairSearch._window_pairs en un proceso de trabajo."""
+    with attach(spec) as arrays:
+        left, right = _window_candidates(arrays['order'], arrays['start'], arrays['count'], first, last, same)
+        return _check_shared(arrays, plu_limit, left, right)
+
+
+def _keys_block(spec, plu_limit, n_right, start, stop):
+    """Tanda de claves candidatas de PairSearch._check_keys en un proceso de trabajo."""
+    with attach(spec) as arrays:
+        return _check_shared(arrays, plu_limit, *np.divmod(arrays['keys'][start:stop], n_right))
+
+
+def _matrix_block(spec, plu_limit, same, shape, other_t_shape, start, stop):
+    """Bloque de filas de PairSearch._matrix_pairs en un proceso de trabajo."""
+    with attach(spec) as arrays:
+        common = _common_plus(arrays, shape, other_t_shape, start, stop)
+        rows = common.row.astype(np.int64) + start
+        cols = common.col.astype(np.int64)
+        distances = arrays['sizes'][rows] + arrays['other_sizes'][cols] - 2 * common.data.astype(np.int64)
+
+    keep = distances <= plu_limit
+    if same:
+        keep &= cols > rows
+    return rows[keep], cols[keep], distances[keep], 0
+
+
+def _common_plus(arrays, shape, other_t_shape, start, stop):
+    """PLUs en común de las filas start..stop-1 (las matrices sobre la memoria compartida solo viven aquí)."""
+    incidence = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)
+    other_t = sparse.csr_matrix(
+        (arrays['other_t_data'], arrays['other_t_indices'], arrays['other_t_indptr']),
+        shape=other_t_shape, copy=False
+    )
+    return (incidence[start:stop] @ other_t).tocoo()
+
+
+def measure_recall(portfolios, plu_limit, others=None, recall=PairSearch.DEFAULT_RECALL):
+    """
+    Mide la exhaustividad del método 'minhash' frente al exacto con los mismos datos.
+
+    Args:
+        portfolios: Lista de BitPortfolio
+        plu_limit: Máximo de PLUs diferentes
+        others: Segunda lista de BitPortfolio (opcional, ver PairSearch.find_pairs)
+        recall: Objetivo de exhaustividad de la búsqueda aproximada
+
+    Returns:
+        dict: Pares exactos y encontrados, recall medido y esperado, candidatos
+            comprobados y tiempos de ambos métodos
+    """
+    def run(method):
+        search = PairSearch(portfolios, method=method, recall=recall)
+        other_search = PairSearch(others, method=method, recall=recall) if others is not None else None
+        return search.find_pairs(plu_limit, other_search)
+
+    approximate = run('minhash')
+    exact = run('auto')
+
+    # Todos los pares del método aproximado están dentro del límite
+    return {
+        'exact_pairs': len(exact),
+        'found_pairs': len(approximate),
+        'recall': len(approximate) / len(exact) if len(exact) else 1.0,
+        'expected_recall': approximate.stats.get('expected_recall', 1.0),
+        'bands': approximate.stats.get('bands'),
+        'rows': approximate.stats.get('rows'),
+        'checked': approximate.stats['checked'],
+        'exact_method': exact.stats['method'],
+        'exact_seconds': exact.stats['seconds'],
+        'approximate_seconds': approximate.stats['seconds']
+    }
@@ -0,0 +1,152 @@
+# src/portfolio_bits.py
+from collections.abc import Set
+
+from lazy_loader import LazyLoader
+
+np = LazyLoader('numpy')
+
+
+class PluIndex:
+    """
+    Índice global de PLUs: asigna a cada PLU una posición de bit.
+
+    Los PLUs se guardan ordenados, de modo que al decodificar un portafolio
+    sus PLUs salen ya en orden.
+    """
+
+    def __init__(self, plu_labels):
+        self.labels = np.asarray(plu_labels, dtype=object)
+        self.positions = {plu: pos for pos, plu in enumerate(self.labels)}
+        self.n_bytes = (len(self.labels) + 7) // 8
+
+    def __len__(self):
+        return len(self.labels)
+
+    def encode_codes(self, codes):
+        """Convierte posiciones de PLU en un entero con esos bits encendidos."""
+        flags = np.zeros(self.n_bytes * 8, dtype=bool)
+        flags[np.asarray(codes, dtype=np.int64)] = True
+        return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+    def encode(self, plus):
+        """Convierte un conjunto de PLUs en bits (los PLUs deben estar en el índice)."""
+        return self.encode_codes([self.positions[plu] for plu in plus])
+
+    def decode_codes(self, bits):
+        """Posiciones de los bits encendidos, en orden."""
+        raw = np.frombuffer(bits.to_bytes(self.n_bytes, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder='little'))
+
+    def decode(self, bits):
+        """Lista ordenada de los PLUs cuyos bits están encendidos."""
+        if not bits:
+            return []
+        return self.labels[self.decode_codes(bits)].tolist()
+
+    def portfolio(self, plus):
+        """Crea un BitPortfolio a partir de un conjunto de PLUs."""
+        return BitPortfolio(self.encode(plus), self)
+
+
+class BitPortfolio(Set):
+    """
+    Portafolio de PLUs guardado como un arreglo de bits sobre un PluIndex.
+
+    Se comporta como un conjunto de solo lectura: len(), in, iteración y los
+    operadores |, &, ^ y - funcionan como con un set. Entre portafolios del
+    mismo índice las operaciones son XOR/AND/OR de enteros y el tamaño es un
+    popcount, así que la lista de PLUs solo se decodifica cuando se recorre
+    (por ejemplo, al mostrarla o exportarla).
+    """
+    __slots__ = ('bits', 'index', '_size', '_codes')
+
+    def __init__(self, bits, index, size=None):
+        self.bits = bits
+        self.index = index
+        self._size = size
+        self._codes = None
+
+    def codes(self):
+        """Posiciones de los PLUs en el índice (se decodifican una vez y se guardan)."""
+        if self._codes is None:
+            self._codes = self.index.decode_codes(self.bits)
+        return self._codes
+
+    def __len__(self):
+        if self._size is None:
+            self._size = self.bits.bit_count()
+        return self._size
+
+    def __iter__(self):
+        return iter(self.index.decode(self.bits))
+
+    def __contains__(self, plu):
+        pos = self.index.positions.get(plu)
+        return pos is not None and (self.bits >> pos) & 1 == 1
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __repr__(self):
+        return f"BitPortfolio({len(self)} PLUs)"
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # Operaciones con conjuntos que no comparten índice: resultado como set
+        return set(iterable)
+
+    def _same_index(self, other):
+        return isinstance(other, BitPortfolio) and other.index is self.index
+
+    def __eq__(self, other):
+        if self._same_index(other):
+            return self.bits == other.bits
+        return Set.__eq__(self, other)
+
+    __hash__ = None
+
+    def __or__(self, other):
+        if self._same_index(other):
+            return BitPortfolio(self.bits | other.bits, self.index)
+        return Set.__or__(self, other)
+
+    def __and__(self, other):
+        if self._same_index(other):
+            return BitPortfolio(self.bits & other.bits, self.index)
+        return Set.__and__(self, other)
+
+    def __xor__(self, other):
+        if self._same_index(other):
+            return BitPortfolio(self.bits ^ other.bits, self.index)
+        return Set.__xor__(self, other)
+
+    def __sub__(self, other):
+        if self._same_index(other):
+            return BitPortfolio(self.bits & ~other.bits, self.index)
+        return Set.__sub__(self, other)
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def union(self, *others):
+        result = self
+        for other in others:
+            result = result | other
+        return result
+
+    def intersection(self, *others):
+        result = self
+        for other in others:
+            result = result & other
+        return result
+
+    def symmetric_difference(self, other):
+        return self ^ other
+
+    def difference(self, other):
+        return self - other
+
+    def symmetric_difference_size(self, other):
+        """Número de PLUs en uno solo de los dos portafolios (XOR + popcount)."""
+        return (self.bits ^ other.bits).bit_count()
@@ -0,0 +1,208 @@
+# src/portfolio_cli.py
+"""
+Línea de comandos del motor de agrupación (sin interfaz gráfica).
+
+Desde la carpeta src:
+
+    python -m portfolio_cli analyze entrada.xlsx --limit 10 --out resultado.xlsx
+    python -m portfolio_cli batch carpeta_categorias --out-dir resultados --workers 4
+
+Sirve para programar corridas (por ejemplo, una por categoría cada noche) y
+para medir el motor sin abrir la aplicación.
+"""
+import argparse
+import sys
+import time
+
+from batch_analysis import find_input_files, run_batch, summary_path, write_batch_summary
+from excel_export import ExcelExporter
+from geo_grouping import GeoPartitionGrouping
+from group_accumulator import GROUPING_METHODS, build_final_groups
+from pair_search import PairSearch
+from portfolio_engine import PortfolioEngine
+
+# Hojas que se pueden omitir con --skip (claves de ExcelExporter.DEFAULT_OPTIONS)
+SKIPPABLE_SHEETS = (
+    'sheet1', 'resumen', 'grupos_identicos', 'grupos_finales', 'centros_unicos',
+    'centros_no_compatibles', 'curva_limites', 'analisis_variacion', 'consolidado'
+)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='portfolio_cli',
+        description="Agrupa portafolios de centros con a lo sumo un límite de PLUs diferentes."
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    analyze = commands.add_parser('analyze', help="Analiza un archivo y, opcionalmente, exporta el resultado")
+    analyze.add_argument('input', help="Archivo Excel con la hoja Sheet1")
+    analyze.add_argument('--limit', type=int, default=10, help="Máximo de PLUs diferentes por grupo (10)")
+    analyze.add_argument('--out', help="Archivo .xlsx de salida (sin --out solo se muestra el resumen)")
+    analyze.add_argument('--method', choices=PairSearch.METHODS, default='auto',
+                         help="Búsqueda de pares de portafolios cercanos (auto)")
+    analyze.add_argument('--recall', type=float, default=PairSearch.DEFAULT_RECALL,
+                         help="Exhaustividad de la búsqueda 'minhash'")
+    analyze.add_argument('--workers', type=int, default=1,
+                         help="Procesos para la búsqueda de pares y la agrupación por componentes (1)")
+    analyze.add_argument('--grouping', choices=GROUPING_METHODS, default='greedy',
+                         help="Algoritmo de los grupos finales (greedy)")
+    analyze.add_argument('--compare-grouping', action='store_true',
+                         help="Compara másteres finales y tiempo de todos los algoritmos de agrupación")
+    analyze.add_argument('--partition', choices=GeoPartitionGrouping.PARTITION_KEYS,
+                         help="Agrupa por separado los centros de cada distrito o región (datos maestros)")
+    analyze.add_argument('--no-cross-merge', action='store_true',
+                         help="Con --partition, no intenta fusiones entre particiones")
+    analyze.add_argument('--improve', type=float, default=0, metavar='SEGUNDOS',
+                         help="Segundos de mejora local para reducir los másteres finales (0 = sin mejora)")
+    analyze.add_argument('--sweep', type=int, nargs=3, metavar=('DESDE', 'HASTA', 'CADA'),
+                         help="Calcula la curva de másteres finales por límite de PLUs")
+    analyze.add_argument('--category', help="Categoría para el análisis de modulación de los grupos finales")
+    analyze.add_argument('--regions', action='store_true',
+                         help="Agrega la distribución por región a los grupos finales")
+    analyze.add_argument('--geo', action='store_true', help="Muestra la optimización geográfica de los grupos")
+    analyze.add_argument('--skip', action='append', choices=SKIPPABLE_SHEETS, default=[],
+                         help="Hoja que no se exporta (se puede repetir)")
+
+    batch = commands.add_parser('batch', help="Analiza y exporta cada archivo de una carpeta en paralelo")
+    batch.add_argument('input', help="Carpeta con un archivo .xlsx por categoría, o patrón glob")
+    batch.add_argument('--out-dir', default='resultados', help="Carpeta de las exportaciones (resultados)")
+    batch.add_argument('--limit', type=int, default=10, help="Máximo de PLUs diferentes por grupo (10)")
+    batch.add_argument('--workers', type=int, help="Procesos en paralelo (por defecto, uno por núcleo)")
+    batch.add_argument('--method', choices=PairSearch.METHODS, default='auto',
+                       help="Búsqueda de pares de portafolios cercanos (auto)")
+    batch.add_argument('--recall', type=float, default=PairSearch.DEFAULT_RECALL,
+                       help="Exhaustividad de la búsqueda 'minhash'")
+    batch.add_argument('--grouping', choices=GROUPING_METHODS, default='greedy',
+                       help="Algoritmo de los grupos finales (greedy)")
+    batch.add_argument('--partition', choices=GeoPartitionGrouping.PARTITION_KEYS,
+                       help="Agrupa por separado los centros de cada distrito o región (datos maestros)")
+    batch.add_argument('--improve', type=float, default=0, metavar='SEGUNDOS',
+                       help="Segundos de mejora local por archivo (0 = sin mejora)")
+    batch.add_argument('--skip', action='append', choices=SKIPPABLE_SHEETS, default=[],
+                       help="Hoja que no se exporta en ningún archivo (se puede repetir)")
+    return parser
+
+
+def run_analyze(args):
+    if args.limit < 0:
+        raise Exception(f"Límite de PLUs inválido: {args.limit}")
+    if args.workers < 1:
+        raise Exception(f"Cantidad de procesos inválida: {args.workers}")
+    if args.improve < 0:
+        raise Exception(f"Tiempo de mejora inválido: {args.improve}")
+
+    start = time.perf_counter()
+    engine = PortfolioEngine()
+    engine.pair_search_method = args.method
+    engine.pair_search_recall = args.recall
+    engine.pair_search_workers = args.workers
+    engine.grouping_workers = args.workers
+    engine.grouping_method = args.grouping
+    engine.grouping_partition = args.partition
+    engine.grouping_cross_merge = not args.no_cross_merge
+    engine.improve_seconds = args.improve
+    engine.geo_optimization = args.geo
+
+    results = engine.analyze(args.input, args.limit, report=lambda message: print(message))
+    report_data = results['report_data']
+    final_groups = results['final_groups']
+
+    print(f"\nArchivo: {args.input} (límite {args.limit} PLUs)")
+    print(f"Centros: {report_data['identical_count'] + report_data['unique_count']} "
+          f"({report_data['unique_count']} únicos, {report_data['identical_count']} en grupos idénticos)")
+    print(f"Másteres iniciales: {report_data['initial_masters']}")
+    print(f"Másteres finales: {report_data['final_masters']} "
+          f"({len(final_groups['groups'])} grupos, {len(final_groups['non_compatible'])} centros sin agrupar)")
+
+    if args.compare_grouping:
+        print("\nComparación de algoritmos de agrupación:")
+        for method in GROUPING_METHODS:
+            method_start = time.perf_counter()
+            accumulators, non_compatible = build_final_groups(
+                engine.identical_portfolios, engine.unique_portfolios, args.limit, method=method
+            )
+            print(f"{method}: {len(accumulators) + len(non_compatible)} másteres finales "
+                  f"({len(accumulators)} grupos, {len(non_compatible)} centros sin agrupar, "
+                  f"{time.perf_counter() - method_start:.2f}s)")
+
+    if args.sweep:
+        first, last, step = args.sweep
+        if step <= 0 or last < first:
+            raise Exception("El rango de --sweep debe ser DESDE <= HASTA con CADA > 0")
+        engine.compute_limit_sweep(range(first, last + 1, step))
+
+    if args.geo:
+        geo_groups = results['geo_optimization']
+        if geo_groups is None:
+            print("Optimización geográfica: no se pudieron cargar los datos geográficos")
+        else:
+            print(f"Optimización geográfica: {len(geo_groups)} grupos")
+
+    if args.out:
+        options = {sheet: False for sheet in args.skip}
+        if args.category:
+            options.update(analisis_grupos=True, analisis_modulacion=True)
+        if args.regions:
+            options.update(analisis_grupos=True, distribucion_region=True)
+        ExcelExporter(engine, progress_callback=lambda message: print(message)).export(
+            args.out, options, category=args.category
+        )
+        print(f"Resultado exportado: {args.out}")
+
+    print(f"Tiempo total: {time.perf_counter() - start:.2f}s")
+
+
+def run_batch_command(args):
+    if args.limit < 0:
+        raise Exception(f"Límite de PLUs inválido: {args.limit}")
+    if args.workers is not None and args.workers < 1:
+        raise Exception(f"Cantidad de procesos inválida: {args.workers}")
+    if args.improve < 0:
+        raise Exception(f"Tiempo de mejora inválido: {args.improve}")
+
+    files = find_input_files(args.input)
+    if not files:
+        raise Exception(f"No se encontraron archivos .xlsx en {args.input}")
+
+    def report(row, done, total):
+        detail = (f"{row['initial_masters']} -> {row['final_masters']} másteres"
+                  if row['status'] == 'OK' else row['status'])
+        print(f"[{done}/{total}] {row['category']}: {detail} ({row['seconds']:.2f}s)")
+
+    start = time.perf_counter()
+    print(f"Analizando {len(files)} archivos (límite {args.limit} PLUs)")
+    rows = run_batch(
+        files, args.out_dir, args.limit, workers=args.workers,
+        options={sheet: False for sheet in args.skip},
+        method=args.method, recall=args.recall, grouping=args.grouping, partition=args.partition,
+        improve=args.improve, progress_callback=report
+    )
+    summary_file = write_batch_summary(rows, summary_path(args.out_dir))
+
+    done = [row for row in rows if row['status'] == 'OK']
+    initial_masters = sum(row['initial_masters'] for row in done)
+    final_masters = sum(row['final_masters'] for row in done)
+    print(f"\nArchivos analizados: {len(done)} de {len(rows)}")
+    print(f"Másteres: {initial_masters} -> {final_masters}")
+    print(f"Resumen del lote: {summary_file}")
+    print(f"Tiempo total: {time.perf_counter() - start:.2f}s "
+          f"(suma por archivo: {sum(row['seconds'] for row in rows):.2f}s)")
+    return len(done) == len(rows)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == 'analyze':
+            run_analyze(args)
+        elif args.command == 'batch' and not run_batch_command(args):
+            return 1
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+# src/portfolio_dataset.py
+from column_validator import ColumnValidator
+from lazy_loader import LazyLoader
+from portfolio_bits import BitPortfolio, PluIndex
+
+pd = LazyLoader('pandas')
+np = LazyLoader('numpy')
+openpyxl = LazyLoader('openpyxl')
+
+
+def read_sheet_header(ws):
+    """Lee la fila de encabezados con los mismos nombres que asigna pandas."""
+    header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+    header = []
+    seen = {}
+    for idx, value in enumerate(header_row):
+        name = f"Unnamed: {idx}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+
+def read_sheet_columns(file_path, sheet_name, columns, progress_callback=None, progress_every=5000):
+    """
+    Lee solo algunas columnas de una hoja recorriéndola en modo streaming.
+
+    Usa openpyxl en modo de solo lectura, por lo que la memoria no depende de
+    las columnas que no se piden. Las filas completamente vacías (en todas
+    las columnas de la hoja, no solo en las pedidas) se omiten y el índice
+    del resultado es la posición de la fila en la hoja (como en
+    pd.read_excel). Una fila con datos pero vacía en las columnas pedidas
+    se conserva con valores nulos.
+
+    Args:
+        file_path: Ruta del archivo Excel
+        sheet_name: Nombre de la hoja
+        columns: Nombres de columna a leer, o función que recibe el encabezado
+            y devuelve esos nombres
+        progress_callback: Función (filas_leidas, total_filas) llamada cada
+            progress_every filas; total_filas puede ser None
+        progress_every: Frecuencia de las notificaciones de progreso
+
+    Returns:
+        tuple: (header, DataFrame con las columnas pedidas)
+    """
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"No se encontró la hoja '{sheet_name}' en el archivo")
+        ws = wb[sheet_name]
+        header = read_sheet_header(ws)
+        if callable(columns):
+            columns = columns(header)
+
+        positions = [header.index(col) for col in columns]
+        total_rows = ws.max_row - 1 if ws.max_row else None
+
+        values = [[] for _ in columns]
+        index = []
+        rows_read = 0
+        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True)):
+            rows_read += 1
+            if progress_callback and rows_read % progress_every == 0:
+                progress_callback(rows_read, total_rows)
+
+            if all(value is None for value in row):
+                continue
+            row_values = [row[pos] if pos < len(row) else None for pos in positions]
+
+            index.append(row_idx)
+            for col_values, value in zip(values, row_values):
+                # Igual que pandas: los números enteros guardados como float vuelven a int
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                col_values.append(value)
+
+        if progress_callback:
+            progress_callback(rows_read, total_rows)
+
+        data = {col: col_values for col, col_values in zip(columns, values)}
+        return header, pd.DataFrame(data, index=index, columns=columns)
+    finally:
+        wb.close()
+
+
+class CenterIndex:
+    """
+    Índice de cada centro a su portafolio, construido al leer el archivo.
+
+    Los portafolios se numeran en el orden de identical_portfolios y luego de
+    unique_portfolios, así que el grupo idéntico número k (desde 1) es el
+    portafolio k - 1. Las búsquedas por centro son O(1).
+    """
+
+    def __init__(self, identical_portfolios, unique_portfolios):
+        self.portfolios = []
+        self.members = []
+        self.portfolio_ids = {}
+        self.n_identical = len(identical_portfolios)
+
+        for centers, plus in identical_portfolios.items():
+            self._add(centers, plus)
+        for center, plus in unique_portfolios.items():
+            self._add((center,), plus)
+
+    def _add(self, centers, plus):
+        portfolio_id = len(self.portfolios)
+        self.portfolios.append(plus)
+        self.members.append(tuple(centers))
+        for center in centers:
+            self.portfolio_ids[str(center)] = portfolio_id
+
+    def __contains__(self, center):
+        return str(center) in self.portfolio_ids
+
+    def __len__(self):
+        return len(self.portfolio_ids)
+
+    def centers(self):
+        """Todos los centros del archivo."""
+        return self.portfolio_ids.keys()
+
+    def portfolio_id(self, center):
+        """Número de portafolio del centro, o None si no está en el archivo."""
+        return self.portfolio_ids.get(str(center))
+
+    def portfolio(self, center):
+        """Portafolio (BitPortfolio) del centro, o None si no está en el archivo."""
+        portfolio_id = self.portfolio_id(center)
+        return None if portfolio_id is None else self.portfolios[portfolio_id]
+
+    def plu_count(self, center):
+        """Número de PLUs del centro (0 si no está en el archivo)."""
+        portfolio = self.portfolio(center)
+        return 0 if portfolio is None else len(portfolio)
+
+    def identical_group_number(self, centers):
+        """Número (desde 1) del grupo idéntico formado por esos centros, o None."""
+        portfolio_id = self.portfolio_id(centers[0]) if len(centers) else None
+        if portfolio_id is None or portfolio_id >= self.n_identical:
+            return None
+        if self.members[portfolio_id] != tuple(centers):
+            return None
+        return portfolio_id + 1
+
+
+class PortfolioDataset:
+    """
+    Datos del archivo de surtido leídos una sola vez por análisis.
+
+    Por defecto solo se leen las columnas de centro y PLU; la hoja completa y
+    las columnas de jerarquía se cargan la primera vez que una vista, un
+    informe o una exportación las necesita, y después se comparten.
+    """
+    SHEET_NAME = 'Sheet1'
+    REQUIRED_COLUMNS = ['CENTRO', 'PLU_SAP']
+    OPTIONAL_COLUMNS = ['CATEGORIA', 'SUBCATEGORIA', 'SEGMENTO', 'ARTICULO']
+
+    # Nombres estándar usados por la tabla dinámica y las hojas de variación
+    ANALYSIS_COLUMNS = {
+        'CENTRO': 'Centro',
+        'PLU_SAP': 'PLU_SAP',
+        'CATEGORIA': 'Categoria',
+        'SUBCATEGORIA': 'Subcategoria',
+        'SEGMENTO': 'Segmento',
+        'ARTICULO': 'Articulo'
+    }
+
+    def __init__(self, file_path, header, keys, column_validator=None, cache=None, fingerprint=None):
+        """
+        Args:
+            file_path: Ruta del archivo de surtido
+            header: Nombres de columna de Sheet1
+            keys: DataFrame con las columnas originales de centro y PLU
+            column_validator: Validador usado para resolver las columnas
+            cache: DatasetCache para las lecturas bajo demanda (opcional)
+            fingerprint: Huella del archivo ya calculada por la caché
+        """
+        self.file_path = file_path
+        self.header = header
+        self.column_validator = column_validator or ColumnValidator()
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.columns = {}
+
+        self._df = None
+        self._analysis_frame = None
+        self._codes = None
+        self._plu_index = None
+        self._portfolios = None
+        self._center_index = None
+
+        self._resolve_columns()
+        self._load_keys(keys)
+
+    @classmethod
+    def from_excel(cls, file_path, column_validator=None, cache=None, progress_callback=None,
+                   fingerprint=None):
+        """
+        Lee las columnas de centro y PLU de Sheet1 y construye el dataset.
+
+        Si se indica una caché (DatasetCache) y el archivo no ha cambiado desde
+        la última lectura, los datos se cargan desde disco sin abrir el libro.
+
+        Args:
+            file_path: Ruta del archivo de surtido
+            column_validator: Validador de columnas (opcional)
+            cache: DatasetCache (opcional)
+            progress_callback: Función (filas_leidas, total_filas) para informar
+                el avance de la lectura
+            fingerprint: Huella del archivo ya calculada (opcional)
+        """
+        column_validator = column_validator or ColumnValidator()
+        if fingerprint is None and cache is not None:
+            fingerprint = cache.fingerprint(file_path)
+
+        if cache is not None:
+            header_df = cache.load(file_path, 'header', fingerprint)
+            keys = cache.load(file_path, 'keys', fingerprint)
+            if header_df is not None and keys is not None:
+                return cls(file_path, header_df['column'].tolist(), keys,
+                           column_validator, cache, fingerprint)
+
+        def key_columns(header):
+            required = cls._find_columns(header, column_validator, cls.REQUIRED_COLUMNS)
+            return [required['CENTRO'], required['PLU_SAP']]
+
+        header, keys = read_sheet_columns(
+            file_path,
+            cls.SHEET_NAME,
+            key_columns,
+            progress_callback=progress_callback
+        )
+
+        dataset = cls(file_path, header, keys, column_validator, cache, fingerprint)
+        if cache is not None:
+            cache.store(file_path, pd.DataFrame({'column': header}), 'header', fingerprint)
+            cache.store(file_path, keys, 'keys', fingerprint)
+        return dataset
+
+    @staticmethod
+    def _find_columns(header, column_validator, column_types):
+        """Resuelve los nombres de columna a partir del encabezado."""
+        try:
+            return column_validator.validate_required_columns(
+                pd.DataFrame(columns=header), column_types
+            )
+        except ValueError as e:
+            raise Exception(f"Error en la validación de columnas: {str(e)}")
+
+    def _resolve_columns(self):
+        """Resuelve las columnas requeridas y opcionales desde el encabezado."""
+        self.columns = self._find_columns(self.header, self.column_validator, self.REQUIRED_COLUMNS)
+
+        header_df = pd.DataFrame(columns=self.header)
+        for col_type in self.OPTIONAL_COLUMNS:
+            try:
+                found_col = self.column_validator.find_column(header_df, col_type, raise_error=False)
+            except Exception:
+                found_col = None
+            if found_col:
+                self.columns[col_type] = found_col
+
+    def _load_keys(self, keys):
+        """Valida y limpia las columnas de centro y PLU."""
+        # Verificar si hay datos
+        if keys.empty:
+            raise Exception("El archivo Excel está vacío")
+
+        # Verificar valores nulos
+        null_counts = keys[[self.centro_col, self.plu_col]].isnull().sum()
+        if null_counts.any():
+            null_info = "\n".join([
+                f"{col}: {count} valores nulos"
+                for col, count in null_counts.items()
+                if count > 0
+            ])
+            raise Exception(f"Se encontraron valores nulos en:\n{null_info}")
+
+        # Centros y PLUs limpios, calculados una sola vez
+        self.centers = keys[self.centro_col].astype(str).str.strip()
+        self.plus = keys[self.plu_col].astype(str).str.strip()
+
+    @property
+    def centro_col(self):
+        return self.columns['CENTRO']
+
+    @property
+    def plu_col(self):
+        return self.columns['PLU_SAP']
+
+    @property
+    def df(self):
+        """Hoja Sheet1 completa, leída la primera vez que se necesita."""
+        if self._df is None:
+            df = self._load_cached('Sheet1')
+            if df is None:
+                df = pd.read_excel(self.file_path, sheet_name=self.SHEET_NAME)
+                df.columns = [str(col) for col in df.columns]
+                self._store_cached('Sheet1', df)
+            self._df = df
+        return self._df
+
+    def get_column(self, col_type):
+        """Nombre original de la columna de un tipo, o None si no existe."""
+        return self.columns.get(col_type)
+
+    def center_mask(self, centers):
+        """Máscara booleana de las filas de analysis_frame() de los centros dados."""
+        return self.analysis_frame()['Centro'].isin({str(c).strip() for c in centers})
+
+    def analysis_frame(self):
+        """
+        DataFrame con las columnas de jerarquía en formato estándar.
+
+        Solo lee del archivo las columnas de jerarquía que existen; las que
+        faltan se rellenan con '-'. El resultado se calcula una vez y se
+        comparte; no debe modificarse.
+        """
+        if self._analysis_frame is None:
+            frame = self._load_cached('analysis')
+            if frame is None:
+                col_types = [col_type for col_type in self.ANALYSIS_COLUMNS if col_type in self.columns]
+                _, raw = read_sheet_columns(
+                    self.file_path,
+                    self.SHEET_NAME,
+                    [self.columns[col_type] for col_type in col_types]
+                )
+                data = {}
+                for col_type, std_name in self.ANALYSIS_COLUMNS.items():
+                    if col_type in self.columns:
+                        data[std_name] = raw[self.columns[col_type]].fillna('-').astype(str).str.strip()
+                    else:
+                        data[std_name] = '-'
+                frame = pd.DataFrame(data, index=raw.index)
+                self._store_cached('analysis', frame)
+            self._analysis_frame = frame
+        return self._analysis_frame
+
+    def _load_cached(self, variant):
+        if self.cache is None:
+            return None
+        return self.cache.load(self.file_path, variant, self.fingerprint)
+
+    def _store_cached(self, variant, df):
+        if self.cache is not None:
+            self.cache.store(self.file_path, df, variant, self.fingerprint)
+
+    def encode_portfolios(self):
+        """
+        Codifica centros y PLUs como enteros.
+
+        Returns:
+            tuple: (center_labels, plu_labels, plu_codes, bounds)
+                - center_labels: Centros ordenados; el código de un centro es su posición
+                - plu_labels: PLUs ordenados; el código de un PLU es su posición
+                - plu_codes: Códigos de PLU sin repetir, ordenados por centro y PLU
+                - bounds: Los PLUs del centro k son plu_codes[bounds[k]:bounds[k + 1]]
+        """
+        if self._codes is None:
+            center_codes, center_labels = pd.factorize(self.centers, sort=True)
+            plu_codes, plu_labels = pd.factorize(self.plus, sort=True)
+
+            # Pares (centro, PLU) únicos ordenados en un solo arreglo de claves
+            n_plus = len(plu_labels)
+            pair_keys = np.unique(center_codes.astype(np.int64) * n_plus + plu_codes)
+            pair_centers = pair_keys // n_plus
+            bounds = np.searchsorted(pair_centers, np.arange(len(center_labels) + 1))
+
+            self._codes = (
+                np.asarray(center_labels, dtype=object),
+                np.asarray(plu_labels, dtype=object),
+                pair_keys % n_plus,
+                bounds
+            )
+        return self._codes
+
+    def plu_index(self):
+        """Índice de bits de todos los PLUs del archivo (ver BitPortfolio)."""
+        if self._plu_index is None:
+            self._plu_index = PluIndex(self.encode_portfolios()[1])
+        return self._plu_index
+
+    def find_identical_and_unique_portfolios(self):
+        """
+        Agrupa los centros por portafolio.
+
+        Cada portafolio se resume en una firma de 64 bits (suma de pesos
+        aleatorios de sus PLUs combinada con su tamaño), de modo que los
+        portafolios idénticos se encuentran con una sola agrupación de firmas.
+        Las coincidencias se verifican comparando los códigos de PLU.
+
+        Returns:
+            tuple: (identical_portfolios, unique_portfolios)
+                - identical_portfolios: {tupla de centros: BitPortfolio}
+                - unique_portfolios: {centro: BitPortfolio}
+        """
+        if self._portfolios is None:
+            center_labels, plu_labels, plu_codes, bounds = self.encode_portfolios()
+            plu_index = self.plu_index()
+            sizes = np.diff(bounds).astype(np.uint64)
+
+            # Firma por centro (la aritmética de uint64 es módulo 2**64)
+            weights = np.random.default_rng(0).integers(
+                1, np.iinfo(np.int64).max, size=len(plu_labels), dtype=np.int64
+            ).astype(np.uint64)
+            signatures = np.add.reduceat(weights[plu_codes], bounds[:-1])
+            signatures = signatures * np.uint64(0x9E3779B97F4A7C15) ^ sizes
+
+            _, inverse, counts = np.unique(signatures, return_inverse=True, return_counts=True)
+            by_signature = np.argsort(inverse, kind='stable')
+            signature_bounds = np.concatenate(([0], np.cumsum(counts)))
+
+            def center_plus(center):
+                return plu_codes[bounds[center]:bounds[center + 1]]
+
+            # Portafolios como listas de centros (en orden de código)
+            portfolios = []
+            for g in range(len(counts)):
+                members = by_signature[signature_bounds[g]:signature_bounds[g + 1]]
+                if len(members) == 1:
+                    portfolios.append([members[0]])
+                    continue
+
+                # Verificar la firma comparando los PLUs exactos
+                exact = {}
+                for center in members:
+                    exact.setdefault(center_plus(center).tobytes(), []).append(center)
+                portfolios.extend(exact.values())
+
+            # Mismo orden que antes: por el primer centro de cada portafolio
+            portfolios.sort(key=lambda members: members[0])
+
+            identical_portfolios = {}
+            unique_portfolios = {}
+            for members in portfolios:
+                codes = center_plus(members[0])
+                plus = BitPortfolio(plu_index.encode_codes(codes), plu_index, len(codes))
+                if len(members) > 1:
+                    identical_portfolios[tuple(center_labels[members])] = plus
+                else:
+                    unique_portfolios[center_labels[members[0]]] = plus
+
+            self._portfolios = (identical_portfolios, unique_portfolios)
+        return self._portfolios
+
+    def center_index(self):
+        """Índice centro → portafolio (CenterIndex) de este archivo."""
+        if self._center_index is None:
+            self._center_index = CenterIndex(*self.find_identical_and_unique_portfolios())
+        return self._center_index
@@ -0,0 +1,1230 @@
+# src/portfolio_engine.py
+import os
+
+from analysis_cache import AnalysisResultsCache
+from analysis_pipeline import AnalysisPipeline
+from base_app import BaseApp
+from cancellation import OperationCancelled
+from column_validator import ColumnValidator
+from component_grouping import ComponentGrouping
+from dataset_cache import DatasetCache
+from geo_grouping import GeoPartitionGrouping
+from lazy_loader import LazyLoader
+from limit_sweep import LimitSweep
+from local_search import GroupImprover
+from pair_search import PairSearch, measure_recall
+from portfolio_bits import BitPortfolio
+from portfolio_dataset import PortfolioDataset
+
+pd = LazyLoader('pandas')
+
+
+class PortfolioEngine(BaseApp):
+    """
+    Motor de agrupación de portafolios sin interfaz gráfica.
+
+    Reúne la lectura del archivo, la detección de portafolios idénticos y
+    únicos, las recomendaciones, las fusiones, los grupos finales y la
+    optimización geográfica. La aplicación de escritorio, la línea de
+    comandos (portfolio_cli) y ExcelExporter trabajan sobre una instancia de
+    esta clase; nada aquí usa Tk ni muestra mensajes.
+    """
+
+    def __init__(self, column_validator=None, dataset_cache=None, plu_limit=10):
+        self.column_validator = column_validator if column_validator is not None else ColumnValidator()
+        self.current_plu_limit = plu_limit
+
+        # Resultados del último análisis
+        self.file_path = None
+        self.identical_portfolios = {}
+        self.unique_portfolios = {}
+        self.recommendations = []
+        self.non_compatible = []
+
+        # Datos del archivo analizado (se leen una sola vez por análisis) e
+        # índice centro → portafolio, que se reemplaza con cada archivo
+        self.dataset = None
+        self.center_index = None
+        self.dataset_cache = dataset_cache if dataset_cache is not None else DatasetCache()
+
+        # Grupos finales ya calculados por (huella del archivo, límite de PLUs)
+        self.analysis_cache = AnalysisResultsCache()
+        self.analysis_fingerprint = None
+
+        # Etapas del análisis con caché propia: cambiar el límite de PLUs
+        # solo recalcula las etapas que dependen de él
+        self.analysis_pipeline = self._create_analysis_pipeline()
+
+        # Curva de másteres por límite de PLUs (un LimitSweep por archivo analizado)
+        self.limit_sweep = None
+        self.limit_sweep_results = []
+        self.limit_sweep_stats = {}
+
+        # Búsqueda de pares de portafolios cercanos (ver PairSearch.METHODS);
+        # 'minhash' es la vista previa aproximada y pair_search_recall su exhaustividad
+        self.pair_search_method = 'auto'
+        self.pair_search_recall = PairSearch.DEFAULT_RECALL
+        # Procesos para la búsqueda de pares (no cambia el resultado, solo el tiempo)
+        self.pair_search_workers = 1
+        self.pair_search_stats = {}
+        # Algoritmo de los grupos finales (ver GROUPING_METHODS)
+        self.grouping_method = 'greedy'
+        # Procesos para agrupar las componentes del grafo de pares (ver ComponentGrouping)
+        self.grouping_workers = 1
+        # Partición geográfica opcional de la agrupación ('Distrito' o 'Region',
+        # ver GeoPartitionGrouping) y fusiones entre particiones al final
+        self.grouping_partition = None
+        self.grouping_cross_merge = True
+        self.grouping_stats = {}
+        # Segundos de mejora local de los grupos finales (0 = sin mejora, ver GroupImprover)
+        self.improve_seconds = 0
+        self.improve_stats = {}
+        # Optimización geográfica de grupos pequeños al final del análisis
+        # (ver optimize_groups_by_geography)
+        self.geo_optimization = False
+
+    def analyze(self, file_path, plu_limit, report=None, cancel_token=None):
+        """
+        Análisis completo de un archivo con un límite de PLUs.
+
+        Solo se recalculan las etapas afectadas por lo que cambió desde el
+        análisis anterior (archivo, límite, opciones de búsqueda de pares y de
+        agrupación o datos maestros).
+
+        Args:
+            file_path: Archivo Excel con la hoja Sheet1
+            plu_limit: Máximo de PLUs diferentes por grupo
+            report: Función opcional report(mensaje) para informar el avance
+            cancel_token: CancellationToken opcional
+
+        Returns:
+            dict: 'identical_portfolios', 'unique_portfolios', 'merges',
+                'final_groups' y 'report_data' (resultados de las etapas), y
+                'geo_optimization' si self.geo_optimization está activo
+        """
+        if report is None:
+            report = lambda message: None
+
+        def report_rows(rows_read, total_rows):
+            if total_rows:
+                report(f"Leyendo filas: {rows_read:,} de {total_rows:,}...")
+            else:
+                report(f"Leyendo filas: {rows_read:,}...")
+
+        self.current_plu_limit = plu_limit
+        identical_portfolios, unique_portfolios = self.find_identical_and_unique_portfolios(
+            file_path,
+            progress_callback=report_rows,
+            cancel_token=cancel_token
+        )
+
+        # Obtener recomendaciones y fusiones (solo se recalculan si cambió
+        # el archivo, el límite o el método de búsqueda de pares)
+        report("Generando recomendaciones...")
+        self.set_analysis_limit(plu_limit)
+        merges = self.analysis_pipeline.run('merges')
+        self.recommendations = merges['recommendations']
+
+        report("Calculando estadísticas...")
+        final_groups = self.analysis_pipeline.run('final_groups')
+        self.non_compatible = list(final_groups['non_compatible'])
+        report_data = self.analysis_pipeline.run('report_data')
+        results = {
+            'identical_portfolios': identical_portfolios,
+            'unique_portfolios': unique_portfolios,
+            'merges': merges,
+            'final_groups': final_groups,
+            'report_data': report_data
+        }
+        if self.geo_optimization:
+            report("Optimizando grupos por geografía...")
+            results['geo_optimization'] = self.analysis_pipeline.run('geo_optimization')
+        print("Etapas del análisis: " + ", ".join(
+            f"{name} {status}" for name, status in self.analysis_pipeline.last_run.items()
+        ))
+        return results
+
+    def find_identical_and_unique_portfolios(self, file_path, progress_callback=None, cancel_token=None):
+        try:
+            # El archivo solo se vuelve a leer si cambió su contenido
+            fingerprint = DatasetCache.fingerprint(file_path)
+            self.analysis_pipeline.set_param('file_path', file_path, key=fingerprint)
+            self.analysis_pipeline.set_param('progress_callback', progress_callback, key='')
+            self.analysis_pipeline.set_param('cancel_token', cancel_token, key='')
+            self.analysis_pipeline.last_run.clear()
+            portfolios = self.analysis_pipeline.run('portfolios')
+            
+            self.file_path = file_path
+            self.dataset = portfolios['dataset']
+            self.identical_portfolios = portfolios['identical']
+            self.unique_portfolios = portfolios['unique']
+            self.center_index = portfolios['center_index']
+            if fingerprint != self.analysis_fingerprint:
+                self.limit_sweep_results = []
+            self.analysis_fingerprint = fingerprint
+            return portfolios['identical'], portfolios['unique']
+            
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Error al procesar el archivo Excel: {str(e)}")
+
+    def _create_analysis_pipeline(self):
+        """
+        Define las etapas del análisis:
+        ingest → portfolios → candidate_pairs → merges, final_groups →
+        geo_optimization, report_data.
+
+        Cada etapa depende solo de sus entradas y parámetros: 'grouping' lleva
+        las opciones de agrupación y 'geo_data' la ruta de los datos maestros,
+        con la huella del archivo como clave (si cambian, se recalculan las
+        etapas que los usan).
+        """
+        pipeline = AnalysisPipeline()
+        pipeline.add_stage('ingest', self._stage_ingest, params=('file_path', 'progress_callback', 'cancel_token'))
+        pipeline.add_stage('portfolios', self._stage_portfolios, inputs=('ingest',))
+        pipeline.add_stage(
+            'candidate_pairs', self._stage_candidate_pairs, inputs=('portfolios',),
+            params=('plu_limit', 'pair_search_method', 'pair_search_recall', 'cancel_token')
+        )
+        pipeline.add_stage(
+            'merges', self._stage_merges, inputs=('portfolios', 'candidate_pairs'),
+            params=('plu_limit', 'cancel_token')
+        )
+        pipeline.add_stage(
+            'final_groups', self._stage_final_groups, inputs=('portfolios',),
+            params=('plu_limit', 'grouping', 'cancel_token')
+        )
+        pipeline.add_stage(
+            'geo_optimization', self._stage_geo_optimization, inputs=('final_groups',),
+            params=('geo_data',)
+        )
+        pipeline.add_stage('report_data', self._stage_report_data, inputs=('portfolios', 'merges', 'final_groups'))
+        return pipeline
+
+    def set_analysis_limit(self, plu_limit):
+        """Asigna el límite y las opciones de búsqueda y agrupación a las etapas que los usan."""
+        self.analysis_pipeline.set_param('plu_limit', plu_limit)
+        self.analysis_pipeline.set_param('pair_search_method', self.pair_search_method)
+        self.analysis_pipeline.set_param('pair_search_recall', self.pair_search_recall)
+        self.analysis_pipeline.set_param('grouping', self.grouping_options(), key=self.grouping_key())
+        geo_path = self.geographic_data_path()
+        self.analysis_pipeline.set_param(
+            'geo_data', geo_path, key=DatasetCache.fingerprint(geo_path) if geo_path is not None else ''
+        )
+
+    def _stage_ingest(self, file_path, progress_callback, cancel_token):
+        def report_rows(rows_read, total_rows):
+            # La lectura se puede cancelar cada vez que informa su avance
+            if cancel_token is not None:
+                cancel_token.check()
+            if progress_callback is not None:
+                progress_callback(rows_read, total_rows)
+        
+        # Leer el archivo una sola vez para todo el análisis (solo CENTRO y PLU_SAP)
+        return PortfolioDataset.from_excel(
+            file_path,
+            self.column_validator,
+            cache=self.dataset_cache,
+            progress_callback=report_rows,
+            fingerprint=self.analysis_pipeline.param_key('file_path')
+        )
+
+    def _stage_portfolios(self, dataset):
+        identical, unique = dataset.find_identical_and_unique_portfolios()
+        return {
+            'dataset': dataset,
+            'identical': identical,
+            'unique': unique,
+            'center_index': dataset.center_index()
+        }
+
+    def _stage_candidate_pairs(self, portfolios, plu_limit, pair_search_method, pair_search_recall, cancel_token):
+        # Pares que no dependen de asignaciones previas; pair_search_method y
+        # pair_search_recall son los de self (se reciben para la huella de la etapa)
+        group_portfolios = list(portfolios['identical'].values())
+        return {
+            'centers_groups': self.find_close_pairs(
+                "Centros únicos con grupos", list(portfolios['unique'].values()), plu_limit,
+                others=group_portfolios, cancel_token=cancel_token
+            ),
+            'groups': self.find_close_pairs(
+                "Fusiones de grupos", group_portfolios, plu_limit, cancel_token=cancel_token
+            )
+        }
+
+    def _stage_merges(self, portfolios, candidate_pairs, plu_limit, cancel_token):
+        recommendations, non_compatible, unique_groups = self.analyze_unique_portfolios(
+            portfolios['identical'],
+            portfolios['unique'],
+            plu_limit,
+            close_pairs=candidate_pairs['centers_groups'],
+            cancel_token=cancel_token
+        )
+        group_recommendations = self.analyze_group_mergers(
+            plu_limit, close_pairs=candidate_pairs['groups'], cancel_token=cancel_token
+        )
+        return {
+            'recommendations': recommendations,
+            'non_compatible': non_compatible,
+            'unique_groups': unique_groups,
+            'group_recommendations': group_recommendations
+        }
+
+    def _stage_final_groups(self, portfolios, plu_limit, grouping, cancel_token):
+        final_groups, non_compatible = self._final_groups_result(
+            portfolios['dataset'].fingerprint, portfolios['identical'], portfolios['unique'],
+            plu_limit, grouping, cancel_token
+        )
+        return {'groups': final_groups, 'non_compatible': non_compatible}
+
+    def _stage_geo_optimization(self, final_groups, geo_data):
+        geo_data = self.load_geographic_data(geo_data) if geo_data is not None else None
+        if geo_data is None:
+            print("Error en optimize_groups_by_geography: No se pudieron cargar los datos geográficos")
+            return None
+        return self.optimize_groups_by_geography(
+            final_groups['groups'], final_groups['non_compatible'], geo_data
+        )
+
+    def _stage_report_data(self, portfolios, merges, final_groups):
+        unique_count = len(portfolios['unique'])
+        identical_count = sum(len(centers) for centers in portfolios['identical'].keys())
+        groups = final_groups['groups']
+        if not groups and not final_groups['non_compatible']:
+            # Si no hay grupos finales ni centros no compatibles, crear un grupo vacío
+            groups = [{'centers': set(), 'plus': set()}]
+        return {
+            'unique_count': unique_count,
+            'identical_count': identical_count,
+            'initial_masters': len(portfolios['identical']) + unique_count,
+            'final_masters': len(groups) + len(final_groups['non_compatible'])
+        }
+
+    def get_dataset(self, file_path=None):
+        """
+        Obtener el dataset de un archivo (por defecto, el último analizado),
+        leyéndolo solo si no está cargado.
+        """
+        if file_path is None:
+            file_path = self.file_path
+        if self.dataset is None or self.dataset.file_path != file_path:
+            self.dataset = PortfolioDataset.from_excel(
+                file_path, self.column_validator, cache=self.dataset_cache
+            )
+        return self.dataset
+
+    def calculate_plu_differences_multi(self, centers_plus_dict):
+        """
+        Calcula la diferencia simétrica de PLUs entre múltiples centros.
+        
+        Args:
+            centers_plus_dict: Diccionario donde las claves son los centros y los valores son sus
+                portafolios (BitPortfolio o set de PLUs)
+            
+        Returns:
+            tuple: (symmetric_diff_size, center_ref, all_differences)
+                - symmetric_diff_size: Tamaño de la diferencia simétrica
+                - center_ref: Centro de referencia (primer centro)
+                - all_differences: Conjunto de todos los PLUs diferentes entre los centros
+        """
+        if len(centers_plus_dict) < 2:
+            return 0, None, set()
+        
+        # Tomar el primer conjunto como referencia
+        center_ref, base_plus = next(iter(centers_plus_dict.items()))
+        all_differences = None
+        
+        # Calcular diferencia simétrica acumulativa (XOR de bits entre BitPortfolio)
+        for center, plus_set in centers_plus_dict.items():
+            if center != center_ref:
+                diff = base_plus ^ plus_set
+                all_differences = diff if all_differences is None else all_differences | diff
+        
+        return len(all_differences), center_ref, all_differences
+
+    def find_close_pairs(self, stage, portfolios, plu_limit, others=None, cancel_token=None):
+        """
+        Busca los pares de portafolios con a lo sumo plu_limit PLUs diferentes.
+        
+        Args:
+            stage: Nombre de la etapa, para las estadísticas
+            portfolios: Lista de BitPortfolio
+            plu_limit: Máximo de PLUs diferentes
+            others: Segunda lista de BitPortfolio; si se indica, cada par tiene
+                un portafolio de cada lista
+            cancel_token: CancellationToken opcional
+            
+        Returns:
+            ClosePairs: Pares (i, j, distancia) con posiciones en las listas
+        """
+        options = {
+            'method': self.pair_search_method,
+            'recall': self.pair_search_recall,
+            'cancel_token': cancel_token,
+            'workers': self.pair_search_workers
+        }
+        search = PairSearch(portfolios, **options)
+        other_search = PairSearch(others, **options) if others is not None else None
+        close_pairs = search.find_pairs(plu_limit, other_search)
+        
+        stats = close_pairs.stats
+        self.pair_search_stats[stage] = stats
+        print(f"{stage}: {stats['pairs']} pares dentro del límite de {stats['total_pairs']} "
+              f"({stats['pruned']} descartados sin comparar, método {stats['method']}, "
+              f"{stats['seconds']:.2f}s)")
+        if stats['method'] == 'minhash':
+            print(f"  Búsqueda aproximada: recall esperado {stats['expected_recall']:.1%} "
+                  f"({stats['bands']} bandas de {stats['rows']} filas)")
+        return close_pairs
+
+    def report_pair_search_recall(self, plu_limit):
+        """
+        Mide el recall de la vista previa aproximada frente a la búsqueda exacta,
+        con todos los portafolios distintos del archivo analizado.
+        
+        Returns:
+            dict: Informe de measure_recall
+        """
+        portfolios = list(self.identical_portfolios.values()) + list(self.unique_portfolios.values())
+        report = measure_recall(portfolios, plu_limit, recall=self.pair_search_recall)
+        
+        print(f"\nRecall de la búsqueda aproximada (límite {plu_limit} PLUs):")
+        print(f"Pares exactos: {report['exact_pairs']} ({report['exact_method']}, {report['exact_seconds']:.2f}s)")
+        print(f"Pares encontrados: {report['found_pairs']} (minhash, {report['approximate_seconds']:.2f}s)")
+        print(f"Recall medido: {report['recall']:.1%} (esperado {report['expected_recall']:.1%})")
+        return report
+
+    def analyze_group_mergers(self, plu_limit, close_pairs=None, cancel_token=None):
+        """
+        Encuentra fusiones de grupos usando un enfoque voraz optimizado.
+        Solo une grupos cuya diferencia simétrica total no supere plu_limit PLUs.
+
+        close_pairs: pares de grupos ya calculados (etapa candidate_pairs), opcional.
+        cancel_token: CancellationToken opcional.
+        """
+        group_recommendations = []
+        groups = list(self.identical_portfolios.items())
+        n = len(groups)
+        used_groups = set()
+
+        # Vecinos de cada grupo (solo índices); la diferencia de un par se
+        # calcula con XOR de sus bits cuando hace falta, sin guardarla
+        group_bits = [plus.bits for _, plus in groups]
+        if close_pairs is None:
+            close_pairs = self.find_close_pairs(
+                "Fusiones de grupos", [plus for _, plus in groups], plu_limit, cancel_token=cancel_token
+            )
+        neighbors = [[] for _ in range(n)]
+        for i, j, _ in close_pairs:
+            neighbors[i].append(j)
+            neighbors[j].append(i)
+        
+        def build_group_from_seed(seed_idx):
+            """Construye un grupo comenzando desde un grupo semilla."""
+            if seed_idx in used_groups:
+                return None
+                
+            current_group = {seed_idx}
+            current_differences = 0
+            
+            # Para cada candidato, unión de las diferencias con los miembros del
+            # grupo a los que está conectado; se actualiza al agregar un miembro
+            candidate_diffs = {}
+            
+            def add_connections(member):
+                member_bits = group_bits[member]
+                for connected_idx in neighbors[member]:
+                    candidate_diffs[connected_idx] = (
+                        candidate_diffs.get(connected_idx, 0) | (member_bits ^ group_bits[connected_idx])
+                    )
+            
+            add_connections(seed_idx)
+            
+            # Conjunto de grupos candidatos conectados al grupo actual
+            candidates = set(neighbors[seed_idx])
+            
+            while candidates:
+                best_addition = None
+                min_new_diffs = float('inf')
+                best_total_diffs = None
+                
+                # Probar cada candidato
+                for candidate in candidates:
+                    if candidate in used_groups:
+                        continue
+                    
+                    # Nuevas diferencias al agregar este candidato
+                    test_diffs = current_differences | candidate_diffs[candidate]
+                    n_diffs = test_diffs.bit_count()
+                    if n_diffs <= plu_limit and n_diffs < min_new_diffs:
+                        min_new_diffs = n_diffs
+                        best_addition = candidate
+                        best_total_diffs = test_diffs
+                
+                if best_addition is None:
+                    break
+                    
+                # Agregar el mejor candidato al grupo
+                current_group.add(best_addition)
+                current_differences = best_total_diffs
+                add_connections(best_addition)
+                
+                # Actualizar candidatos con nuevas conexiones
+                candidates = (candidates | set(neighbors[best_addition])) - current_group - used_groups
+            
+            if len(current_group) > 1:
+                return {
+                    'groups': [groups[idx][0] for idx in current_group],
+                    'differences': BitPortfolio(current_differences, groups[seed_idx][1].index),
+                    'indices': current_group
+                }
+            return None
+
+        # Procesar grupos en orden de más conexiones a menos
+        group_order = sorted(
+            range(n), 
+            key=lambda x: len(neighbors[x]), 
+            reverse=True
+        )
+        
+        # Construir grupos
+        for seed_idx in group_order:
+            if cancel_token is not None:
+                cancel_token.check()
+            result = build_group_from_seed(seed_idx)
+            if result:
+                group_recommendations.append({
+                    'Groups': result['groups'],
+                    'PLU_Differences': sorted(list(result['differences']))
+                })
+                used_groups.update(result['indices'])
+                
+                # Verificar si ya procesamos todos los grupos
+                if len(used_groups) == n:
+                    break
+
+        return group_recommendations
+
+    def analyze_unique_portfolios(self, identical_portfolios, unique_portfolios, plu_limit, close_pairs=None,
+                                  cancel_token=None):
+        """
+        Analiza los portafolios únicos con enfoque optimizado.
+        Usa límite de 10 PLUs para diferencias simétricas.
+
+        close_pairs: pares centro-grupo ya calculados (etapa candidate_pairs), opcional.
+        cancel_token: CancellationToken opcional.
+        """
+        recommendations = []
+        non_compatible = []
+        assigned_centers = set()
+        unique_groups = []
+        
+        # Convertir grupos existentes a formato manejable
+        existing_groups = []
+        for idx, (centers, plu_set) in enumerate(identical_portfolios.items()):
+            existing_groups.append({
+                'centers': set(centers),
+                'plus': plu_set,
+                'group_number': idx + 1
+            })
+        
+        # Pre-calcular diferencias para centros únicos (solo pares centro-grupo dentro del límite)
+        center_list = list(unique_portfolios)
+        if close_pairs is None:
+            close_pairs = self.find_close_pairs(
+                "Centros únicos con grupos",
+                [unique_portfolios[center] for center in center_list],
+                plu_limit,
+                others=[group['plus'] for group in existing_groups],
+                cancel_token=cancel_token
+            )
+        
+        # Mejor grupo de cada centro: el de menor diferencia (el primero en caso de empate)
+        best_groups = {}
+        for i, group_idx, diff_size in close_pairs:
+            if i not in best_groups or diff_size < best_groups[i][1]:
+                best_groups[i] = (group_idx, diff_size)
+        
+        center_differences = {}
+        for i, center in enumerate(center_list):
+            if i in best_groups:
+                group_idx, best_diff = best_groups[i]
+                best_group = existing_groups[group_idx]
+                center_plus = unique_portfolios[center]
+                center_differences[center] = {
+                    'group': best_group,
+                    'differences': BitPortfolio(
+                        center_plus.bits ^ best_group['plus'].bits, center_plus.index, best_diff
+                    ),
+                    'diff_size': best_diff
+                }
+        
+        # Asignar centros a grupos existentes basado en las mejores diferencias
+        for center, data in sorted(
+            center_differences.items(), 
+            key=lambda x: x[1]['diff_size']
+        ):
+            if center not in assigned_centers:
+                recommendations.append({
+                    'Centro Único': center,
+                    'Grupo Sugerido': tuple(sorted(data['group']['centers'])),
+                    'Grupo Número': data['group']['group_number'],
+                    'PLU Diferentes': sorted(list(data['differences']))
+                })
+                assigned_centers.add(center)
+        
+        # Procesar centros restantes para nuevos grupos
+        remaining_centers = set(unique_portfolios.keys()) - assigned_centers
+        
+        # Pre-calcular diferencias entre centros restantes
+        remaining_list = list(remaining_centers)
+        remaining_connections = {center: [] for center in remaining_list}
+        close_pairs = self.find_close_pairs(
+            "Centros restantes",
+            [unique_portfolios[center] for center in remaining_list],
+            plu_limit,
+            cancel_token=cancel_token
+        )
+        for i, j, _ in close_pairs:
+            center1, center2 = remaining_list[i], remaining_list[j]
+            diff = unique_portfolios[center1].bits ^ unique_portfolios[center2].bits
+            remaining_connections[center1].append((center2, diff))
+            remaining_connections[center2].append((center1, diff))
+        
+        # Semillas de más conexiones a menos (en caso de empate, en el orden de
+        # remaining_list): el mismo orden que elegir cada vez la de más
+        # conexiones entre las restantes, sin recorrerlas todas en cada paso
+        seed_order = sorted(remaining_list, key=lambda x: len(remaining_connections[x]), reverse=True)
+        
+        # Construir nuevos grupos usando enfoque voraz
+        for seed_center in seed_order:
+            if seed_center not in remaining_centers:
+                continue
+            if cancel_token is not None:
+                cancel_token.check()
+            
+            current_group = {seed_center}
+            current_differences = 0
+            candidates = set(c for c, _ in remaining_connections.get(seed_center, []))
+            
+            while candidates:
+                best_addition = None
+                min_new_diffs = float('inf')
+                best_total_diffs = None
+                
+                for candidate in candidates:
+                    if candidate not in remaining_centers:
+                        continue
+                    
+                    # Calcular nuevas diferencias
+                    new_diff = unique_portfolios[seed_center].bits ^ unique_portfolios[candidate].bits
+                    test_diffs = current_differences | new_diff
+                    
+                    n_diffs = test_diffs.bit_count()
+                    if n_diffs <= plu_limit and n_diffs < min_new_diffs:  # Cambiado a 10 PLUs
+                        min_new_diffs = n_diffs
+                        best_addition = candidate
+                        best_total_diffs = test_diffs
+                
+                if best_addition is None:
+                    break
+                    
+                current_group.add(best_addition)
+                current_differences = best_total_diffs
+                candidates = set(c for c, _ in remaining_connections.get(best_addition, [])) - current_group
+            
+            # Procesar el grupo formado
+            if len(current_group) > 1:
+                unique_groups.append({
+                    'Centros': sorted(list(current_group)),
+                    'PLU Diferentes': sorted(list(
+                        BitPortfolio(current_differences, unique_portfolios[seed_center].index)
+                    ))
+                })
+            else:
+                non_compatible.extend(current_group)
+                
+            # Remover centros procesados
+            remaining_centers -= current_group
+        
+        return recommendations, sorted(non_compatible), unique_groups
+
+    def calculate_total_different_plus(self, centers_list):
+        """
+        Calcula el total de PLUs diferentes en un grupo de centros.
+        Un PLU es diferente si está presente en algunos centros pero no en todos.
+        
+        Args:
+            centers_list: Conjunto de centros a analizar
+            
+        Returns:
+            tuple: (different_plus, all_plus)
+                - different_plus: BitPortfolio con los PLUs que difieren entre centros
+                - all_plus: BitPortfolio con todos los PLUs del grupo
+        """
+        # Obtener PLUs de cada centro
+        centers_plus = {}
+        for center in centers_list:
+            portfolio = self.center_index.portfolio(center)
+            if portfolio is not None:
+                centers_plus[center] = portfolio
+        
+        # Encontrar PLUs presentes en todos los centros y PLUs diferentes
+        if not centers_plus:
+            return set(), set()
+        
+        # Unión e intersección como OR/AND de los bits de cada portafolio
+        portfolios = list(centers_plus.values())
+        all_plus = portfolios[0].union(*portfolios[1:])
+        common_plus = portfolios[0].intersection(*portfolios[1:])
+        different_plus = all_plus - common_plus
+        
+        return different_plus, all_plus
+
+    def calculate_final_groups(self, plu_limit, cancel_token=None):
+        """
+        Calcula los grupos finales donde cada grupo puede tener máximo 10 PLUs diferentes en total.
+        Un PLU se considera diferente si está presente en algunos centros del grupo pero no en otros.
+
+        El resultado se calcula una vez por archivo, límite y método de agrupación
+        (analysis_cache); las llamadas siguientes de pestañas, reportes y
+        exportaciones lo reutilizan.
+        
+        Args:
+            plu_limit: Máximo de PLUs diferentes por grupo
+            cancel_token: CancellationToken opcional
+        
+        Returns:
+            list: Lista de grupos finales (vistas de solo lectura con 'centers',
+                'plus' y 'different_plus')
+        """
+        final_groups, non_compatible = self._final_groups_result(
+            self.analysis_fingerprint, self.identical_portfolios, self.unique_portfolios,
+            plu_limit, self.grouping_options(), cancel_token
+        )
+        # Actualizar lista de centros no compatibles
+        self.non_compatible = non_compatible
+        return final_groups
+
+    def _final_groups_result(self, fingerprint, identical_portfolios, unique_portfolios, plu_limit, options,
+                             cancel_token=None):
+        """
+        Grupos finales de unos portafolios (desde analysis_cache si ya se calcularon).
+
+        Args:
+            fingerprint: Huella del archivo analizado (None = sin caché)
+            identical_portfolios, unique_portfolios: Portafolios del archivo
+            plu_limit: Máximo de PLUs diferentes por grupo
+            options: Opciones de agrupación (ver grouping_options)
+            cancel_token: CancellationToken opcional
+
+        Returns:
+            tuple: (grupos finales, lista ordenada de centros no compatibles)
+        """
+        method = options['key']
+        result = self.analysis_cache.get(fingerprint, plu_limit, method) if fingerprint is not None else None
+        if result is None:
+            final_groups, non_compatible = self._compute_final_groups(
+                identical_portfolios, unique_portfolios, plu_limit, options, cancel_token
+            )
+            if fingerprint is None:
+                return final_groups, non_compatible
+            result = self.analysis_cache.store(fingerprint, plu_limit, final_groups, non_compatible, method)
+        return result.final_groups(), list(result.non_compatible)
+
+    def _compute_final_groups(self, identical_portfolios, unique_portfolios, plu_limit, options,
+                              cancel_token=None):
+        """
+        Agrupa los portafolios con el límite y las opciones indicadas e imprime el detalle.
+
+        Returns:
+            tuple: (grupos finales, lista ordenada de centros no compatibles)
+        """
+        if options['partition'] is None:
+            grouping = ComponentGrouping(
+                identical_portfolios, unique_portfolios, method=options['method'],
+                workers=options['workers'], cancel_token=cancel_token
+            )
+        else:
+            geo_data = self.load_geographic_data()
+            if geo_data is None:
+                raise Exception("No se pudieron cargar los datos geográficos para la partición")
+            grouping = GeoPartitionGrouping(
+                identical_portfolios, unique_portfolios, geo_data, key=options['partition'],
+                method=options['method'], workers=options['workers'],
+                cross_merge=options['cross_merge'], cancel_token=cancel_token
+            )
+        accumulators, non_compatible = grouping.run(plu_limit)
+        self.grouping_stats = grouping.stats
+
+        improver = None
+        if options['improve_seconds']:
+            improver = GroupImprover(
+                accumulators, non_compatible, self._center_portfolios(identical_portfolios, unique_portfolios),
+                plu_limit, options['improve_seconds'], cancel_token=cancel_token
+            )
+            accumulators, non_compatible = improver.run()
+        self.improve_stats = improver.stats if improver is not None else {}
+        
+        final_groups = [
+            {
+                'centers': accumulator.centers,
+                'plus': accumulator.all_plus(),
+                'different_plus': accumulator.different_plus()
+            }
+            for accumulator in accumulators
+        ]
+        
+        # Ordenar grupos por tamaño
+        final_groups.sort(key=lambda x: len(x['centers']), reverse=True)
+        
+        # Imprimir estadísticas
+        print("\nDetalle de grupos finales:")
+        for i, group in enumerate(final_groups, 1):
+            diff_plus, all_plus = group['different_plus'], group['plus']
+            print(f"\nGrupo Final {i}:")
+            print(f"Centros ({len(group['centers'])}): {sorted(group['centers'])}")
+            print(f"PLUs diferentes ({len(diff_plus)}): {sorted(diff_plus)}")
+            print(f"Total PLUs en el grupo: {len(all_plus)}")
+        
+        print(f"\nEstadísticas finales (agrupación {options['method']}):")
+        print(f"Grupos idénticos originales: {len(identical_portfolios)}")
+        print(f"Grupos después de fusiones: {len(final_groups)}")
+        print(f"Centros sin agrupar: {len(non_compatible)}")
+        print(f"Total centros agrupados: {sum(len(g['centers']) for g in final_groups)}")
+        stats = grouping.stats
+        if options['partition'] is None:
+            print(f"Componentes: {stats['components']} ({stats['shared_components']} con más "
+                  f"de un portafolio, la mayor con {stats['largest_component']}, {stats['seconds']:.2f}s)")
+        else:
+            print(f"Particiones por {stats['key']}: {stats['partitions']} (la mayor con "
+                  f"{stats['largest_partition']} centros, {stats['possible_pairs']} de {stats['total_pairs']} "
+                  f"pares posibles, {stats['cross_merges']} fusiones entre particiones, {stats['seconds']:.2f}s)")
+        if improver is not None:
+            stats = improver.stats
+            print(f"Mejora local: {stats['improvement']} másteres menos ({stats['masters_before']} -> "
+                  f"{stats['masters_after']}) en {stats['seconds']:.2f}s, "
+                  f"{stats['improvement_per_second']:.2f} por segundo ({stats['dissolved']} grupos disueltos, "
+                  f"{stats['moves']} movimientos, {stats['swaps']} intercambios)")
+        
+        return final_groups, non_compatible
+
+    @staticmethod
+    def _center_portfolios(identical_portfolios, unique_portfolios):
+        """Portafolio de cada centro."""
+        portfolios = dict(unique_portfolios)
+        for centers, portfolio in identical_portfolios.items():
+            for center in centers:
+                portfolios[center] = portfolio
+        return portfolios
+
+    def grouping_options(self):
+        """Opciones de los grupos finales (ver _compute_final_groups) y su clave en 'key'."""
+        return {
+            'method': self.grouping_method,
+            'workers': self.grouping_workers,
+            'partition': self.grouping_partition,
+            'cross_merge': self.grouping_cross_merge,
+            'improve_seconds': self.improve_seconds,
+            'key': self.grouping_key()
+        }
+
+    def grouping_key(self):
+        """
+        Algoritmo, partición y mejora de los grupos finales (para la caché y la huella de la etapa).
+
+        Con partición geográfica incluye la huella de los datos maestros, de
+        donde sale el distrito o la región de cada centro.
+        """
+        key = (self.grouping_method,)
+        if self.grouping_partition is not None:
+            geo_path = self.geographic_data_path()
+            key += (self.grouping_partition, self.grouping_cross_merge,
+                    DatasetCache.fingerprint(geo_path) if geo_path is not None else '')
+        if self.improve_seconds:
+            key += ('mejora', self.improve_seconds)
+        return key[0] if len(key) == 1 else key
+
+    def get_limit_sweep(self):
+        """LimitSweep de los portafolios analizados (se crea de nuevo si cambiaron)."""
+        sweep = self.limit_sweep
+        if (sweep is None
+                or sweep.identical_portfolios is not self.identical_portfolios
+                or sweep.unique_portfolios is not self.unique_portfolios
+                or sweep.method != self.pair_search_method
+                or sweep.recall != self.pair_search_recall
+                or sweep.grouping_method != self.grouping_method):
+            self.limit_sweep = LimitSweep(
+                self.identical_portfolios,
+                self.unique_portfolios,
+                method=self.pair_search_method,
+                recall=self.pair_search_recall,
+                grouping_method=self.grouping_method
+            )
+        return self.limit_sweep
+
+    def limit_sweep_notes(self):
+        """Opciones del análisis que LimitSweep no aplica (su curva y vista previa no las incluyen)."""
+        notes = []
+        if self.grouping_partition is not None:
+            notes.append("sin partición geográfica")
+        if self.improve_seconds:
+            notes.append("sin mejora local")
+        return notes
+
+    def compute_limit_sweep(self, limits, cancel_token=None):
+        """
+        Calcula másteres finales, grupos y centros no compatibles para cada
+        límite con una sola búsqueda de pares (ver LimitSweep).
+        
+        Args:
+            limits: Límites de PLUs diferentes
+            cancel_token: CancellationToken opcional
+        
+        Returns:
+            list: Resultados por límite, de menor a mayor
+        """
+        sweep = self.get_limit_sweep()
+        self.limit_sweep_results = sweep.run(limits, cancel_token)
+        self.limit_sweep_stats = sweep.stats
+        
+        print(f"\nCurva por límite de PLUs ({sweep.stats['pairs']} pares, método {sweep.stats['method']}, "
+              f"{sweep.stats['seconds']:.2f}s):")
+        for result in self.limit_sweep_results:
+            print(f"Límite {result['limit']}: {result['final_masters']} másteres finales "
+                  f"({result['final_groups']} grupos, {result['non_compatible']} centros sin agrupar)")
+        return self.limit_sweep_results
+
+    def geographic_data_path(self):
+        """Ruta de los datos maestros (db_maestrospdv.xlsx), o None si no existen."""
+        try:
+            # Usar el método de la clase base para obtener la ruta del archivo
+            return self.get_data_path("db_maestrospdv.xlsx")
+        except FileNotFoundError:
+            return None
+
+    def load_geographic_data(self, db_file=None):
+        """Cargar datos geográficos desde el archivo Excel (por defecto, los datos maestros)."""
+        try:
+            if db_file is None:
+                db_file = self.get_data_path("db_maestrospdv.xlsx")
+            
+            # Leer archivo
+            df = pd.read_excel(db_file)
+        
+            # Verificar existencia de columnas exactas
+            required_columns = {
+                'Centro': self.column_validator.find_column(df, 'CENTRO'),
+                'Distrito': 'Distrito',  # Nombre exacto
+                'Region': 'Región'       # Nombre exacto con tilde
+            }
+            
+            # Verificar si las columnas existen
+            missing_columns = []
+            for col_name in ['Distrito', 'Región']:
+                if col_name not in df.columns:
+                    missing_columns.append(col_name)
+            
+            if missing_columns:
+                raise ValueError(
+                    f"No se encontraron las siguientes columnas exactas: "
+                    f"{', '.join(missing_columns)}"
+                )
+            
+            # Crear DataFrame con las columnas encontradas
+            result_df = pd.DataFrame({
+                'Centro': df[required_columns['Centro']],
+                'Distrito': df['Distrito'],
+                'Region': df['Región']
+            })
+            
+            # Limpiar datos manteniendo mayúsculas/minúsculas originales
+            for col in result_df.columns:
+                result_df[col] = result_df[col].astype(str).str.strip()
+                
+            result_df = result_df.drop_duplicates()
+            result_df = result_df.dropna()
+            
+            return result_df
+            
+        except Exception as e:
+            print(f"Error al cargar datos geográficos: {str(e)}")
+            return None
+
+    def optimize_groups_by_geography(self, current_groups=None, non_compatible=None, geo_data=None):
+        """
+        Optimiza los grupos pequeños y centros sin recomendación usando criterios geográficos.
+
+        Sin argumentos usa los grupos finales del límite actual y los datos maestros.
+        """
+        try:
+            # Cargar datos geográficos
+            if geo_data is None:
+                geo_data = self.load_geographic_data()
+            if geo_data is None:
+                raise ValueError("No se pudieron cargar los datos geográficos")
+
+            # Obtener grupos finales actuales
+            if current_groups is None:
+                current_groups = self.calculate_final_groups(self.current_plu_limit)
+                non_compatible = self.non_compatible
+            
+            # Identificar grupos pequeños (menos de 10 centros)
+            small_groups = []
+            normal_groups = []
+            for group in current_groups:
+                if len(group['centers']) < 10:
+                    small_groups.append(group)
+                else:
+                    normal_groups.append(group)
+
+            # Recolectar todos los centros que necesitan reasignación
+            centers_to_assign = set()
+            for group in small_groups:
+                centers_to_assign.update(group['centers'])
+            centers_to_assign.update(non_compatible or [])
+
+            # Crear DataFrame con información geográfica solo para los centros relevantes
+            centers_geo = geo_data[geo_data['Centro'].isin(centers_to_assign)].copy()
+            
+            # Crear matriz de similitud geográfica
+            def calculate_geo_similarity(row1, row2):
+                """Calcula similitud geográfica entre dos centros."""
+                score = 0
+                if row1['Distrito'] == row2['Distrito']:
+                    score += 4  # Mayor peso al distrito
+                if row1['Region'] == row2['Region']:
+                    score += 3  # Peso medio-alto a la región
+                if row1['Departamento'] == row2['Departamento']:
+                    score += 2  # Peso medio al departamento
+                if row1['Estrato'] == row2['Estrato']:
+                    score += 1  # Peso menor al estrato
+                return score
+
+            # Crear grupos geográficos optimizados
+            new_groups = []
+            remaining_centers = set(centers_to_assign)
+
+            while remaining_centers:
+                # Tomar un centro como semilla
+                seed_center = remaining_centers.pop()
+                seed_data = centers_geo[centers_geo['Centro'] == seed_center].iloc[0]
+                
+                current_group = {seed_center}
+                
+                # Encontrar centros similares
+                best_matches = []
+                for center in remaining_centers:
+                    center_data = centers_geo[centers_geo['Centro'] == center].iloc[0]
+                    similarity = calculate_geo_similarity(seed_data, center_data)
+                    best_matches.append((center, similarity))
+                
+                # Ordenar por similitud
+                best_matches.sort(key=lambda x: x[1], reverse=True)
+                
+                # Agregar los mejores matches al grupo
+                for center, similarity in best_matches:
+                    if similarity >= 4:  # Mínimo distrito igual
+                        current_group.add(center)
+                        remaining_centers.discard(center)
+                        
+                        # Limitar tamaño del grupo
+                        if len(current_group) >= 20:  # Tamaño máximo razonable
+                            break
+                
+                # Agregar el nuevo grupo
+                if len(current_group) >= 3:  # Mínimo 3 centros por grupo
+                    new_groups.append({
+                        'centers': current_group,
+                        'criteria': {
+                            'Distrito': seed_data['Distrito'],
+                            'Region': seed_data['Region'],
+                            'Departamento': seed_data['Departamento'],
+                            'Estrato': seed_data['Estrato']
+                        }
+                    })
+                else:
+                    # Si el grupo es muy pequeño, intentar unirlo a un grupo existente
+                    best_group = None
+                    best_similarity = -1
+                    
+                    for group in new_groups:
+                        group_center = next(iter(group['centers']))
+                        group_data = centers_geo[centers_geo['Centro'] == group_center].iloc[0]
+                        similarity = calculate_geo_similarity(seed_data, group_data)
+                        
+                        if similarity > best_similarity:
+                            best_similarity = similarity
+                            best_group = group
+                    
+                    if best_group and best_similarity >= 3:
+                        best_group['centers'].update(current_group)
+                    else:
+                        # Si no se puede unir, crear grupo nuevo
+                        new_groups.append({
+                            'centers': current_group,
+                            'criteria': {
+                                'Distrito': seed_data['Distrito'],
+                                'Region': seed_data['Region'],
+                                'Departamento': seed_data['Departamento'],
+                                'Estrato': seed_data['Estrato']
+                            }
+                        })
+
+            # Combinar grupos normales con nuevos grupos
+            final_optimized_groups = normal_groups + new_groups
+            
+            return final_optimized_groups
+            
+        except Exception as e:
+            print(f"Error en optimize_groups_by_geography: {str(e)}")
+            return None
+
+    def group_by_geography(self, centers, geo_data):
+        """
+        Agrupa centros basándose en criterios geográficos estrictos.
+        """
+        groups = []
+        remaining_centers = set(centers)
+        
+        while remaining_centers:
+            # Tomar un centro como semilla
+            seed_center = remaining_centers.pop()
+            seed_data = geo_data[geo_data['Centro'] == seed_center].iloc[0]
+            
+            current_group = {seed_center}
+            current_criteria = {
+                'Distrito': seed_data['Distrito'],
+                'Region': seed_data['Region'],
+                'Departamento': seed_data.get('Departamento', '-')
+            }
+            
+            # Encontrar centros que coincidan exactamente en los criterios
+            for center in list(remaining_centers):
+                center_data = geo_data[geo_data['Centro'] == center].iloc[0]
+                
+                # Verificar coincidencia exacta en los tres criterios principales
+                if (center_data['Distrito'] == current_criteria['Distrito'] and
+                    center_data['Region'] == current_criteria['Region'] and
+                    center_data.get('Departamento', '-') == current_criteria['Departamento']):
+                    current_group.add(center)
+                    remaining_centers.discard(center)
+            
+            # Agregar el grupo independientemente de su tamaño
+            groups.append({
+                'centers': current_group,
+                'criteria': current_criteria
+            })
+        
+        return groups
+
+    def get_group_geo_info(self, centers, geo_data):
+        """
+        Obtiene todos los valores únicos de información geográfica del grupo.
+        """
+        centers_data = geo_data[geo_data['Centro'].isin(centers)]
+        if centers_data.empty:
+            return None
+        
+        # Obtener valores únicos para cada criterio
+        distrito = sorted(centers_data['Distrito'].unique())
+        region = sorted(centers_data['Region'].unique())
+        departamento = sorted(centers_data['Departamento'].unique()) if 'Departamento' in centers_data else ['-']
+        estrato = sorted(centers_data['Estrato'].unique()) if 'Estrato' in centers_data else ['-']
+        
+        # Formatear los valores para mostrarlos
+        return {
+            'Distrito': ' - '.join(distrito),
+            'Region': ' - '.join(region),
+            'Departamento': ' - '.join(departamento),
+            'Estrato': ' - '.join(str(e) for e in estrato)
+        }
+
+    def get_modulation_data(self, centers, category):
+        """
+        Obtiene los datos de modulación para un conjunto de centros y una categoría específica.
+        Incluye centros con datos vacíos y no encontrados.
+        
+        Args:
+            centers (list): Lista de centros a analizar
+            category (str): Categoría a buscar
+            
+        Returns:
+            dict: Diccionario con la estructura {num_modulos: {'count': n, 'centers': [...]}}
+        """
+        try:
+            maestro_file = self.get_data_path("Form.Maestro.Neg.xlsx")
+            
+            if not os.path.exists(maestro_file):
+                raise FileNotFoundError("No se encontró el archivo Form.Maestro.Neg.xlsx")
+            
+            # Convertir centros a set para búsqueda más eficiente
+            centers = set(str(c).strip() for c in centers)
+            
+            # Leer la hoja de MOBILIARIOS
+            df = pd.read_excel(maestro_file, sheet_name='MOBILIARIOS')
+            
+            # Normalizar la categoría y convertir columnas a string
+            category = category.upper().strip()
+            df['CENTRO'] = df['CENTRO'].astype(str).str.strip()
+            df['CATEGORIA'] = df['CATEGORIA'].astype(str).str.upper().str.strip()
+            
+            # Filtrar por categoría
+            df_filtered = df[df['CATEGORIA'] == category]
+            
+            # Identificar diferentes tipos de centros
+            centers_in_excel = set(df_filtered['CENTRO'].unique())
+            centers_with_empty_data = set()
+            centers_with_data = set()
+            
+            # Analizar cada centro en el Excel
+            for center in centers:
+                center_data = df_filtered[df_filtered['CENTRO'] == center]
+                if not center_data.empty:
+                    # Verificar si tiene valor en NÚMERO DE MÓDULOS
+                    if pd.isna(center_data['NÚMERO DE MÓDULOS'].iloc[0]) or center_data['NÚMERO DE MÓDULOS'].iloc[0] == '':
+                        centers_with_empty_data.add(center)
+                    else:
+                        centers_with_data.add(center)
+            
+            # Identificar centros no encontrados
+            centers_not_found = centers - centers_in_excel
+            
+            # Inicializar resultado
+            result = {}
+            
+            # Agregar datos por número de módulos
+            if not df_filtered.empty:
+                for num_modulos, group in df_filtered[df_filtered['CENTRO'].isin(centers_with_data)].groupby('NÚMERO DE MÓDULOS'):
+                    result[str(num_modulos)] = {
+                        'count': len(group),
+                        'centers': sorted(group['CENTRO'].tolist())
+                    }
+            
+            # Agregar centros con datos vacíos
+            if centers_with_empty_data:
+                result['Datos vacíos'] = {
+                    'count': len(centers_with_empty_data),
+                    'centers': sorted(list(centers_with_empty_data))
+                }
+                
+            # Agregar centros no encontrados
+            if centers_not_found:
+                result['No encontrados'] = {
+                    'count': len(centers_not_found),
+                    'centers': sorted(list(centers_not_found))
+                }
+                
+            # Imprimir información de diagnóstico
+            print("\nDiagnóstico de modulación:")
+            print(f"Total centros en grupo: {len(centers)}")
+            print(f"Centros con datos: {len(centers_with_data)}")
+            print(f"Centros con datos vacíos: {len(centers_with_empty_data)}")
+            print(f"Centros no encontrados: {len(centers_not_found)}")
+            
+            return result
+            
+        except Exception as e:
+            print(f"Error al leer datos de modulación: {str(e)}")
+            return None
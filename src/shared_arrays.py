@@ -0,0 +1,121 @@
+# src/shared_arrays.py
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+from lazy_loader import LazyLoader
+
+np = LazyLoader('numpy')
+
+class SharedArrays:
+    """
+    Arreglos de numpy copiados una vez a memoria compartida.
+
+    Los procesos de trabajo reciben solo spec (nombres de los segmentos,
+    formas y tipos) y con attach() obtienen vistas de los mismos datos sin
+    copiarlos, así la memoria no crece al agregar procesos. Se usa como
+    administrador de contexto: al salir se liberan los segmentos.
+    """
+
+    def __init__(self, arrays):
+        """
+        Args:
+            arrays: Diccionario nombre -> arreglo de numpy
+        """
+        self._segments = []
+        self.spec = {}
+        try:
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self._segments.append(segment)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+                self.spec[name] = (segment.name, array.shape, array.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """Libera los segmentos (los procesos que los abrieron conservan sus vistas)."""
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach(spec):
+    """
+    Vistas de solo lectura de los arreglos de un SharedArrays.
+
+    Args:
+        spec: Atributo spec del SharedArrays creado en el proceso principal
+
+    Returns:
+        AttachedArrays: administrador de contexto que entrega el diccionario
+            nombre -> arreglo de numpy sobre la memoria compartida
+    """
+    return AttachedArrays(spec)
+
+
+class AttachedArrays:
+    """
+    Segmentos de un SharedArrays abiertos en un proceso de trabajo.
+
+    Se usa en cada tarea como administrador de contexto: al salir se cierran
+    los segmentos en este proceso, así los procesos de trabajo no acumulan
+    segmentos abiertos. Las vistas no se deben usar fuera del bloque (los
+    resultados se copian antes de salir).
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.arrays = {}
+        self._segments = []
+
+    def __enter__(self):
+        try:
+            for name, (segment_name, shape, dtype) in self.spec.items():
+                segment = _open_segment(segment_name)
+                self._segments.append(segment)
+                self.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+                self.arrays[name].flags.writeable = False
+        except BaseException:
+            self.close()
+            raise
+        return self.arrays
+
+    def close(self):
+        """Cierra los segmentos en este proceso (solo el SharedArrays que los creó los borra)."""
+        self.arrays.clear()
+        for segment in self._segments:
+            try:
+                segment.close()
+            except BufferError:
+                # Aún hay vistas en uso (por ejemplo, en un traceback): el
+                # segmento se cierra cuando se liberan
+                pass
+        self._segments = []
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _open_segment(name):
+    """Abre un segmento existente sin registrarlo en el resource_tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Antes de Python 3.13 abrir un segmento también lo registra en el
+    # resource_tracker, que se comparte con el proceso principal: el registro
+    # repetido lo borraría al terminar un proceso que solo lo abrió, y
+    # anularlo después quitaría también el del SharedArrays que lo creó
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register